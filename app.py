@@ -12,16 +12,18 @@ from support import (
 )
 from config import (
     USERS_FILE, PAYMENTS_FILE, LOGINS_FILE, BOT_CONFIG_FILE, AUTH_FILE, SESSION_FILE,
-    TICKETS_FILE, PLANS, ADMIN_ID, SESSION_EXPIRY_HOURS
+    TICKETS_FILE, PLANS, ADMIN_ID, SESSION_EXPIRY_HOURS, USE_WEBHOOK, WEBHOOK_SECRET
 )
 from utils import (
-    read_json_file, write_json_file, add_login, add_coupon, delete_coupon,
+    read_json_file, write_json_file, add_login, add_logins, add_coupon, delete_coupon,
     resume_sales, suspend_sales, sales_enabled, format_currency, create_auth_token, verify_auth_token,
     is_admin_telegram_id, is_allowed_telegram_id, create_session, get_session, delete_session,
     generate_access_code, verify_access_code, list_active_access_codes, is_root_admin,
     get_active_seasonal_discounts, add_seasonal_discount, remove_seasonal_discount,
     create_giveaway, get_giveaway, get_giveaways_for_admin, draw_giveaway_winners, cancel_giveaway,
-    remove_plan_from_user, assign_plan_to_user, ban_user, unban_user
+    remove_plan_from_user, assign_plan_to_user, ban_user, unban_user, patch_bot_config,
+    get_mercado_pago_session, get_mercado_pago_settings, find_payment_by_mp_id,
+    count_users_waiting_for_login
 )
 
 # Configure logging
@@ -250,10 +252,7 @@ def dashboard():
                 pending_approvals += 1
         
         # Count users waiting for logins
-        waiting_for_login = 0
-        for payment_id, payment_data in payments.items():
-            if payment_data and payment_data.get('status') == 'approved' and not payment_data.get('login_delivered'):
-                waiting_for_login += 1
+        waiting_for_login = count_users_waiting_for_login()
         
         # Sales status
         sales_status = bot_config.get('sales_enabled', True)
@@ -554,14 +553,8 @@ def add_login_batch():
     # Split logins by line
     logins_list = login_data.strip().split('\n')
     
-    # Add each login
-    added = 0
-    for login in logins_list:
-        login = login.strip()
-        if login:
-            success = add_login(plan_type, login)
-            if success:
-                added += 1
+    # Add all logins with a single write
+    added = add_logins(plan_type, [login.strip() for login in logins_list])
     
     flash(f'Added {added} logins successfully', 'success')
     return redirect(url_for('logins'))
@@ -651,7 +644,7 @@ def coupons():
         plan_names = []
         for plan_type in discount['applicable_plans']:
             if plan_type in PLANS:
-                plan_names.append(PLANS[plan_type]['name'])
+                plan_names.append(PLANS[plan_type].name)
         
         discount['plans_formatted'] = ', '.join(plan_names) if plan_names else 'All Plans'
     
@@ -842,7 +835,7 @@ def payment_settings():
                 '1_year': len(logins.get('1_year', []))
             },
             'pending_approvals': sum(1 for p in payments.values() if p.get('status') == 'pending_approval'),
-            'waiting_for_login': sum(1 for p in payments.values() if p.get('status') == 'approved' and not p.get('login_delivered')),
+            'waiting_for_login': count_users_waiting_for_login(),
             'sales_status': sales_enabled(),
             'active_coupons': len(bot_config.get('coupons', {})),
             'unread_tickets': get_unread_ticket_count(session.get('telegram_id'), 'admin')
@@ -920,7 +913,7 @@ def payment_config():
                 '1_year': len(logins.get('1_year', []))
             },
             'pending_approvals': sum(1 for p in payments.values() if p.get('status') == 'pending_approval'),
-            'waiting_for_login': sum(1 for p in payments.values() if p.get('status') == 'approved' and not p.get('login_delivered')),
+            'waiting_for_login': count_users_waiting_for_login(),
             'sales_status': sales_enabled(),
             'active_coupons': len(bot_config.get('coupons', {})),
             'unread_tickets': get_unread_ticket_count(session.get('telegram_id'), 'admin')
@@ -946,10 +939,6 @@ def payment_config():
 def save_pix_settings():
     """Save PIX payment settings - restricted to root admin only"""
     try:
-        # Get current settings
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        payment_settings = bot_config.get('payment_settings', {})
-        
         # Update PIX settings
         pix_settings = {
             'enabled': 'enabled' in request.form,
@@ -958,14 +947,8 @@ def save_pix_settings():
             'bank': request.form.get('bank', '')
         }
         
-        # Update settings in config
-        if 'payment_settings' not in bot_config:
-            bot_config['payment_settings'] = {}
-        
-        bot_config['payment_settings']['pix'] = pix_settings
-        
-        # Save updated config
-        write_json_file(BOT_CONFIG_FILE, bot_config)
+        # Save only the PIX section of the config
+        patch_bot_config(('payment_settings', 'pix'), pix_settings)
         
         return redirect(url_for('payment_settings', 
                               message='Configurações PIX salvas com sucesso!',
@@ -983,10 +966,6 @@ def save_pix_settings():
 def save_mercado_pago_settings():
     """Save Mercado Pago payment settings - restricted to root admin only"""
     try:
-        # Get current settings
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        payment_settings = bot_config.get('payment_settings', {})
-        
         # Update Mercado Pago settings
         mp_settings = {
             'enabled': 'enabled' in request.form,
@@ -994,14 +973,8 @@ def save_mercado_pago_settings():
             'public_key': request.form.get('public_key', '')
         }
         
-        # Update settings in config
-        if 'payment_settings' not in bot_config:
-            bot_config['payment_settings'] = {}
-        
-        bot_config['payment_settings']['mercado_pago'] = mp_settings
-        
-        # Save updated config
-        write_json_file(BOT_CONFIG_FILE, bot_config)
+        # Save only the Mercado Pago section of the config
+        patch_bot_config(('payment_settings', 'mercado_pago'), mp_settings)
         
         return redirect(url_for('payment_settings', 
                               message='Configurações Mercado Pago salvas com sucesso!',
@@ -1013,6 +986,35 @@ def save_mercado_pago_settings():
                               message='Erro ao salvar configurações Mercado Pago.',
                               message_type='danger'))
 
+# Webhook para receber atualizações do Telegram (quando USE_WEBHOOK está ativo)
+@app.route('/telegram/webhook', methods=['POST'])
+def telegram_webhook():
+    """
+    Recebe as atualizações do Telegram e as repassa ao bot.
+    Os handlers rodam no pool de threads do bot, então a resposta 200 é imediata.
+    """
+    if not USE_WEBHOOK:
+        abort(404)
+    
+    # Sem segredo configurado o bot não ativa o webhook (fica em polling); qualquer POST aqui
+    # seria uma atualização forjada, inclusive se passando pelo ADMIN_ID
+    secret_token = request.headers.get('X-Telegram-Bot-Api-Secret-Token', '')
+    if not WEBHOOK_SECRET or not secrets.compare_digest(secret_token, WEBHOOK_SECRET):
+        logger.warning("Telegram webhook called with a missing or invalid secret token")
+        abort(403)
+    
+    try:
+        # Import here to avoid loading the bot when the panel runs without it
+        from bot import bot
+        from telebot import types as telebot_types
+        
+        update = telebot_types.Update.de_json(request.get_data(as_text=True))
+        bot.process_new_updates([update])
+    except Exception as e:
+        logger.error(f"Error processing Telegram webhook update: {e}")
+    
+    return '', 200
+
 # Webhook para receber notificações do Mercado Pago
 @app.route('/webhooks/mercadopago', methods=['POST'])
 def mercadopago_webhook():
@@ -1042,9 +1044,16 @@ def mercadopago_webhook():
             logger.warning("No payment ID in webhook data")
             return jsonify({"status": "error", "message": "Missing payment ID"}), 400
         
+        # O Mercado Pago reenvia notificações com frequência: se o pagamento já foi aprovado
+        # (ou concluído, com o login entregue) no nosso sistema, não consultamos a API de novo
+        # nem entregamos um segundo login
+        our_payment_id, our_payment = find_payment_by_mp_id(mp_payment_id)
+        if our_payment and our_payment.get('status') in ('approved', 'completed'):
+            logger.info(f"Payment {our_payment_id} already approved, ignoring redelivered notification")
+            return jsonify({"status": "success", "message": "Payment already processed"}), 200
+        
         # Obter as configurações do Mercado Pago
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+        mp_settings = get_mercado_pago_settings()
         access_token = mp_settings.get('access_token')
         
         if not access_token:
@@ -1053,7 +1062,7 @@ def mercadopago_webhook():
         
         # Verificar o status do pagamento na API do Mercado Pago
         headers = {"Authorization": f"Bearer {access_token}"}
-        mp_response = requests.get(f"https://api.mercadopago.com/v1/payments/{mp_payment_id}", headers=headers)
+        mp_response = get_mercado_pago_session().get(f"https://api.mercadopago.com/v1/payments/{mp_payment_id}", headers=headers)
         
         if mp_response.status_code != 200:
             logger.error(f"Failed to get payment data from Mercado Pago: {mp_response.status_code}")
@@ -1064,17 +1073,6 @@ def mercadopago_webhook():
         
         # Se o pagamento foi aprovado
         if payment_status == 'approved':
-            # Encontrar o pagamento em nosso sistema que tem esse ID do Mercado Pago
-            payments = read_json_file(PAYMENTS_FILE) or {}
-            our_payment_id = None
-            our_payment = None
-            
-            for pid, p in payments.items():
-                if p.get('mp_payment_id') == str(mp_payment_id):
-                    our_payment_id = pid
-                    our_payment = p
-                    break
-            
             if not our_payment:
                 logger.warning(f"No matching payment found for Mercado Pago payment {mp_payment_id}")
                 return jsonify({"status": "error", "message": "Payment not found"}), 404
@@ -1107,7 +1105,7 @@ def mercadopago_webhook():
                         user_id,
                         f"🎉 *Seu login UniTV está pronto!* 🎉\n\n"
                         f"Login: `{assigned_login}`\n\n"
-                        f"Seu plano expira em {PLANS[plan_type]['duration_days']} dias.\n"
+                        f"Seu plano expira em {PLANS[plan_type].duration_days} dias.\n"
                         f"Aproveite sua assinatura UniTV! 📺✨",
                         parse_mode="Markdown"
                     )
@@ -1130,7 +1128,7 @@ def mercadopago_webhook():
                 bot.send_message(
                     user_id,
                     f"✅ *Pagamento Aprovado!* ✅\n\n"
-                    f"Seu pagamento para o plano {PLANS[plan_type]['name']} foi aprovado!\n\n"
+                    f"Seu pagamento para o plano {PLANS[plan_type].name} foi aprovado!\n\n"
                     f"Estamos preparando seu login e você o receberá automaticamente em breve.\n"
                     f"Obrigado pela paciência!",
                     parse_mode="Markdown"
@@ -1142,7 +1140,7 @@ def mercadopago_webhook():
                     f"⚠️ *Pagamento Aprovado via Mercado Pago, mas Sem Login Disponível* ⚠️\n\n"
                     f"ID do Pagamento: {our_payment_id}\n"
                     f"Usuário: {user_id}\n"
-                    f"Plano: {PLANS[plan_type]['name']}\n\n"
+                    f"Plano: {PLANS[plan_type].name}\n\n"
                     f"Por favor, adicione novos logins usando /addlogin e o login será enviado automaticamente ao usuário.",
                     parse_mode="Markdown"
                 )
@@ -1204,7 +1202,7 @@ def giveaways():
                 '1_year': len(logins.get('1_year', []))
             },
             'pending_approvals': sum(1 for p in payments.values() if p.get('status') == 'pending_approval'),
-            'waiting_for_login': sum(1 for p in payments.values() if p.get('status') == 'approved' and not p.get('login_delivered')),
+            'waiting_for_login': count_users_waiting_for_login(),
             'sales_status': sales_enabled(),
             'active_coupons': len(bot_config.get('coupons', {})),
             'unread_tickets': get_unread_ticket_count(session.get('telegram_id'), 'admin')
@@ -1405,10 +1403,7 @@ def support_dashboard():
                 pending_approvals += 1
                 
         # Contar usuários aguardando login
-        waiting_for_login = 0
-        for payment_id, payment_data in payments.items():
-            if payment_data and payment_data.get('status') == 'approved' and not payment_data.get('login_delivered'):
-                waiting_for_login += 1
+        waiting_for_login = count_users_waiting_for_login()
         
         # Status de vendas
         sales_status = bot_config.get('sales_enabled', True)
@@ -1537,10 +1532,7 @@ def view_ticket(ticket_id):
                 pending_approvals += 1
                 
         # Contar usuários aguardando login
-        waiting_for_login = 0
-        for payment_id, payment_data in payments.items():
-            if payment_data and payment_data.get('status') == 'approved' and not payment_data.get('login_delivered'):
-                waiting_for_login += 1
+        waiting_for_login = count_users_waiting_for_login()
         
         # Status de vendas
         sales_status = bot_config.get('sales_enabled', True)
@@ -3,15 +3,25 @@ import time
 import telebot
 from telebot import types
 import threading
+import functools
+import heapq
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import hashlib
 import logging
 import json
 from datetime import datetime, timedelta
+from types import SimpleNamespace
 import uuid
+try:
+    import fcntl  # disponível apenas em sistemas Unix
+except ImportError:
+    fcntl = None
 
 # Import from our modules
 from config import (
     BOT_TOKEN, ADMIN_ID, PLANS, USERS_FILE, PAYMENTS_FILE,
-    LOGINS_FILE, BOT_CONFIG_FILE, AUTH_FILE, GIVEAWAYS_FILE
+    BOT_CONFIG_FILE, AUTH_FILE, GIVEAWAYS_FILE,
+    USE_WEBHOOK, WEBHOOK_URL, WEBHOOK_SECRET, DATA_DIR
 )
 from utils import (
     get_user, create_user, save_user, create_payment, update_payment,
@@ -23,16 +33,22 @@ from utils import (
     process_successful_referral, get_expiring_subscriptions, read_json_file, write_json_file,
     create_auth_token, is_admin_telegram_id, is_allowed_telegram_id,
     add_allowed_telegram_id, remove_allowed_telegram_id, generate_access_code,
-    get_giveaway, get_giveaways_for_admin, create_giveaway, draw_giveaway_winners,
+    get_giveaway, create_giveaway, draw_giveaway_winners,
     cancel_giveaway, add_participant_to_giveaway, get_active_giveaways, 
     redraw_giveaway, confirm_giveaway_win, check_expired_confirmations,
-    notify_users_about_giveaway
+    notify_users_about_giveaway, get_open_giveaways, get_payment_settings,
+    patch_bot_config, count_available_logins, get_mercado_pago_session,
+    get_mercado_pago_settings, MP_OPEN_STATUSES, read_json_readonly,
+    get_pending_mp_payment_deadlines, expire_pending_mp_payments
 )
 from support import (
     create_support_ticket, add_message_to_ticket, close_ticket, reopen_ticket,
     get_ticket, get_user_active_tickets, get_all_active_tickets,
     mark_ticket_messages_as_read, get_unread_ticket_count,
-    get_tickets_needing_admin_notification
+    get_tickets_needing_admin_notification,
+    # Com alias: este módulo tem funções próprias com os mesmos nomes
+    get_ticket_message_id as get_ticket_msg_id,
+    update_ticket_message_id as update_ticket_msg_id
 )
 
 # Função para resolver pagamentos fantasmas
@@ -50,6 +66,7 @@ def fix_inconsistent_payments():
     
     # Contador de correções
     fixed_count = 0
+    cutoff_date = datetime.now() - timedelta(days=60)
     
     # 1. Identificar pagamentos aprovados mas não entregues
     for payment_id, payment in payments.items():
@@ -84,7 +101,6 @@ def fix_inconsistent_payments():
             if payment.get('created_at'):
                 try:
                     payment_date = datetime.fromisoformat(payment.get('created_at'))
-                    cutoff_date = datetime.now() - timedelta(days=60)
                     if payment_date < cutoff_date:
                         logger.info(f"Pagamento ID {payment_id} é muito antigo ({payment_date.isoformat()}). Marcando como entregue.")
                         payment['login_delivered'] = True
@@ -107,18 +123,180 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 logger = logging.getLogger(__name__)
 
 # Initialize bot
-bot = telebot.TeleBot(BOT_TOKEN)
+# Os handlers passam a maior parte do tempo esperando a API do Telegram, então usamos um
+# pool fixo de workers maior que o padrão (2) em vez de processar tudo em poucas threads
+BOT_NUM_THREADS = int(os.getenv('BOT_NUM_THREADS', '8'))
+# Envios simultâneos ao anunciar um sorteio (abaixo do limite de ~30 msg/s do Telegram)
+ANNOUNCE_MAX_WORKERS = 28
+# Intervalo mínimo entre as edições de progresso de um anúncio
+ANNOUNCE_PROGRESS_INTERVAL_SECONDS = 5
+# Pool compartilhado para notificações que não precisam bloquear o handler (ganhadores, admin)
+NOTIFY_POOL = ThreadPoolExecutor(max_workers=8)
+
+bot = telebot.TeleBot(BOT_TOKEN, threaded=True, num_threads=BOT_NUM_THREADS)
+
+class RateLimiter:
+    """Token bucket simples e thread-safe para respeitar o limite global de envios do Telegram"""
+    
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self.tokens = self.capacity
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+    
+    def acquire(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+                self.updated_at = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+# O Telegram aceita ~30 mensagens/s no total; mantemos uma margem de segurança
+SEND_RATE_LIMITER = RateLimiter(25)
+
+# Quantas vezes reenviar quando o Telegram responde 429 (flood wait)
+SEND_MAX_RETRIES = 3
+
+def send_message_limited(*args, **kwargs):
+    """
+    bot.send_message passando pelo limitador global, para envios em massa.
+    Em caso de 429, espera o retry_after informado pelo Telegram e tenta novamente.
+    """
+    for attempt in range(SEND_MAX_RETRIES + 1):
+        SEND_RATE_LIMITER.acquire()
+        try:
+            return bot.send_message(*args, **kwargs)
+        except telebot.apihelper.ApiTelegramException as e:
+            if e.error_code != 429 or attempt == SEND_MAX_RETRIES:
+                raise
+            retry_after = (e.result_json or {}).get('parameters', {}).get('retry_after', 1)
+            logger.warning(f"Flood wait do Telegram, aguardando {retry_after}s antes de reenviar")
+            time.sleep(retry_after)
+
+@functools.lru_cache(maxsize=256)
+def _parse_ends_at(ends_at):
+    return datetime.fromisoformat(ends_at)
+
+def _ends_at_dt(giveaway):
+    """Data de término do sorteio, com o parse ISO memorizado pela string"""
+    return _parse_ends_at(giveaway['ends_at'])
+
+def fmt_remaining(td):
+    """Formata um timedelta como 'Xd Yh Zm' usando apenas aritmética inteira"""
+    s = max(0, int(td.total_seconds()))
+    return f"{s//86400}d {s%86400//3600}h {s%3600//60}m"
+
+def fmt_remaining_hours(td):
+    """Formata um timedelta como 'Xh Ymin' (horas totais), usado nas mensagens para usuários"""
+    s = max(0, int(td.total_seconds()))
+    return f"{s//3600}h {s%3600//60}min"
+
+def answer_callback_now(call):
+    """Responde ao callback imediatamente para remover o indicador de carregamento do Telegram"""
+    try:
+        bot.answer_callback_query(call.id)
+    except Exception as e:
+        # O callback pode já ter sido respondido (ex: handler chamado por outro handler)
+        logger.debug(f"Callback {call.id} já respondido: {e}")
+
+# Último conteúdo renderizado por mensagem: (chat_id, message_id) -> (hash, timestamp)
+# A janela é curta de propósito: só cobre cliques repetidos no mesmo botão, já que
+# outros handlers podem editar a mesma mensagem sem passar por aqui.
+_last_rendered = {}
+LAST_RENDERED_WINDOW_SECONDS = 3
+LAST_RENDERED_MAX_ENTRIES = 5000
+
+def safe_edit_message_text(text, chat_id, message_id, **kwargs):
+    """
+    Edita o texto de uma mensagem apenas se o conteúdo mudou.
+    Evita o erro 400 "message is not modified" quando o usuário clica duas vezes no mesmo botão.
+    """
+    reply_markup = kwargs.get('reply_markup')
+    markup_json = reply_markup.to_json() if reply_markup else ''
+    digest = hashlib.md5(f"{text}\x00{markup_json}".encode('utf-8')).digest()
+    key = (chat_id, message_id)
+    now = time.time()
+    
+    last = _last_rendered.get(key)
+    if last and last[0] == digest and now - last[1] < LAST_RENDERED_WINDOW_SECONDS:
+        return None
+    
+    try:
+        result = bot.edit_message_text(text, chat_id, message_id, **kwargs)
+    except telebot.apihelper.ApiTelegramException as e:
+        if 'message is not modified' not in str(e):
+            raise
+        result = None
+    
+    if len(_last_rendered) >= LAST_RENDERED_MAX_ENTRIES:
+        _last_rendered.clear()
+    _last_rendered[key] = (digest, now)
+    return result
+
+def ack_callback(handler):
+    """Decorator que responde ao callback antes de executar o handler"""
+    @functools.wraps(handler)
+    def wrapper(call):
+        answer_callback_now(call)
+        return handler(call)
+    return wrapper
+
+def admin_only(handler):
+    """Decorator que bloqueia handlers de mensagem ou callback para quem não é administrador"""
+    @functools.wraps(handler)
+    def wrapper(event, *args, **kwargs):
+        if not is_admin_telegram_id(event.from_user.id):
+            if isinstance(event, types.CallbackQuery):
+                bot.answer_callback_query(event.id, "⛔ Acesso negado. Este recurso é exclusivo para administradores.")
+            else:
+                bot.reply_to(event, "⛔ Acesso negado. Este comando é exclusivo para administradores.")
+            return
+        return handler(event, *args, **kwargs)
+    return wrapper
+
+# Prefixos compactos de callback_data (o Telegram limita o campo a 64 bytes)
+CB_DELETE_COUPON = "dc"
+CB_CONFIRM_DEL_COUPON = "cdc"
+CB_GIVEAWAY_PLAN = "cgp"
+CB_GIVEAWAY_WINNERS = "cgw"
+CB_GIVEAWAY_DURATION = "cgd"
+CB_GIVEAWAY_LIMIT = "cgl"
+# Prefixos usados antes dos acima; ainda aparecem em teclados já enviados aos chats
+LEGACY_CALLBACK_PREFIXES = (
+    "excluir_cupom_", "confirmar_excluir_cupom_",
+    "create_giveaway_plan_", "create_giveaway_winners_",
+    "create_giveaway_duration_", "create_giveaway_limit_",
+)
+CALLBACK_DATA_MAX_BYTES = 64
+
+def _check_callback_data_sizes():
+    """Garante, na importação, que os callbacks mais longos cabem no limite do Telegram"""
+    longest_plan = max(PLANS, key=len)
+    samples = [
+        f"{CB_CONFIRM_DEL_COUPON}:{'X' * 32}",
+        f"{CB_GIVEAWAY_LIMIT}:{longest_plan}:10:72:200",
+    ]
+    for sample in samples:
+        assert len(sample.encode('utf-8')) <= CALLBACK_DATA_MAX_BYTES, f"callback_data muito longo: {sample}"
+
+_check_callback_data_sizes()
 
 # Background tasks
 def check_login_availability():
     """Check if logins are available, notify admin if they're running low, and check for expired payments"""
     while True:
         try:
-            logins = read_json_file(LOGINS_FILE)
             bot_config = read_json_file(BOT_CONFIG_FILE)
             
             # Calculate total logins
-            total_logins = sum(len(logins[plan_type]) for plan_type in logins)
+            total_logins = sum(count_available_logins().values())
             
             # If no logins available and sales are still enabled
             if total_logins == 0 and bot_config.get('sales_enabled', True):
@@ -133,10 +311,9 @@ def check_login_availability():
                         parse_mode="Markdown"
                     )
                     
-                    # Update warning sent flag
-                    bot_config['warning_sent'] = True
-                    bot_config['sales_suspended_time'] = (datetime.now() + timedelta(minutes=5)).isoformat()
-                    write_json_file(BOT_CONFIG_FILE, bot_config)
+                    # Update warning sent flag (apenas esses campos, sem regravar o restante do config lido acima)
+                    patch_bot_config('warning_sent', True)
+                    patch_bot_config('sales_suspended_time', (datetime.now() + timedelta(minutes=5)).isoformat())
                 
                 # Check if the suspension time has passed
                 elif bot_config.get('sales_suspended_time'):
@@ -170,7 +347,7 @@ def check_login_availability():
                                 user_id,
                                 f"🎉 *Seu login UniTV está pronto!* 🎉\n\n"
                                 f"Login: `{assigned_login}`\n\n"
-                                f"Seu plano expira em {PLANS[plan_type]['duration_days']} dias.\n"
+                                f"Seu plano expira em {PLANS[plan_type].duration_days} dias.\n"
                                 f"Aproveite sua assinatura UniTV! 📺✨",
                                 parse_mode="Markdown"
                             )
@@ -178,14 +355,14 @@ def check_login_availability():
                             bot.send_message(
                                 ADMIN_ID,
                                 f"✅ Login enviado automaticamente para o usuário ID: {user_id}\n"
-                                f"Plano: {PLANS[plan_type]['name']}"
+                                f"Plano: {PLANS[plan_type].name}"
                             )
                     else:
                         # Notify admin about missing logins
                         bot.send_message(
                             ADMIN_ID,
                             f"⚠️ *USUÁRIO AGUARDANDO LOGIN* ⚠️\n\n"
-                            f"Um usuário (ID: {user_id}) pagou pelo plano {PLANS[plan_type]['name']} "
+                            f"Um usuário (ID: {user_id}) pagou pelo plano {PLANS[plan_type].name} "
                             f"mas não há logins disponíveis para este plano.\n\n"
                             f"Use /addlogin para adicionar novos logins.",
                             parse_mode="Markdown"
@@ -203,7 +380,7 @@ def check_login_availability():
                 bot.send_message(
                     user_id,
                     f"⏰ *Seu plano UniTV está prestes a expirar!* ⏰\n\n"
-                    f"Seu plano {PLANS[plan_type]['name']} expira em {days_left} dias.\n\n"
+                    f"Seu plano {PLANS[plan_type].name} expira em {days_left} dias.\n\n"
                     f"Para renovar sua assinatura, use o comando /start e escolha seu novo plano.",
                     parse_mode="Markdown"
                 )
@@ -221,50 +398,7 @@ def check_login_availability():
                     f"Use /payments para ver os detalhes.",
                     parse_mode="Markdown"
                 )
-                bot_config['pending_payment_notified'] = True
-                write_json_file(BOT_CONFIG_FILE, bot_config)
-            
-            # ======= Verificar pagamentos PIX expirados do Mercado Pago =======
-            # Verificar pagamentos pendentes no sistema e cancelar os expirados (mais de 10 minutos)
-            payments = read_json_file(PAYMENTS_FILE)
-            current_time = datetime.now()
-            payments_updated = False
-            
-            for payment_id, payment in payments.items():
-                if payment['status'] == 'pending' and payment.get('mp_payment_id'):
-                    # Verificar se o pagamento já passou do tempo limite (10 minutos)
-                    if 'created_at' in payment:
-                        created_at = datetime.fromisoformat(payment['created_at'])
-                        expiration_time = created_at + timedelta(minutes=10)
-                        
-                        if current_time > expiration_time:
-                            logger.info(f"Pagamento expirado encontrado: {payment_id}, Mercado Pago ID: {payment.get('mp_payment_id')}")
-                            
-                            # Cancelar o pagamento no Mercado Pago
-                            if _cancel_mercado_pago_payment(payment.get('mp_payment_id')):
-                                logger.info(f"Pagamento Mercado Pago {payment.get('mp_payment_id')} cancelado por tempo expirado")
-                            
-                            # Atualizar status para expirado
-                            payment['status'] = 'expired'
-                            payments[payment_id] = payment
-                            payments_updated = True
-                            
-                            # Notificar o usuário
-                            try:
-                                user_id = payment['user_id']
-                                bot.send_message(
-                                    user_id,
-                                    f"⏰ *Pagamento PIX Expirado* ⏰\n\n"
-                                    f"O QR Code PIX para seu pagamento expirou após 10 minutos.\n"
-                                    f"Para tentar novamente, inicie um novo pagamento usando o comando /start.",
-                                    parse_mode="Markdown"
-                                )
-                            except Exception as e:
-                                logger.error(f"Erro ao notificar usuário sobre pagamento expirado: {e}")
-            
-            # Salvar pagamentos atualizados, se necessário
-            if payments_updated:
-                write_json_file(PAYMENTS_FILE, payments)
+                patch_bot_config('pending_payment_notified', True)
         
         except Exception as e:
             logger.error(f"Error in background task: {e}")
@@ -272,6 +406,50 @@ def check_login_availability():
         # Run every 5 minutes
         time.sleep(300)
 
+# Expiração dos PIX do Mercado Pago: um heap com o vencimento de cada pagamento pendente
+# acorda a thread no vencimento mais próximo, em vez de percorrer todos os pagamentos
+# periodicamente. O heap é refeito (só com os pendentes) quando o arquivo de pagamentos muda.
+EXPIRY_SWEEP_MAX_SLEEP = 30
+
+def check_expired_mp_payments():
+    expiry_heap = []
+    heap_source = None
+    
+    while True:
+        try:
+            payments = read_json_readonly(PAYMENTS_FILE)
+            if payments is not heap_source:
+                expiry_heap = get_pending_mp_payment_deadlines()
+                heapq.heapify(expiry_heap)
+                heap_source = payments
+            
+            # Todos os vencidos são expirados juntos, com uma única gravação
+            # (ex.: vários vencimentos acumulados enquanto o bot estava parado)
+            due_ids = []
+            while expiry_heap and expiry_heap[0][0] <= time.time():
+                due_ids.append(heapq.heappop(expiry_heap)[1])
+            
+            for payment in expire_pending_mp_payments(due_ids):
+                # Notificar o usuário
+                try:
+                    bot.send_message(
+                        payment['user_id'],
+                        f"⏰ *Pagamento PIX Expirado* ⏰\n\n"
+                        f"O QR Code PIX para seu pagamento expirou após 10 minutos.\n"
+                        f"Para tentar novamente, inicie um novo pagamento usando o comando /start.",
+                        parse_mode="Markdown"
+                    )
+                except Exception as e:
+                    logger.error(f"Erro ao notificar usuário sobre pagamento expirado: {e}")
+        except Exception as e:
+            logger.error(f"Erro ao verificar pagamentos expirados: {e}")
+        
+        # Dorme até o próximo vencimento (no máximo EXPIRY_SWEEP_MAX_SLEEP, para ver novos pagamentos)
+        delay = EXPIRY_SWEEP_MAX_SLEEP
+        if expiry_heap:
+            delay = min(delay, max(expiry_heap[0][0] - time.time(), 1))
+        time.sleep(delay)
+
 # Check giveaways tasks
 def check_giveaways():
     """Check for expired giveaway confirmations and redraws, and send periodic notifications"""
@@ -297,41 +475,9 @@ def check_giveaways():
                 if not new_winners:
                     continue
                 
-                # Notificar novos ganhadores
+                # Notificar novos ganhadores em paralelo
                 for winner_id in new_winners:
-                    try:
-                        # Enviar mensagem para o ganhador
-                        keyboard = types.InlineKeyboardMarkup()
-                        keyboard.add(
-                            types.InlineKeyboardButton(
-                                "✅ Confirmar Participação",
-                                callback_data=f"confirm_giveaway_{giveaway_id}"
-                            )
-                        )
-                        
-                        bot.send_message(
-                            winner_id,
-                            f"🎉 *PARABÉNS! Você foi sorteado!* 🎉\n\n"
-                            f"Você ganhou o seguinte plano no sorteio:\n"
-                            f"*{giveaway['plan_name']}*\n\n"
-                            f"⚠️ *ATENÇÃO*: Você tem 10 minutos para confirmar sua participação clicando no botão abaixo.\n"
-                            f"Caso contrário, um novo ganhador será sorteado.",
-                            parse_mode="Markdown",
-                            reply_markup=keyboard
-                        )
-                        
-                        # Notificar admin
-                        bot.send_message(
-                            ADMIN_ID,
-                            f"🔄 *NOVO SORTEIO REALIZADO* 🔄\n\n"
-                            f"Sorteio #{giveaway_id}\n"
-                            f"Plano: {giveaway['plan_name']}\n"
-                            f"Novo ganhador: {winner_id}\n"
-                            f"(Substituindo ganhador que não confirmou)",
-                            parse_mode="Markdown"
-                        )
-                    except Exception as e:
-                        logger.error(f"Erro ao notificar novo ganhador {winner_id}: {e}")
+                    NOTIFY_POOL.submit(_notify_redraw_winner, winner_id, giveaway_id, giveaway['plan_name'])
             
             # Enviar notificações periódicas sobre sorteios ativos (a cada 25 minutos)
             notification_counter += 1
@@ -361,13 +507,11 @@ def check_giveaways():
                         for giveaway_id, giveaway in active_giveaways.items():
                             if giveaway.get('status') == 'active':
                                 plan_name = giveaway.get('plan_name', 'Desconhecido')
-                                end_date = datetime.fromisoformat(giveaway["ends_at"])
+                                end_date = _ends_at_dt(giveaway)
                                 remaining_time = end_date - datetime.now()
-                                remaining_hours = int(remaining_time.total_seconds() / 3600)
-                                remaining_minutes = int((remaining_time.total_seconds() % 3600) / 60)
                                 
                                 # Adicionar informações do sorteio à mensagem
-                                giveaway_message += f"- *{plan_name}* (Encerra em {remaining_hours}h {remaining_minutes}min)\n"
+                                giveaway_message += f"- *{plan_name}* (Encerra em {fmt_remaining_hours(remaining_time)})\n"
                         
                         # Enviar mensagem para todos os usuários
                         sent_count = 0
@@ -382,7 +526,7 @@ def check_giveaways():
                                 
                                 # Só enviar notificação se o usuário não estiver participando de todos os sorteios
                                 if not all_participating:
-                                    bot.send_message(
+                                    send_message_limited(
                                         user_id,
                                         giveaway_message,
                                         parse_mode="Markdown"
@@ -407,6 +551,11 @@ def start_background_tasks():
     login_thread.daemon = True
     login_thread.start()
     
+    # Thread para expirar os PIX do Mercado Pago não pagos
+    expiry_thread = threading.Thread(target=check_expired_mp_payments)
+    expiry_thread.daemon = True
+    expiry_thread.start()
+    
     # Thread para verificar sorteios
     giveaway_thread = threading.Thread(target=check_giveaways)
     giveaway_thread.daemon = True
@@ -563,7 +712,7 @@ def my_account(call):
         days_left = max(0, (expiration_date - datetime.now()).days)
         
         account_msg += (
-            f"*Plano Atual:* {PLANS[plan_type]['name']}\n"
+            f"*Plano Atual:* {PLANS[plan_type].name}\n"
             f"*Dias Restantes:* {days_left}\n"
             f"*Expira em:* {expiration_date.strftime('%d/%m/%Y')}\n\n"
             f"*Login:* `{plan.get('login_info')}`\n\n"
@@ -578,7 +727,7 @@ def my_account(call):
             days_left = max(0, (expiration_date - datetime.now()).days)
             
             account_msg += (
-                f"*Plano {i+1}:* {PLANS[plan_type]['name']}\n"
+                f"*Plano {i+1}:* {PLANS[plan_type].name}\n"
                 f"*Dias Restantes:* {days_left}\n"
                 f"*Expira em:* {expiration_date.strftime('%d/%m/%Y')}\n"
                 f"*Login:* `{plan.get('login_info')}`\n\n"
@@ -644,8 +793,8 @@ def show_plans(call):
         price, discount_info = calculate_plan_price(user_id, plan_id)
         is_first_buy = user.get('is_first_buy', True) if user else True
         
-        plans_msg += f"*{plan['name']}*\n"
-        plans_msg += f"Duração: {plan['duration_days']} dias\n"
+        plans_msg += f"*{plan.name}*\n"
+        plans_msg += f"Duração: {plan.duration_days} dias\n"
         
         # Verificar se há desconto sazonal
         if 'seasonal_discount' in discount_info:
@@ -658,13 +807,13 @@ def show_plans(call):
             expire_date_str = expiration_date.strftime('%d/%m/%Y')
             days_left = (expiration_date - datetime.now()).days
             
-            if is_first_buy and plan['first_buy_discount']:
+            if is_first_buy and plan.first_buy_discount:
                 plans_msg += f"Preço: {format_currency(price)} *(Primeira compra!)*\n"
             else:
                 plans_msg += f"Preço: ~~{format_currency(original_price)}~~ {format_currency(price)} \n"
             
             plans_msg += f"*🔥 PROMOÇÃO! {percent}% OFF* - Válido até {expire_date_str} ({days_left} dias restantes)\n"
-        elif is_first_buy and plan['first_buy_discount']:
+        elif is_first_buy and plan.first_buy_discount:
             plans_msg += f"Preço: {format_currency(price)} *(Primeira compra!)*\n"
         else:
             plans_msg += f"Preço: {format_currency(price)}\n"
@@ -687,7 +836,7 @@ def show_plans(call):
         
         keyboard.add(
             types.InlineKeyboardButton(
-                f"🛍️ {plan['name']} - {format_currency(price)}",
+                f"🛍️ {plan.name} - {format_currency(price)}",
                 callback_data=callback_data
             )
         )
@@ -762,8 +911,8 @@ def select_plan(call):
     # Create confirmation message
     confirm_msg = (
         f"🛒 *Confirmar Compra* 🛒\n\n"
-        f"Plano: {PLANS[plan_id]['name']}\n"
-        f"Duração: {PLANS[plan_id]['duration_days']} dias\n"
+        f"Plano: {PLANS[plan_id].name}\n"
+        f"Duração: {PLANS[plan_id].duration_days} dias\n"
     )
     
     if discount_applied:
@@ -915,8 +1064,8 @@ def process_coupon_code(message, plan_id, price):
     # Create confirmation message with discount
     confirm_msg = (
         f"🎟️ *Cupom Aplicado com Sucesso!* 🎟️\n\n"
-        f"Plano: {PLANS[plan_id]['name']}\n"
-        f"Duração: {PLANS[plan_id]['duration_days']} dias\n"
+        f"Plano: {PLANS[plan_id].name}\n"
+        f"Duração: {PLANS[plan_id].duration_days} dias\n"
         f"Preço original: {format_currency(price)}\n"
         f"Desconto: {format_currency(discount)}\n"
         f"Preço final: {format_currency(final_price)}\n\n"
@@ -993,8 +1142,7 @@ def confirm_plan(call):
     user_id = call.from_user.id
     
     # Check if Mercado Pago is enabled
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    payment_settings = bot_config.get('payment_settings', {})
+    payment_settings = get_payment_settings()
     mercado_pago_settings = payment_settings.get('mercado_pago', {})
     
     # If Mercado Pago is enabled and configured
@@ -1009,7 +1157,7 @@ def confirm_plan(call):
     
     # Create message - Default to PIX payment
     payment_msg = (
-        f"💰 *Pagamento - {PLANS[plan_id]['name']}* 💰\n\n"
+        f"💰 *Pagamento - {PLANS[plan_id].name}* 💰\n\n"
         f"Para concluir sua compra, precisamos de algumas informações:\n\n"
         f"Por favor, informe seu Nome Completo ou CNPJ:"
     )
@@ -1053,8 +1201,7 @@ def process_payer_name(message, payment_id):
     amount = payment['amount']
     
     # Get payment settings from bot_config
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    payment_settings = bot_config.get('payment_settings', {})
+    payment_settings = get_payment_settings()
     
     # Check if Mercado Pago is enabled
     mercado_pago_settings = payment_settings.get('mercado_pago', {})
@@ -1067,7 +1214,7 @@ def process_payer_name(message, payment_id):
     # Sempre oferecer seleção de método de pagamento
     select_msg = (
         f"💰 *Escolha seu método de pagamento* 💰\n\n"
-        f"Plano: {PLANS[plan_id]['name']}\n"
+        f"Plano: {PLANS[plan_id].name}\n"
         f"Valor: {format_currency(amount)}\n\n"
         f"Selecione como deseja pagar:"
     )
@@ -1120,8 +1267,7 @@ def send_pix_instructions(message, payment_id):
     amount = payment['amount']
     
     # Get PIX settings from bot_config
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    pix_settings = bot_config.get('payment_settings', {}).get('pix', {})
+    pix_settings = get_payment_settings().get('pix', {})
     
     pix_key = pix_settings.get('key', 'nossaempresa@email.com')
     pix_name = pix_settings.get('name', 'Empresa UniTV LTDA')
@@ -1135,7 +1281,7 @@ def send_pix_instructions(message, payment_id):
     
     pix_msg = (
         f"🏦 *Informações para Pagamento PIX Manual* 🏦\n\n"
-        f"Plano: {PLANS[plan_id]['name']}\n"
+        f"Plano: {PLANS[plan_id].name}\n"
         f"Valor: {format_currency(amount)}\n\n"
         f"*Chave PIX:* `{pix_key}`\n\n"
         f"Nome: {pix_name}\n"
@@ -1196,7 +1342,6 @@ def pay_with_pix_manual(call):
     payment_id = call.data.split("_")[3]
     send_pix_instructions(call, payment_id)
 
-import requests
 import json
 import uuid
 import os
@@ -1226,8 +1371,7 @@ def pay_with_pix_mercado_pago(call):
         )
         
         # Get Mercado Pago settings
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+        mp_settings = get_mercado_pago_settings()
         access_token = mp_settings.get('access_token')
         
         if access_token:
@@ -1238,7 +1382,7 @@ def pay_with_pix_mercado_pago(call):
             }
             
             try:
-                mp_status_response = requests.get(
+                mp_status_response = get_mercado_pago_session().get(
                     f"https://api.mercadopago.com/v1/payments/{payment['mp_payment_id']}",
                     headers=headers
                 )
@@ -1248,7 +1392,7 @@ def pay_with_pix_mercado_pago(call):
                     mp_status = mp_payment_data.get('status')
                     
                     # Se o pagamento estiver pendente, mostrar novamente o QR code
-                    if mp_status in ['pending', 'in_process', 'authorized']:
+                    if mp_status in MP_OPEN_STATUSES:
                         # Obter os dados do PIX
                         pix_data = mp_payment_data.get('point_of_interaction', {}).get('transaction_data', {})
                         qr_code = pix_data.get('qr_code', '')
@@ -1256,7 +1400,7 @@ def pay_with_pix_mercado_pago(call):
                         # Criar a mensagem com as instruções
                         mp_msg = (
                             f"📱 *PIX com QR Code via Mercado Pago* 📱\n\n"
-                            f"Plano: {PLANS[plan_id]['name']}\n"
+                            f"Plano: {PLANS[plan_id].name}\n"
                             f"Valor: {format_currency(amount)}\n\n"
                             f"*Instruções:*\n"
                             f"1. Copie o código PIX abaixo ou use o botão para abrir o QR Code\n"
@@ -1316,8 +1460,7 @@ def pay_with_pix_mercado_pago(call):
                 # Continuar para criar um novo pagamento
     
     # Get Mercado Pago settings
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+    mp_settings = get_mercado_pago_settings()
     
     # Check if Mercado Pago is enabled
     if not mp_settings.get('enabled') or not mp_settings.get('access_token'):
@@ -1341,7 +1484,7 @@ def pay_with_pix_mercado_pago(call):
         # Preparar dados do pagamento com expiração de 10 minutos
         payment_data = {
             "transaction_amount": float(amount),
-            "description": f"UniTV - {PLANS[plan_id]['name']} - ID: {payment_id}",
+            "description": f"UniTV - {PLANS[plan_id].name} - ID: {payment_id}",
             "payment_method_id": "pix",
             "payer": {
                 "email": f"cliente_{call.from_user.id}@unitv.com",
@@ -1365,7 +1508,7 @@ def pay_with_pix_mercado_pago(call):
         }
         
         # Fazer requisição à API do Mercado Pago
-        response = requests.post(
+        response = get_mercado_pago_session().post(
             "https://api.mercadopago.com/v1/payments",
             data=json.dumps(payment_data),
             headers=headers
@@ -1388,7 +1531,7 @@ def pay_with_pix_mercado_pago(call):
             # Criar a mensagem com as instruções
             mp_msg = (
                 f"📱 *PIX com QR Code via Mercado Pago* 📱\n\n"
-                f"Plano: {PLANS[plan_id]['name']}\n"
+                f"Plano: {PLANS[plan_id].name}\n"
                 f"Valor: {format_currency(amount)}\n\n"
                 f"*Instruções:*\n"
                 f"1. Copie o código PIX abaixo ou use o botão para abrir o QR Code\n"
@@ -1534,7 +1677,7 @@ def payment_done(call):
         f"*ID do Pagamento:* {payment_id}\n"
         f"*Usuário:* {call.from_user.first_name} {call.from_user.last_name or ''} (@{call.from_user.username or 'sem_username'})\n"
         f"*ID do Usuário:* {call.from_user.id}\n"
-        f"*Plano:* {PLANS[payment['plan_type']]['name']}\n"
+        f"*Plano:* {PLANS[payment['plan_type']].name}\n"
         f"*Valor:* {format_currency(payment['amount'])}\n"
         f"*Nome do Pagador:* {payment['payer_name']}\n\n"
         f"Por favor, verifique o pagamento e aprove ou rejeite."
@@ -1561,7 +1704,7 @@ def payment_done(call):
         f"Seu pagamento foi registrado e enviado para aprovação do administrador.\n"
         f"Você receberá uma notificação assim que for aprovado.\n\n"
         f"ID do Pagamento: `{payment_id}`\n"
-        f"Plano: {PLANS[payment['plan_type']]['name']}\n"
+        f"Plano: {PLANS[payment['plan_type']].name}\n"
         f"Valor: {format_currency(payment['amount'])}"
     )
     
@@ -1591,8 +1734,7 @@ def cancel_payment_callback(call):
             
             try:
                 # Obter o token do Mercado Pago
-                bot_config = read_json_file(BOT_CONFIG_FILE)
-                mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+                mp_settings = get_mercado_pago_settings()
                 access_token = mp_settings.get('access_token')
                 
                 if access_token:
@@ -1605,7 +1747,7 @@ def cancel_payment_callback(call):
                     
                     # Verificar o status atual do pagamento
                     mp_payment_id = payment.get('mp_payment_id')
-                    mp_status_response = requests.get(
+                    mp_status_response = get_mercado_pago_session().get(
                         f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
                         headers=headers
                     )
@@ -1615,9 +1757,9 @@ def cancel_payment_callback(call):
                         mp_status = mp_payment_data.get('status')
                         
                         # Se o pagamento ainda estiver pendente, cancelá-lo
-                        if mp_status in ['pending', 'in_process', 'authorized']:
+                        if mp_status in MP_OPEN_STATUSES:
                             cancel_data = {"status": "cancelled"}
-                            mp_cancel_response = requests.put(
+                            mp_cancel_response = get_mercado_pago_session().put(
                                 f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
                                 headers=headers,
                                 json=cancel_data
@@ -1721,7 +1863,7 @@ def approve_payment(call):
                 user_id,
                 f"🎉 *Seu login UniTV está pronto!* 🎉\n\n"
                 f"Login: `{assigned_login}`\n\n"
-                f"Seu plano expira em {PLANS[plan_type]['duration_days']} dias.\n"
+                f"Seu plano expira em {PLANS[plan_type].duration_days} dias.\n"
                 f"Aproveite sua assinatura UniTV! 📺✨",
                 parse_mode="Markdown"
             )
@@ -1731,7 +1873,7 @@ def approve_payment(call):
                 f"✅ *Pagamento Aprovado e Login Enviado* ✅\n\n"
                 f"ID do Pagamento: {payment_id}\n"
                 f"Usuário: {user_id}\n"
-                f"Plano: {PLANS[plan_type]['name']}\n"
+                f"Plano: {PLANS[plan_type].name}\n"
                 f"Login enviado: `{assigned_login}`",
                 call.message.chat.id,
                 call.message.message_id,
@@ -1745,7 +1887,7 @@ def approve_payment(call):
         # No login available
         bot.edit_message_text(
             f"⚠️ *Pagamento Aprovado, mas Sem Login Disponível* ⚠️\n\n"
-            f"O pagamento foi aprovado, mas não há logins disponíveis para o plano {PLANS[plan_type]['name']}.\n\n"
+            f"O pagamento foi aprovado, mas não há logins disponíveis para o plano {PLANS[plan_type].name}.\n\n"
             f"Por favor, adicione novos logins usando /addlogin e o login será enviado automaticamente ao usuário.",
             call.message.chat.id,
             call.message.message_id,
@@ -1756,7 +1898,7 @@ def approve_payment(call):
         bot.send_message(
             user_id,
             f"✅ *Pagamento Aprovado!* ✅\n\n"
-            f"Seu pagamento para o plano {PLANS[plan_type]['name']} foi aprovado!\n\n"
+            f"Seu pagamento para o plano {PLANS[plan_type].name} foi aprovado!\n\n"
             f"Estamos preparando seu login e você o receberá automaticamente em breve.\n"
             f"Obrigado pela paciência!",
             parse_mode="Markdown"
@@ -1781,8 +1923,7 @@ def reject_payment(call):
     if payment.get('mp_payment_id'):
         try:
             # Obter o token do Mercado Pago
-            bot_config = read_json_file(BOT_CONFIG_FILE)
-            mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+            mp_settings = get_mercado_pago_settings()
             access_token = mp_settings.get('access_token')
             
             if access_token:
@@ -1795,7 +1936,7 @@ def reject_payment(call):
                 
                 # Verificar o status atual do pagamento
                 mp_payment_id = payment.get('mp_payment_id')
-                mp_status_response = requests.get(
+                mp_status_response = get_mercado_pago_session().get(
                     f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
                     headers=headers
                 )
@@ -1805,9 +1946,9 @@ def reject_payment(call):
                     mp_status = mp_payment_data.get('status')
                     
                     # Se o pagamento ainda estiver pendente, cancelá-lo
-                    if mp_status in ['pending', 'in_process', 'authorized']:
+                    if mp_status in MP_OPEN_STATUSES:
                         cancel_data = {"status": "cancelled"}
-                        mp_cancel_response = requests.put(
+                        mp_cancel_response = get_mercado_pago_session().put(
                             f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
                             headers=headers,
                             json=cancel_data
@@ -1831,7 +1972,7 @@ def reject_payment(call):
     bot.send_message(
         payment['user_id'],
         f"❌ *Pagamento Rejeitado* ❌\n\n"
-        f"Seu pagamento para o plano {PLANS[payment['plan_type']]['name']} foi rejeitado.\n\n"
+        f"Seu pagamento para o plano {PLANS[payment['plan_type']].name} foi rejeitado.\n\n"
         f"Isso pode acontecer se o pagamento não foi encontrado ou se houve algum problema na transação.\n"
         f"Por favor, tente novamente ou entre em contato com o suporte.",
         parse_mode="Markdown"
@@ -1842,7 +1983,7 @@ def reject_payment(call):
         f"❌ *Pagamento Rejeitado* ❌\n\n"
         f"ID do Pagamento: {payment_id}\n"
         f"Usuário: {payment['user_id']}\n"
-        f"Plano: {PLANS[payment['plan_type']]['name']}",
+        f"Plano: {PLANS[payment['plan_type']].name}",
         call.message.chat.id,
         call.message.message_id,
         parse_mode="Markdown"
@@ -1862,7 +2003,7 @@ def show_pending_payment(call):
     # Create message
     payment_msg = (
         f"💰 *Você tem um Pagamento Pendente* 💰\n\n"
-        f"Plano: {PLANS[payment['plan_type']]['name']}\n"
+        f"Plano: {PLANS[payment['plan_type']].name}\n"
         f"Valor: {format_currency(payment['amount'])}\n"
         f"Status: {get_payment_status_text(payment['status'])}\n\n"
     )
@@ -2393,12 +2534,8 @@ def notify_admin_about_ticket_reply_simple(ticket_id, user_id, text, admin_id=No
 
 # Handler para responder a um ticket (admin)
 @bot.callback_query_handler(func=lambda call: call.data.startswith("reply_ticket_") and not call.data.startswith("reply_ticket_user_"))
+@admin_only
 def reply_to_ticket_admin(call):
-    # Verificar se é admin
-    if not is_admin_telegram_id(call.from_user.id):
-        bot.answer_callback_query(call.id, "⛔ Apenas administradores podem responder tickets!")
-        return
-    
     ticket_id = call.data.split('_')[2]
     
     # Verificar se o ticket existe
@@ -2419,19 +2556,11 @@ def reply_to_ticket_admin(call):
     bot.register_next_step_handler(msg, process_ticket_reply_admin, ticket_id)
 
 # Processar resposta do admin ao ticket
+@admin_only
 def process_ticket_reply_admin(message, ticket_id):
     admin_id = message.from_user.id
     text = message.text
     
-    # Verificar se é admin
-    if not is_admin_telegram_id(admin_id):
-        bot.send_message(
-            admin_id,
-            "⛔ Apenas administradores podem responder tickets!",
-            parse_mode="Markdown"
-        )
-        return
-    
     if not text or len(text.strip()) < 2:
         bot.send_message(
             admin_id,
@@ -2523,7 +2652,6 @@ def notify_user_about_ticket_reply(ticket_id, user_id, text, ticket_status=None)
     """
     try:
         # Obter informações do ticket para contexto
-        from support import get_ticket
         ticket = get_ticket(ticket_id)
         is_closed = ticket_status == 'closed' or (ticket and ticket.get('status') == 'closed')
         
@@ -2905,7 +3033,6 @@ def get_ticket_message_id(ticket_id, message_type):
         int: ID da mensagem ou None se não encontrado
     """
     try:
-        from support import get_ticket_message_id as get_ticket_msg_id
         return get_ticket_msg_id(ticket_id, message_type)
     except Exception as e:
         logger.error(f"Erro ao obter message_id para ticket {ticket_id}: {e}")
@@ -2925,7 +3052,6 @@ def update_ticket_message_id(ticket_id, message_type, message_id):
         bool: True se atualizado com sucesso, False caso contrário
     """
     try:
-        from support import update_ticket_message_id as update_ticket_msg_id
         return update_ticket_msg_id(ticket_id, message_type, message_id)
     except Exception as e:
         logger.error(f"Erro ao atualizar message_id para ticket {ticket_id}: {e}")
@@ -2982,7 +3108,6 @@ def support_callback(call):
     active_tickets = get_user_active_tickets(user_id)
     
     # Obter tickets fechados - adicionando funcionalidade para ver tickets antigos
-    from support import read_json_file
     tickets_file = "data/tickets.json"
     tickets = read_json_file(tickets_file) or {}
     
@@ -3239,7 +3364,6 @@ def view_my_tickets_callback(call):
     active_tickets = get_user_active_tickets(user_id)
     
     # Obter tickets fechados - para mostrar histórico completo
-    from support import read_json_file
     tickets_file = "data/tickets.json"
     tickets_dict = read_json_file(tickets_file) or {}
     
@@ -3708,7 +3832,7 @@ def add_login_command(message):
         bot.reply_to(message, 
             f"✅ Login adicionado com sucesso!\n\n"
             f"Login: `{login_data}`\n"
-            f"Plano: {PLANS[plan_type]['name']}",
+            f"Plano: {PLANS[plan_type].name}",
             parse_mode="Markdown"
         )
         
@@ -3748,7 +3872,7 @@ def check_waiting_users_for_login(plan_type):
                     user_id,
                     f"🎉 *Seu login UniTV está pronto!* 🎉\n\n"
                     f"Login: `{assigned_login}`\n\n"
-                    f"Seu plano expira em {PLANS[plan_type]['duration_days']} dias.\n"
+                    f"Seu plano expira em {PLANS[plan_type].duration_days} dias.\n"
                     f"Aproveite sua assinatura UniTV! 📺✨",
                     parse_mode="Markdown"
                 )
@@ -3756,7 +3880,7 @@ def check_waiting_users_for_login(plan_type):
                 bot.send_message(
                     ADMIN_ID,
                     f"✅ Login enviado automaticamente para o usuário ID: {user_id}\n"
-                    f"Plano: {PLANS[plan_type]['name']}"
+                    f"Plano: {PLANS[plan_type].name}"
                 )
                 
                 # If coupon was used, mark it as used
@@ -3784,7 +3908,7 @@ def payments_command(message):
         payments_msg += (
             f"*{i}. ID:* {payment['payment_id'][:8]}...\n"
             f"*Usuário:* {payment['user_id']}\n"
-            f"*Plano:* {PLANS[payment['plan_type']]['name']}\n"
+            f"*Plano:* {PLANS[payment['plan_type']].name}\n"
             f"*Valor:* {format_currency(payment['amount'])}\n"
             f"*Nome do Pagador:* {payment['payer_name']}\n"
             f"*Data:* {datetime.fromisoformat(payment['created_at']).strftime('%d/%m/%Y %H:%M')}\n\n"
@@ -4571,6 +4695,23 @@ def list_coupons_command(message):
     
     bot.reply_to(message, coupons_msg, parse_mode="Markdown")
 
+@functools.lru_cache(maxsize=32)
+def _delete_coupon_button_spec(coupon_codes):
+    """
+    Botões (texto, callback_data) do teclado de exclusão de cupons, memorizados pela tupla
+    de códigos. Guarda só tuplas imutáveis: o InlineKeyboardMarkup é mutável e não pode ser
+    compartilhado entre as telas.
+    """
+    spec = tuple((code, f"{CB_DELETE_COUPON}:{code}") for code in coupon_codes)
+    return spec + (("❌ Cancelar", f"{CB_DELETE_COUPON}:cancelar"),)
+
+def build_delete_coupon_keyboard(coupon_codes):
+    """Monta um teclado novo de exclusão de cupons a partir dos botões memorizados"""
+    keyboard = types.InlineKeyboardMarkup(row_width=1)
+    keyboard.add(*(types.InlineKeyboardButton(text, callback_data=callback_data)
+                   for text, callback_data in _delete_coupon_button_spec(coupon_codes)))
+    return keyboard
+
 @bot.message_handler(commands=['excluir_cupom'])
 def delete_coupon_command(message):
     # Check if admin
@@ -4603,16 +4744,7 @@ def delete_coupon_command(message):
         # Show list of coupons to delete
         coupon_msg = "🗑️ *Excluir Cupom* 🗑️\n\nSelecione o cupom que deseja excluir:"
         
-        keyboard = types.InlineKeyboardMarkup(row_width=1)
-        
-        for code in coupons.keys():
-            keyboard.add(
-                types.InlineKeyboardButton(code, callback_data=f"excluir_cupom_{code}")
-            )
-        
-        keyboard.add(
-            types.InlineKeyboardButton("❌ Cancelar", callback_data="excluir_cupom_cancelar")
-        )
+        keyboard = build_delete_coupon_keyboard(tuple(coupons))
         
         bot.reply_to(
             message,
@@ -4621,18 +4753,20 @@ def delete_coupon_command(message):
             parse_mode="Markdown"
         )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("excluir_cupom_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_DELETE_COUPON}:"))
 def delete_coupon_callback(call):
     # Check if admin
     if call.from_user.id != ADMIN_ID:
         bot.answer_callback_query(call.id, "⛔ Apenas administradores podem excluir cupons!")
         return
     
+    answer_callback_now(call)
+    
     # Parse callback data
-    data_parts = call.data.split("_")
+    _, _, coupon_code = call.data.partition(":")
     
-    if data_parts[2] == 'cancelar':
-        bot.edit_message_text(
+    if coupon_code == 'cancelar':
+        safe_edit_message_text(
             "🗑️ *Exclusão de Cupom Cancelada* 🗑️\n\n"
             "A exclusão do cupom foi cancelada.",
             call.message.chat.id,
@@ -4641,8 +4775,6 @@ def delete_coupon_callback(call):
         )
         return
     
-    coupon_code = data_parts[2]
-    
     # Ask for confirmation
     confirm_msg = (
         f"🗑️ *Confirmar Exclusão* 🗑️\n\n"
@@ -4651,11 +4783,11 @@ def delete_coupon_callback(call):
     
     keyboard = types.InlineKeyboardMarkup(row_width=2)
     keyboard.add(
-        types.InlineKeyboardButton("✅ Sim", callback_data=f"confirmar_excluir_cupom_{coupon_code}"),
-        types.InlineKeyboardButton("❌ Não", callback_data="excluir_cupom_cancelar")
+        types.InlineKeyboardButton("✅ Sim", callback_data=f"{CB_CONFIRM_DEL_COUPON}:{coupon_code}"),
+        types.InlineKeyboardButton("❌ Não", callback_data=f"{CB_DELETE_COUPON}:cancelar")
     )
     
-    bot.edit_message_text(
+    safe_edit_message_text(
         confirm_msg,
         call.message.chat.id,
         call.message.message_id,
@@ -4663,17 +4795,19 @@ def delete_coupon_callback(call):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("confirmar_excluir_cupom_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_CONFIRM_DEL_COUPON}:"))
 def confirm_delete_coupon(call):
     # Check if admin
     if call.from_user.id != ADMIN_ID:
         bot.answer_callback_query(call.id, "⛔ Apenas administradores podem excluir cupons!")
         return
     
-    coupon_code = call.data.split("_")[3]
+    answer_callback_now(call)
+    
+    _, _, coupon_code = call.data.partition(":")
     
     if delete_coupon(coupon_code):
-        bot.edit_message_text(
+        safe_edit_message_text(
             f"✅ *Cupom Excluído* ✅\n\n"
             f"O cupom {coupon_code} foi excluído com sucesso!",
             call.message.chat.id,
@@ -4681,7 +4815,7 @@ def confirm_delete_coupon(call):
             parse_mode="Markdown"
         )
     else:
-        bot.edit_message_text(
+        safe_edit_message_text(
             f"❌ *Erro ao Excluir Cupom* ❌\n\n"
             f"Ocorreu um erro ao excluir o cupom {coupon_code}.",
             call.message.chat.id,
@@ -4730,28 +4864,30 @@ def admin_login_command(message):
             auth_data['access_codes'][access_code]['message_id'] = reply_msg.message_id
             write_json_file(AUTH_FILE, auth_data)
     except Exception as e:
-        logger.error(f"Error generating access code: {e}")
+        logger.error("Error generating access code: %s", e)
         bot.reply_to(
             message, 
             "❌ Erro ao gerar código de acesso. Tente novamente."
         )
 
+def parse_telegram_id_arg(args):
+    """Converte o argumento de ID de `/comando ID` para int uma única vez (None se inválido)"""
+    if len(args) != 2:
+        return None
+    try:
+        telegram_id = int(args[1])
+    except ValueError:
+        return None
+    return telegram_id if telegram_id > 0 else None
+
 # Admin commands to manage allowed users
 @bot.message_handler(commands=['add_admin'])
+@admin_only
 def add_admin_command(message):
-    user_id = message.from_user.id
-    
-    # Only existing admin can add new admins
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(
-            message,
-            "⛔ Apenas administradores podem adicionar novos administradores."
-        )
-        return
-    
     # Check if there's an ID in the message
     args = message.text.split()
-    if len(args) != 2 or not args[1].isdigit():
+    new_admin_id = parse_telegram_id_arg(args)
+    if new_admin_id is None:
         bot.reply_to(
             message,
             "❌ Uso incorreto. Envie `/add_admin ID_DO_TELEGRAM` para adicionar um novo administrador.",
@@ -4759,7 +4895,7 @@ def add_admin_command(message):
         )
         return
     
-    new_admin_id = args[1]
+    new_admin_key = str(new_admin_id)
     
     # Add user to the allowed list
     auth_data = read_json_file(AUTH_FILE)
@@ -4767,8 +4903,8 @@ def add_admin_command(message):
     if 'admin_telegram_ids' not in auth_data:
         auth_data['admin_telegram_ids'] = []
     
-    if str(new_admin_id) not in auth_data['admin_telegram_ids']:
-        auth_data['admin_telegram_ids'].append(str(new_admin_id))
+    if new_admin_key not in auth_data['admin_telegram_ids']:
+        auth_data['admin_telegram_ids'].append(new_admin_key)
         write_json_file(AUTH_FILE, auth_data)
         
         bot.reply_to(
@@ -4784,7 +4920,7 @@ def add_admin_command(message):
                 f"Use o comando /admin_login para acessar o painel administrativo."
             )
         except Exception as e:
-            logger.error(f"Failed to notify new admin: {e}")
+            logger.error("Failed to notify new admin: %s", e)
     else:
         bot.reply_to(
             message,
@@ -4793,20 +4929,12 @@ def add_admin_command(message):
 
 # Add allowed user (not admin)
 @bot.message_handler(commands=['add_user'])
+@admin_only
 def add_allowed_user_command(message):
-    user_id = message.from_user.id
-    
-    # Only existing admin can add new allowed users
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(
-            message,
-            "⛔ Apenas administradores podem adicionar novos usuários permitidos."
-        )
-        return
-    
     # Check if there's an ID in the message
     args = message.text.split()
-    if len(args) != 2 or not args[1].isdigit():
+    new_user_id = parse_telegram_id_arg(args)
+    if new_user_id is None:
         bot.reply_to(
             message,
             "❌ Uso incorreto. Envie `/add_user ID_DO_TELEGRAM` para adicionar um novo usuário permitido.",
@@ -4814,8 +4942,6 @@ def add_allowed_user_command(message):
         )
         return
     
-    new_user_id = args[1]
-    
     # Add user to the allowed list
     if add_allowed_telegram_id(new_user_id):
         bot.reply_to(
@@ -4831,7 +4957,7 @@ def add_allowed_user_command(message):
                 f"Use o comando /admin_login para acessar."
             )
         except Exception as e:
-            logger.error(f"Failed to notify new allowed user: {e}")
+            logger.error("Failed to notify new allowed user: %s", e)
     else:
         bot.reply_to(
             message,
@@ -4841,13 +4967,9 @@ def add_allowed_user_command(message):
 # Back to start
 # Gerenciamento de sorteios (admin)
 @bot.callback_query_handler(func=lambda call: call.data == "admin_giveaways")
+@admin_only
 def admin_giveaways_menu(call):
-    user_id = str(call.from_user.id)
-    
-    # Verificar se o usuário é admin
-    if not is_admin_telegram_id(user_id):
-        bot.answer_callback_query(call.id, "Acesso negado. Este recurso é exclusivo para administradores.")
-        return
+    answer_callback_now(call)
     
     # Criar teclado com opções
     keyboard = types.InlineKeyboardMarkup(row_width=1)
@@ -4858,7 +4980,7 @@ def admin_giveaways_menu(call):
     )
     
     # Atualizar mensagem
-    bot.edit_message_text(
+    safe_edit_message_text(
         "🎰 *Gerenciamento de Sorteios* 🎰\n\n"
         "Escolha uma opção para gerenciar os sorteios:",
         call.message.chat.id,
@@ -4867,31 +4989,40 @@ def admin_giveaways_menu(call):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data == "create_giveaway")
-def create_giveaway_from_menu(call):
-    # Simular a mensagem para a função existente
-    fake_message = types.Message(
+def fake_command_message(call, text):
+    """
+    Monta uma mensagem mínima a partir de um callback para reaproveitar handlers de comando.
+    Um SimpleNamespace basta: os handlers só usam message_id, from_user, chat e text.
+    """
+    return SimpleNamespace(
         message_id=call.message.message_id,
         from_user=call.from_user,
-        date=None,
         chat=call.message.chat,
+        text=text,
         content_type="text",
-        options={},
-        json_string=None
+        date=None,
+        json={}
     )
-    fake_message.text = "/giveaway create"
+
+@bot.callback_query_handler(func=lambda call: call.data == "create_giveaway")
+@admin_only
+@ack_callback
+def create_giveaway_from_menu(call):
+    # Simular a mensagem para a função existente
+    fake_message = fake_command_message(call, "/giveaway create")
     
     # Chamar a função existente
     giveaway_create_step1(fake_message)
 
 @bot.callback_query_handler(func=lambda call: call.data == "list_giveaways")
+@admin_only
+@ack_callback
 def list_giveaways_from_menu(call):
     # Obter sorteios ativos
-    all_giveaways = get_giveaways_for_admin()
-    active_giveaways = all_giveaways.get('active', {})
+    active_giveaways = get_open_giveaways()
     
     if not active_giveaways:
-        bot.edit_message_text(
+        safe_edit_message_text(
             "❌ *Nenhum Sorteio Ativo* ❌\n\n"
             "Não há sorteios ativos no momento.",
             call.message.chat.id,
@@ -4904,30 +5035,33 @@ def list_giveaways_from_menu(call):
         return
     
     # Criar mensagem com a lista de sorteios
-    response = "🎰 *Sorteios Ativos* 🎰\n\n"
+    parts = ["🎰 *Sorteios Ativos* 🎰\n"]
     
     # Criar teclado com botões para cada sorteio
     keyboard = types.InlineKeyboardMarkup(row_width=2)
     
     for giveaway_id, giveaway in active_giveaways.items():
-        if giveaway.get('status') == 'active':
-            end_date = datetime.fromisoformat(giveaway["ends_at"])
-            remaining_time = end_date - datetime.now()
-            participants_count = len(giveaway.get('participants', {}))
-            max_participants = giveaway.get('max_participants', 'Sem limite')
-            
-            response += f"ID: `{giveaway_id}`\n"
-            response += f"Plano: *{giveaway['plan_name']}*\n"
-            response += f"Ganhadores: {giveaway['winners_count']}\n"
-            response += f"Participantes: {participants_count}/{max_participants}\n"
-            response += f"Encerra em: {remaining_time.days}d {remaining_time.seconds//3600}h {(remaining_time.seconds%3600)//60}m\n"
-            response += f"Status: {giveaway.get('status')}\n\n"
-            
-            # Adicionar botões para sortear e cancelar
-            keyboard.add(
-                types.InlineKeyboardButton(f"🎲 Sortear #{giveaway_id}", callback_data=f"menu_draw_{giveaway_id}"),
-                types.InlineKeyboardButton(f"❌ Cancelar #{giveaway_id}", callback_data=f"menu_cancel_{giveaway_id}")
-            )
+        end_date = _ends_at_dt(giveaway)
+        remaining_time = end_date - datetime.now()
+        participants_count = len(giveaway.get('participants', {}))
+        max_participants = giveaway.get('max_participants', 'Sem limite')
+        plan_name = giveaway['plan_name']
+        winners_count = giveaway['winners_count']
+        
+        parts.append(
+            f"ID: `{giveaway_id}`\n"
+            f"Plano: *{plan_name}*\n"
+            f"Ganhadores: {winners_count}\n"
+            f"Participantes: {participants_count}/{max_participants}\n"
+            f"Encerra em: {fmt_remaining(remaining_time)}\n"
+            f"Status: {giveaway.get('status')}\n"
+        )
+        
+        # Adicionar botões para sortear e cancelar
+        keyboard.add(
+            types.InlineKeyboardButton(f"🎲 Sortear #{giveaway_id}", callback_data=f"menu_draw_{giveaway_id}"),
+            types.InlineKeyboardButton(f"❌ Cancelar #{giveaway_id}", callback_data=f"menu_cancel_{giveaway_id}")
+        )
     
     # Adicionar botão de voltar
     keyboard.add(
@@ -4935,8 +5069,8 @@ def list_giveaways_from_menu(call):
     )
     
     # Atualizar mensagem
-    bot.edit_message_text(
-        response,
+    safe_edit_message_text(
+        "\n".join(parts),
         call.message.chat.id,
         call.message.message_id,
         reply_markup=keyboard,
@@ -4944,20 +5078,13 @@ def list_giveaways_from_menu(call):
     )
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("menu_draw_"))
+@admin_only
+@ack_callback
 def menu_draw_giveaway(call):
     giveaway_id = call.data.replace("menu_draw_", "")
     
     # Simular a mensagem para a função existente
-    fake_message = types.Message(
-        message_id=call.message.message_id,
-        from_user=call.from_user,
-        date=None,
-        chat=call.message.chat,
-        content_type="text",
-        options={},
-        json_string=None
-    )
-    fake_message.text = f"/giveaway draw {giveaway_id}"
+    fake_message = fake_command_message(call, f"/giveaway draw {giveaway_id}")
     
     # Chamar a função existente
     giveaway_draw_command(fake_message, giveaway_id)
@@ -4967,6 +5094,8 @@ def menu_draw_giveaway(call):
     list_giveaways_from_menu(call)
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("menu_cancel_"))
+@admin_only
+@ack_callback
 def menu_cancel_giveaway(call):
     giveaway_id = call.data.replace("menu_cancel_", "")
     
@@ -4977,7 +5106,7 @@ def menu_cancel_giveaway(call):
         types.InlineKeyboardButton("❌ Não, Voltar", callback_data="list_giveaways")
     )
     
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"⚠️ *Confirmar Cancelamento* ⚠️\n\n"
         f"Você tem certeza que deseja cancelar o sorteio #{giveaway_id}?\n\n"
         f"Esta ação não pode ser desfeita.",
@@ -4988,20 +5117,13 @@ def menu_cancel_giveaway(call):
     )
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("confirm_cancel_"))
+@admin_only
+@ack_callback
 def confirm_cancel_giveaway(call):
     giveaway_id = call.data.replace("confirm_cancel_", "")
     
     # Simular a mensagem para a função existente
-    fake_message = types.Message(
-        message_id=call.message.message_id,
-        from_user=call.from_user,
-        date=None,
-        chat=call.message.chat,
-        content_type="text",
-        options={},
-        json_string=None
-    )
-    fake_message.text = f"/giveaway cancel {giveaway_id}"
+    fake_message = fake_command_message(call, f"/giveaway cancel {giveaway_id}")
     
     # Chamar a função existente
     giveaway_cancel_command(fake_message, giveaway_id)
@@ -5010,67 +5132,65 @@ def confirm_cancel_giveaway(call):
     time.sleep(3)
     list_giveaways_from_menu(call)
 
+# Mensagem e botões fixos do menu inicial, montados uma única vez
+WELCOME_TEMPLATE = (
+    "👋 Olá {first_name}! Bem-vindo à loja da UniTV! 📺✨\n\n"
+    "Escolha uma das opções abaixo para continuar:"
+)
+SALES_SUSPENDED_NOTICE = "\n\n⚠️ *As vendas estão temporariamente suspensas devido à alta demanda.* ⚠️"
+
+_MY_ACCOUNT_BUTTON = types.InlineKeyboardButton("📊 Minha Conta", callback_data="my_account")
+_RENEW_BUTTON = types.InlineKeyboardButton("🔄 Renovar Assinatura", callback_data="show_plans")
+_SHOW_PLANS_BUTTON = types.InlineKeyboardButton("🛒 Ver Planos", callback_data="show_plans")
+_ACTIVE_GIVEAWAYS_BUTTON = types.InlineKeyboardButton("🎁 Sorteios Ativos", callback_data="view_active_giveaways")
+_SUPPORT_BUTTONS = (
+    types.InlineKeyboardButton("💬 Suporte", callback_data="support"),
+    types.InlineKeyboardButton("🔗 Programa de Indicação", callback_data="referral_program")
+)
+_ADMIN_GIVEAWAYS_BUTTON = types.InlineKeyboardButton("🎰 Gerenciar Sorteios", callback_data="admin_giveaways")
+
 @bot.callback_query_handler(func=lambda call: call.data == "start")
+@ack_callback
 def back_to_start(call):
     user_id = call.from_user.id
     user = get_user(user_id)
     
     # Create welcome message
-    welcome_msg = (
-        f"👋 Olá {call.from_user.first_name}! Bem-vindo à loja da UniTV! 📺✨\n\n"
-        f"Escolha uma das opções abaixo para continuar:"
-    )
+    welcome_msg = WELCOME_TEMPLATE.format(first_name=call.from_user.first_name)
     
     # Create keyboard
     keyboard = types.InlineKeyboardMarkup(row_width=1)
     
     # Add buttons based on user status
     if user and user.get('has_active_plan'):
-        plan_type = user.get('plan_type')
-        expiration_date = datetime.fromisoformat(user.get('plan_expiration'))
-        days_left = (expiration_date - datetime.now()).days
-        
         # Add account info button
-        keyboard.add(
-            types.InlineKeyboardButton("📊 Minha Conta", callback_data="my_account")
-        )
+        keyboard.add(_MY_ACCOUNT_BUTTON)
         
         # Add renew button if less than 10 days left
-        if days_left <= 10:
-            keyboard.add(
-                types.InlineKeyboardButton("🔄 Renovar Assinatura", callback_data="show_plans")
-            )
+        plan_expiration = user.get('plan_expiration')
+        if plan_expiration and (datetime.fromisoformat(plan_expiration) - datetime.now()).days <= 10:
+            keyboard.add(_RENEW_BUTTON)
     else:
         # Check if sales are enabled
         if sales_enabled():
-            keyboard.add(
-                types.InlineKeyboardButton("🛒 Ver Planos", callback_data="show_plans")
-            )
+            keyboard.add(_SHOW_PLANS_BUTTON)
         else:
-            welcome_msg += "\n\n⚠️ *As vendas estão temporariamente suspensas devido à alta demanda.* ⚠️"
+            welcome_msg += SALES_SUSPENDED_NOTICE
     
     # Adicionar botão de sorteios ativos para todos os usuários
-    active_giveaways = get_active_giveaways()
-    if active_giveaways:
-        keyboard.add(
-            types.InlineKeyboardButton("🎁 Sorteios Ativos", callback_data="view_active_giveaways")
-        )
+    if get_active_giveaways():
+        keyboard.add(_ACTIVE_GIVEAWAYS_BUTTON)
     
     # Add support button
-    keyboard.add(
-        types.InlineKeyboardButton("💬 Suporte", callback_data="support"),
-        types.InlineKeyboardButton("🔗 Programa de Indicação", callback_data="referral_program")
-    )
+    keyboard.add(*_SUPPORT_BUTTONS)
     
     # Add giveaway button for admins
     if is_admin_telegram_id(str(call.from_user.id)):
-        keyboard.add(
-            types.InlineKeyboardButton("🎰 Gerenciar Sorteios", callback_data="admin_giveaways")
-        )
+        keyboard.add(_ADMIN_GIVEAWAYS_BUTTON)
     
     # Edit the message instead of sending new
     try:
-        bot.edit_message_text(
+        safe_edit_message_text(
             welcome_msg,
             call.message.chat.id,
             call.message.message_id,
@@ -5078,7 +5198,7 @@ def back_to_start(call):
             parse_mode="Markdown"
         )
     except Exception as e:
-        logger.error(f"Error editing message: {e}")
+        logger.error("Error editing message: %s", e)
         # Fallback to sending a new message if edit fails
         bot.send_message(
             call.message.chat.id,
@@ -5089,18 +5209,9 @@ def back_to_start(call):
 
 # Comandos para gerenciar sorteios (admin)
 @bot.message_handler(commands=['giveaway'])
+@admin_only
 def giveaway_command(message):
     """Comando de gerenciamento de sorteios para administradores"""
-    user_id = str(message.from_user.id)
-    
-    # Verificar se o usuário é admin
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(
-            message, 
-            "⛔ Acesso negado. Este comando é exclusivo para administradores."
-        )
-        return
-    
     args = message.text.split(maxsplit=1)
     
     # Se não houver argumentos, mostrar ajuda
@@ -5153,8 +5264,8 @@ def giveaway_create_step1(message):
     for plan_id, plan in PLANS.items():
         keyboard.add(
             types.InlineKeyboardButton(
-                f"{plan['name']}",
-                callback_data=f"create_giveaway_plan_{plan_id}"
+                f"{plan.name}",
+                callback_data=f"{CB_GIVEAWAY_PLAN}:{plan_id}"
             )
         )
     
@@ -5172,10 +5283,13 @@ def giveaway_create_step1(message):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("create_giveaway_plan_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_GIVEAWAY_PLAN}:"))
+@admin_only
+@ack_callback
 def giveaway_create_step2(call):
     """Processo de criação de sorteio - Passo 2: Número de ganhadores"""
-    plan_type = call.data.replace("create_giveaway_plan_", "")
+    _, _, plan_type = call.data.partition(":")
+    plan_name = PLANS[plan_type].name
     
     # Criar teclado com opções de número de ganhadores
     keyboard = types.InlineKeyboardMarkup(row_width=3)
@@ -5184,9 +5298,9 @@ def giveaway_create_step2(call):
     
     for i in range(1, 11):
         if i <= 5:
-            row1.append(types.InlineKeyboardButton(str(i), callback_data=f"create_giveaway_winners_{plan_type}_{i}"))
+            row1.append(types.InlineKeyboardButton(str(i), callback_data=f"{CB_GIVEAWAY_WINNERS}:{plan_type}:{i}"))
         else:
-            row2.append(types.InlineKeyboardButton(str(i), callback_data=f"create_giveaway_winners_{plan_type}_{i}"))
+            row2.append(types.InlineKeyboardButton(str(i), callback_data=f"{CB_GIVEAWAY_WINNERS}:{plan_type}:{i}"))
     
     keyboard.add(*row1)
     keyboard.add(*row2)
@@ -5197,9 +5311,9 @@ def giveaway_create_step2(call):
     )
     
     # Atualizar mensagem
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"🎰 *Criação de Sorteio - Passo 2/4* 🎰\n\n"
-        f"Plano selecionado: *{PLANS[plan_type]['name']}*\n\n"
+        f"Plano selecionado: *{plan_name}*\n\n"
         f"Selecione o número de ganhadores (1-10):",
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
@@ -5207,12 +5321,13 @@ def giveaway_create_step2(call):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("create_giveaway_winners_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_GIVEAWAY_WINNERS}:"))
+@admin_only
+@ack_callback
 def giveaway_create_step3(call):
     """Processo de criação de sorteio - Passo 3: Duração do sorteio"""
-    parts = call.data.split("_")
-    plan_type = parts[3]
-    winners_count = parts[4]
+    _, plan_type, winners_count = call.data.split(":", 2)
+    plan_name = PLANS[plan_type].name
     
     # Criar teclado com opções de duração
     keyboard = types.InlineKeyboardMarkup(row_width=2)
@@ -5230,7 +5345,7 @@ def giveaway_create_step3(call):
     for label, hours in durations:
         buttons.append(types.InlineKeyboardButton(
             label, 
-            callback_data=f"create_giveaway_duration_{plan_type}_{winners_count}_{hours}"
+            callback_data=f"{CB_GIVEAWAY_DURATION}:{plan_type}:{winners_count}:{hours}"
         ))
     
     keyboard.add(*buttons)
@@ -5241,9 +5356,9 @@ def giveaway_create_step3(call):
     )
     
     # Atualizar mensagem
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"🎰 *Criação de Sorteio - Passo 3/4* 🎰\n\n"
-        f"Plano: *{PLANS[plan_type]['name']}*\n"
+        f"Plano: *{plan_name}*\n"
         f"Ganhadores: *{winners_count}*\n\n"
         f"Selecione a duração do sorteio:",
         chat_id=call.message.chat.id,
@@ -5252,13 +5367,13 @@ def giveaway_create_step3(call):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("create_giveaway_duration_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_GIVEAWAY_DURATION}:"))
+@admin_only
+@ack_callback
 def giveaway_create_step4(call):
     """Processo de criação de sorteio - Passo 4: Limite de participantes (opcional)"""
-    parts = call.data.split("_")
-    plan_type = parts[3]
-    winners_count = parts[4]
-    duration_hours = parts[5]
+    _, plan_type, winners_count, duration_hours = call.data.split(":", 3)
+    plan_name = PLANS[plan_type].name
     
     # Criar teclado com opções de limite de participantes
     keyboard = types.InlineKeyboardMarkup(row_width=2)
@@ -5276,7 +5391,7 @@ def giveaway_create_step4(call):
     for label, limit in limits:
         buttons.append(types.InlineKeyboardButton(
             label, 
-            callback_data=f"create_giveaway_limit_{plan_type}_{winners_count}_{duration_hours}_{limit}"
+            callback_data=f"{CB_GIVEAWAY_LIMIT}:{plan_type}:{winners_count}:{duration_hours}:{limit}"
         ))
     
     keyboard.add(*buttons)
@@ -5287,9 +5402,9 @@ def giveaway_create_step4(call):
     )
     
     # Atualizar mensagem
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"🎰 *Criação de Sorteio - Passo 4/4* 🎰\n\n"
-        f"Plano: *{PLANS[plan_type]['name']}*\n"
+        f"Plano: *{plan_name}*\n"
         f"Ganhadores: *{winners_count}*\n"
         f"Duração: *{duration_hours} horas*\n\n"
         f"Selecione o limite de participantes (opcional):",
@@ -5299,14 +5414,15 @@ def giveaway_create_step4(call):
         parse_mode="Markdown"
     )
 
-@bot.callback_query_handler(func=lambda call: call.data.startswith("create_giveaway_limit_"))
+@bot.callback_query_handler(func=lambda call: call.data.startswith(f"{CB_GIVEAWAY_LIMIT}:"))
+@admin_only
+@ack_callback
 def giveaway_create_final(call):
     """Finaliza o processo de criação de sorteio"""
-    parts = call.data.split("_")
-    plan_type = parts[3]
-    winners_count = int(parts[4])
-    duration_hours = int(parts[5])
-    max_participants = int(parts[6])
+    _, plan_type, winners_count, duration_hours, max_participants = call.data.split(":", 4)
+    winners_count = int(winners_count)
+    duration_hours = int(duration_hours)
+    max_participants = int(max_participants)
     
     # Converter 0 para None (sem limite)
     if max_participants == 0:
@@ -5317,6 +5433,8 @@ def giveaway_create_final(call):
     giveaway_id = create_giveaway(admin_id, plan_type, winners_count, duration_hours, max_participants)
     
     if giveaway_id:
+        plan_name = PLANS[plan_type].name
+        
         # Criar botão para compartilhar o sorteio
         keyboard = types.InlineKeyboardMarkup()
         keyboard.add(
@@ -5324,10 +5442,10 @@ def giveaway_create_final(call):
         )
         
         # Mostrar mensagem de sucesso
-        bot.edit_message_text(
+        safe_edit_message_text(
             f"✅ *Sorteio Criado com Sucesso!* ✅\n\n"
             f"ID do Sorteio: `{giveaway_id}`\n"
-            f"Plano: *{PLANS[plan_type]['name']}*\n"
+            f"Plano: *{plan_name}*\n"
             f"Ganhadores: *{winners_count}*\n"
             f"Duração: *{duration_hours} horas*\n"
             f"Limite de Participantes: *{max_participants if max_participants else 'Sem limite'}*\n\n"
@@ -5339,7 +5457,7 @@ def giveaway_create_final(call):
         )
     else:
         # Mostrar mensagem de erro
-        bot.edit_message_text(
+        safe_edit_message_text(
             "❌ *Erro ao criar sorteio* ❌\n\n"
             "Não foi possível criar o sorteio. Por favor, tente novamente.",
             chat_id=call.message.chat.id,
@@ -5348,6 +5466,7 @@ def giveaway_create_final(call):
         )
         
 @bot.callback_query_handler(func=lambda call: call.data.startswith("announce_giveaway_"))
+@admin_only
 def announce_giveaway(call):
     """Anuncia um sorteio para todos os usuários ativos"""
     giveaway_id = call.data.replace("announce_giveaway_", "")
@@ -5363,8 +5482,10 @@ def announce_giveaway(call):
         )
         return
     
+    answer_callback_now(call)
+    
     # Informar ao admin que a notificação está sendo enviada
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"📣 *Anunciando sorteio para {len(user_ids)} usuários...* 📣\n\n"
         f"ID do Sorteio: `{giveaway_id}`\n"
         f"Plano: *{giveaway_data['plan_name']}*\n"
@@ -5377,47 +5498,79 @@ def announce_giveaway(call):
         parse_mode="Markdown"
     )
     
-    # Enviar notificação para todos os usuários na lista
-    sent_count = 0
-    for user_id in user_ids:
+    # Montar teclado e mensagem uma única vez para todos os usuários
+    keyboard = types.InlineKeyboardMarkup()
+    keyboard.add(
+        types.InlineKeyboardButton(
+            "🎲 Participar do Sorteio", 
+            callback_data=f"join_giveaway_{giveaway_id}"
+        )
+    )
+    
+    # Calcular tempo restante
+    ends_at = _ends_at_dt(giveaway_data)
+    remaining = ends_at - datetime.now()
+    
+    description = giveaway_data.get('description', '')
+    description_text = f"\n\n{description}" if description else ""
+    
+    announcement = (
+        f"🎰 *NOVO SORTEIO DISPONÍVEL!* 🎰\n\n"
+        f"Prêmio: *{giveaway_data['plan_name']}*\n"
+        f"Ganhadores: *{giveaway_data['winners_count']}*\n"
+        f"Encerra em: *{fmt_remaining_hours(remaining)}*\n"
+        f"Participantes: *0/{giveaway_data['max_participants'] if giveaway_data['max_participants'] else '∞'}*"
+        f"{description_text}\n\n"
+        f"Clique no botão abaixo para participar:"
+    )
+    
+    def send_announcement(user_id):
         try:
-            # Criar teclado com botão para participar
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(
-                types.InlineKeyboardButton(
-                    "🎲 Participar do Sorteio", 
-                    callback_data=f"join_giveaway_{giveaway_id}"
-                )
-            )
-            
-            # Calcular tempo restante
-            ends_at = datetime.fromisoformat(giveaway_data['ends_at'])
-            remaining = ends_at - datetime.now()
-            remaining_hours = remaining.total_seconds() // 3600
-            remaining_minutes = (remaining.total_seconds() % 3600) // 60
-            
-            # Enviar mensagem
-            description = giveaway_data.get('description', '')
-            description_text = f"\n\n{description}" if description else ""
-            
-            bot.send_message(
-                user_id,
-                f"🎰 *NOVO SORTEIO DISPONÍVEL!* 🎰\n\n"
-                f"Prêmio: *{giveaway_data['plan_name']}*\n"
-                f"Ganhadores: *{giveaway_data['winners_count']}*\n"
-                f"Encerra em: *{int(remaining_hours)}h {int(remaining_minutes)}min*\n"
-                f"Participantes: *0/{giveaway_data['max_participants'] if giveaway_data['max_participants'] else '∞'}*"
-                f"{description_text}\n\n"
-                f"Clique no botão abaixo para participar:",
-                reply_markup=keyboard,
-                parse_mode="Markdown"
-            )
-            sent_count += 1
+            send_message_limited(user_id, announcement, reply_markup=keyboard, parse_mode="Markdown")
+            return True
+        except telebot.apihelper.ApiTelegramException as e:
+            # 403: o usuário bloqueou o bot, situação esperada em anúncios em massa
+            if e.error_code == 403:
+                logger.debug("User %s blocked the bot, skipping giveaway notification", user_id)
+            else:
+                logger.error("Error sending giveaway notification to user %s: %s", user_id, e)
+            return False
         except Exception as e:
-            logger.error(f"Error sending giveaway notification to user {user_id}: {e}")
+            logger.error("Error sending giveaway notification to user %s: %s", user_id, e)
+            return False
+    
+    # Enviar notificação para todos os usuários na lista em paralelo (concorrência limitada)
+    sent_count = 0
+    processed_count = 0
+    total = len(user_ids)
+    last_progress_edit = time.monotonic()
+    with ThreadPoolExecutor(max_workers=ANNOUNCE_MAX_WORKERS) as executor:
+        futures = [executor.submit(send_announcement, user_id) for user_id in user_ids]
+        for future in as_completed(futures):
+            processed_count += 1
+            if future.result():
+                sent_count += 1
+            
+            # Mostrar o progresso ao admin periodicamente, sem gastar uma edição por usuário
+            now = time.monotonic()
+            if processed_count < total and now - last_progress_edit >= ANNOUNCE_PROGRESS_INTERVAL_SECONDS:
+                last_progress_edit = now
+                try:
+                    SEND_RATE_LIMITER.acquire()
+                    safe_edit_message_text(
+                        f"📣 *Anunciando sorteio para {total} usuários...* 📣\n\n"
+                        f"ID do Sorteio: `{giveaway_id}`\n"
+                        f"Plano: *{giveaway_data['plan_name']}*\n\n"
+                        f"Progresso: *{processed_count}/{total}* ({sent_count} enviados)",
+                        chat_id=call.message.chat.id,
+                        message_id=call.message.message_id,
+                        parse_mode="Markdown"
+                    )
+                except Exception as e:
+                    logger.error("Error updating announce progress: %s", e)
     
     # Atualizar mensagem com o resultado
-    bot.edit_message_text(
+    safe_edit_message_text(
         f"✅ *Sorteio anunciado com sucesso!* ✅\n\n"
         f"ID do Sorteio: `{giveaway_id}`\n"
         f"Plano: *{giveaway_data['plan_name']}*\n"
@@ -5431,59 +5584,60 @@ def announce_giveaway(call):
     )
 
 @bot.callback_query_handler(func=lambda call: call.data == "cancel_giveaway_creation")
+@admin_only
+@ack_callback
 def cancel_giveaway_creation(call):
     """Cancela o processo de criação de sorteio"""
-    bot.edit_message_text(
+    safe_edit_message_text(
         "⚠️ *Criação de Sorteio Cancelada* ⚠️",
         chat_id=call.message.chat.id,
         message_id=call.message.message_id,
         parse_mode="Markdown"
     )
 
+@bot.callback_query_handler(func=lambda call: call.data.startswith(LEGACY_CALLBACK_PREFIXES))
+def expired_legacy_callback(call):
+    """Botões de teclados antigos (prefixos anteriores aos CB_*): avisa que o menu expirou"""
+    try:
+        bot.answer_callback_query(call.id, "⌛ Menu expirado, abra novamente.")
+    except Exception as e:
+        logger.debug(f"Callback {call.id} já respondido: {e}")
+
 
 
+@admin_only
 def giveaway_list_command(message):
     """Lista todos os sorteios ativos"""
-    # Verificar se o usuário é admin
-    user_id = str(message.from_user.id)
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(message, "⛔ Acesso negado. Este comando é exclusivo para administradores.")
-        return
-    
     # Obter sorteios ativos
-    giveaways = get_giveaways_for_admin()
+    giveaways = get_open_giveaways()
     
     if not giveaways:
         bot.reply_to(message, "❌ Não há sorteios ativos no momento.")
         return
     
     # Criar mensagem com a lista de sorteios
-    response = "🎰 *Sorteios Ativos* 🎰\n\n"
+    parts = ["🎰 *Sorteios Ativos* 🎰\n"]
+    now = datetime.now()
     
     for giveaway_id, giveaway in giveaways.items():
-        if giveaway['status'] == 'active':
-            end_date = datetime.fromisoformat(giveaway["ends_at"])
-            remaining_time = end_date - datetime.now()
-            participants_count = len(giveaway.get('participants', {}))
-            max_participants = giveaway.get('max_participants', 'Sem limite')
-            
-            response += f"ID: `{giveaway_id}`\n"
-            response += f"Plano: *{giveaway['plan_name']}*\n"
-            response += f"Ganhadores: {giveaway['winners_count']}\n"
-            response += f"Participantes: {participants_count}/{max_participants}\n"
-            response += f"Encerra em: {remaining_time.days}d {remaining_time.seconds//3600}h {(remaining_time.seconds%3600)//60}m\n"
-            response += f"Status: {giveaway['status']}\n\n"
+        remaining_time = _ends_at_dt(giveaway) - now
+        participants_count = len(giveaway.get('participants', {}))
+        max_participants = giveaway.get('max_participants', 'Sem limite')
+        
+        parts.append(
+            f"ID: `{giveaway_id}`\n"
+            f"Plano: *{giveaway['plan_name']}*\n"
+            f"Ganhadores: {giveaway['winners_count']}\n"
+            f"Participantes: {participants_count}/{max_participants}\n"
+            f"Encerra em: {fmt_remaining(remaining_time)}\n"
+            f"Status: {giveaway['status']}\n"
+        )
     
-    bot.reply_to(message, response, parse_mode="Markdown")
+    bot.reply_to(message, "\n".join(parts), parse_mode="Markdown")
 
+@admin_only
 def giveaway_draw_command(message, giveaway_id):
     """Comando para sortear ganhadores de um sorteio"""
-    # Verificar se o usuário é admin
-    user_id = str(message.from_user.id)
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(message, "⛔ Acesso negado. Este comando é exclusivo para administradores.")
-        return
-    
     # Verificar se o sorteio existe
     giveaway = get_giveaway(giveaway_id)
     if not giveaway:
@@ -5500,10 +5654,8 @@ def giveaway_draw_command(message, giveaway_id):
         return
     
     # Sorteio está ativo e ainda não expirou - pedir confirmação
-    end_time = datetime.fromisoformat(giveaway["ends_at"])
+    end_time = _ends_at_dt(giveaway)
     remaining_time = end_time - datetime.now()
-    hours, remainder = divmod(remaining_time.seconds, 3600)
-    minutes, _ = divmod(remainder, 60)
     
     # Criar botões de confirmação
     keyboard = types.InlineKeyboardMarkup()
@@ -5517,7 +5669,7 @@ def giveaway_draw_command(message, giveaway_id):
     bot.reply_to(
         message,
         f"⚠️ *ATENÇÃO: Sorteio Antecipado* ⚠️\n\n"
-        f"Este sorteio ainda está ativo e terminaria em *{remaining_time.days}d {hours}h {minutes}m*.\n\n"
+        f"Este sorteio ainda está ativo e terminaria em *{fmt_remaining(remaining_time)}*.\n\n"
         f"Detalhes do sorteio:\n"
         f"ID: `{giveaway_id}`\n"
         f"Plano: *{giveaway['plan_name']}*\n"
@@ -5527,7 +5679,48 @@ def giveaway_draw_command(message, giveaway_id):
         parse_mode="Markdown"
     )
 
+def _notify_winner(winner_id, giveaway_id, plan_name):
+    """Envia ao ganhador a mensagem com o botão de confirmação (executado no NOTIFY_POOL)"""
+    try:
+        # Criar botão de confirmação
+        keyboard = types.InlineKeyboardMarkup()
+        keyboard.add(
+            types.InlineKeyboardButton(
+                "✅ Confirmar Participação", 
+                callback_data=f"confirm_giveaway_{giveaway_id}"
+            )
+        )
+        
+        # Enviar mensagem para o ganhador
+        send_message_limited(
+            winner_id,
+            WINNER_DM_TEMPLATE.format(plan_name=plan_name),
+            parse_mode="Markdown",
+            reply_markup=keyboard
+        )
+    except Exception as e:
+        logger.error(f"Erro ao notificar ganhador {winner_id}: {e}")
+
+def _notify_redraw_winner(winner_id, giveaway_id, plan_name):
+    """Notifica o ganhador de um novo sorteio e avisa o admin da substituição (executado no NOTIFY_POOL)"""
+    _notify_winner(winner_id, giveaway_id, plan_name)
+    
+    try:
+        bot.send_message(
+            ADMIN_ID,
+            f"🔄 *NOVO SORTEIO REALIZADO* 🔄\n\n"
+            f"Sorteio #{giveaway_id}\n"
+            f"Plano: {plan_name}\n"
+            f"Novo ganhador: {winner_id}\n"
+            f"(Substituindo ganhador que não confirmou)",
+            parse_mode="Markdown"
+        )
+    except Exception as e:
+        logger.error(f"Erro ao notificar administrador sobre novo ganhador {winner_id}: {e}")
+
 @bot.callback_query_handler(func=lambda call: call.data.startswith("confirm_early_draw_"))
+@admin_only
+@ack_callback
 def confirm_early_draw_callback(call):
     """Confirma o sorteio antecipado de um giveaway"""
     giveaway_id = call.data.replace("confirm_early_draw_", "")
@@ -5548,163 +5741,106 @@ def confirm_early_draw_callback(call):
     )
     
     # Realizar o sorteio com o parâmetro force=True
-    winners = draw_giveaway_winners(giveaway_id, force=True)
-    
-    # Responder ao callback
-    if winners is None:
-        bot.send_message(
-            call.message.chat.id,
-            "❌ Erro ao realizar o sorteio.",
-            reply_to_message_id=call.message.message_id
-        )
-        return
-    
-    if len(winners) == 0:
-        bot.send_message(
-            call.message.chat.id,
-            "⚠️ Não há participantes suficientes para realizar o sorteio.",
-            reply_to_message_id=call.message.message_id
-        )
-        return
-    
-    # Obter detalhes do sorteio
-    giveaway = get_giveaway(giveaway_id)
-    
-    # Enviar mensagem com os ganhadores
-    response = f"🎉 *Sorteio #{giveaway_id} - Ganhadores* 🎉\n\n"
-    response += f"Plano: *{giveaway['plan_name']}*\n"
-    response += f"Total de participantes: {len(giveaway.get('participants', {}))}\n\n"
-    response += f"*Ganhadores:*\n"
-    
-    for winner_id in winners:
-        # Buscar informações do usuário (nome, username)
-        participant = giveaway['participants'].get(winner_id, {})
-        username = participant.get('username', 'N/A')
-        first_name = participant.get('first_name', 'Usuário')
-        response += f"- {first_name} (@{username}) - ID: `{winner_id}`\n"
-    
-    response += "\n⚠️ Cada ganhador tem 10 minutos para confirmar a vitória."
-    
-    bot.send_message(
-        call.message.chat.id,
-        response,
-        parse_mode="Markdown"
-    )
-    
-    # Notificar os ganhadores
-    for winner_id in winners:
-        try:
-            # Criar botão de confirmação
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(
-                types.InlineKeyboardButton(
-                    "✅ Confirmar Participação", 
-                    callback_data=f"confirm_giveaway_{giveaway_id}"
-                )
-            )
-            
-            # Enviar mensagem para o ganhador
-            bot.send_message(
-                winner_id,
-                f"🎉 *PARABÉNS! Você foi sorteado!* 🎉\n\n"
-                f"Você ganhou o seguinte plano no sorteio:\n"
-                f"*{giveaway['plan_name']}*\n\n"
-                f"⚠️ *ATENÇÃO*: Você tem 10 minutos para confirmar sua participação clicando no botão abaixo.\n"
-                f"Caso contrário, um novo ganhador será sorteado.",
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logger.error(f"Erro ao notificar ganhador {winner_id}: {e}")
+    winners, giveaway = draw_giveaway_winners(giveaway_id, force=True, return_giveaway=True)
+    _announce_and_notify(call.message, giveaway_id, winners, giveaway, reply=False)
 
 @bot.callback_query_handler(func=lambda call: call.data == "cancel_early_draw")
+@admin_only
+@ack_callback
 def cancel_early_draw_callback(call):
     """Cancela o sorteio antecipado"""
-    # Remover o teclado e atualizar a mensagem
+    # Remover o teclado e atualizar a mensagem (o callback já foi respondido pelo ack_callback)
     bot.edit_message_text(
-        "❌ Sorteio antecipado cancelado.",
+        "❌ Sorteio antecipado cancelado.\n\nO sorteio continuará normalmente até o final do prazo.",
         chat_id=call.message.chat.id,
         message_id=call.message.message_id
     )
     
-    # Responder ao callback
-    bot.answer_callback_query(
-        call.id,
-        "Operação cancelada. O sorteio continuará normalmente até o final do prazo."
-    )
-    
 def perform_draw(message, giveaway_id):
     """Função auxiliar para realizar o sorteio"""
     # Realizar o sorteio
-    winners = draw_giveaway_winners(giveaway_id)
-    
+    winners, giveaway = draw_giveaway_winners(giveaway_id, return_giveaway=True)
+    _announce_and_notify(message, giveaway_id, winners, giveaway, reply=True)
+
+# Modelos das mensagens de resultado de sorteio (só as partes variáveis são formatadas)
+WINNERS_HEADER_TEMPLATE = (
+    "🎉 *Sorteio #{giveaway_id} - Ganhadores* 🎉\n\n"
+    "Plano: *{plan_name}*\n"
+    "Total de participantes: {participants_count}\n\n"
+    "*Ganhadores:*\n"
+)
+WINNER_LINE_TEMPLATE = "- {first_name} (@{username}) - ID: `{winner_id}`\n"
+WINNERS_FOOTER = "\n⚠️ Cada ganhador tem 10 minutos para confirmar a vitória."
+WINNER_DM_TEMPLATE = (
+    "🎉 *PARABÉNS! Você foi sorteado!* 🎉\n\n"
+    "Você ganhou o seguinte plano no sorteio:\n"
+    "*{plan_name}*\n\n"
+    "⚠️ *ATENÇÃO*: Você tem 10 minutos para confirmar sua participação clicando no botão abaixo.\n"
+    "Caso contrário, um novo ganhador será sorteado."
+)
+
+def _announce_and_notify(message, giveaway_id, winners, giveaway, reply=True):
+    """
+    Publica o resultado de um sorteio e notifica os ganhadores.
+    Usado pelo sorteio via comando (reply=True, responde à mensagem) e pelo sorteio
+    antecipado via botão (reply=False, envia uma nova mensagem no chat).
+    """
     if winners is None:
-        bot.reply_to(
-            message, 
-            "❌ Não foi possível realizar o sorteio. Verifique se o sorteio existe e está ativo."
-        )
+        if reply:
+            bot.reply_to(
+                message, 
+                "❌ Não foi possível realizar o sorteio. Verifique se o sorteio existe e está ativo."
+            )
+        else:
+            bot.send_message(
+                message.chat.id,
+                "❌ Erro ao realizar o sorteio.",
+                reply_to_message_id=message.message_id
+            )
         return
     
     if len(winners) == 0:
-        bot.reply_to(
-            message, 
-            "⚠️ Não há participantes suficientes para realizar o sorteio."
-        )
+        no_participants_msg = "⚠️ Não há participantes suficientes para realizar o sorteio."
+        if reply:
+            bot.reply_to(message, no_participants_msg)
+        else:
+            bot.send_message(message.chat.id, no_participants_msg, reply_to_message_id=message.message_id)
         return
     
-    # Obter detalhes do sorteio
-    giveaway = get_giveaway(giveaway_id)
+    # Dados do sorteio já carregados por draw_giveaway_winners
+    participants = giveaway['participants']
+    plan_name = giveaway['plan_name']
     
     # Enviar mensagem com os ganhadores
-    response = f"🎉 *Sorteio #{giveaway_id} - Ganhadores* 🎉\n\n"
-    response += f"Plano: *{giveaway['plan_name']}*\n"
-    response += f"Total de participantes: {len(giveaway.get('participants', {}))}\n\n"
-    response += f"*Ganhadores:*\n"
+    parts = [WINNERS_HEADER_TEMPLATE.format(
+        giveaway_id=giveaway_id, plan_name=plan_name, participants_count=len(participants)
+    )]
     
     for winner_id in winners:
         # Buscar informações do usuário (nome, username)
-        participant = giveaway['participants'].get(winner_id, {})
-        username = participant.get('username', 'N/A')
-        first_name = participant.get('first_name', 'Usuário')
-        response += f"- {first_name} (@{username}) - ID: `{winner_id}`\n"
+        participant = participants.get(winner_id, {})
+        parts.append(WINNER_LINE_TEMPLATE.format(
+            first_name=participant.get('first_name', 'Usuário'),
+            username=participant.get('username', 'N/A'),
+            winner_id=winner_id
+        ))
     
-    response += "\n⚠️ Cada ganhador tem 10 minutos para confirmar a vitória."
+    parts.append(WINNERS_FOOTER)
+    response = "".join(parts)
     
-    bot.reply_to(message, response, parse_mode="Markdown")
+    if reply:
+        bot.reply_to(message, response, parse_mode="Markdown")
+    else:
+        bot.send_message(message.chat.id, response, parse_mode="Markdown")
     
-    # Notificar os ganhadores
+    # Notificar os ganhadores em segundo plano
     for winner_id in winners:
-        try:
-            # Criar botão de confirmação
-            keyboard = types.InlineKeyboardMarkup()
-            keyboard.add(
-                types.InlineKeyboardButton(
-                    "✅ Confirmar Participação", 
-                    callback_data=f"confirm_giveaway_{giveaway_id}"
-                )
-            )
-            
-            # Enviar mensagem para o ganhador
-            bot.send_message(
-                winner_id,
-                f"🎉 *PARABÉNS! Você foi sorteado!* 🎉\n\n"
-                f"Você ganhou o seguinte plano no sorteio:\n"
-                f"*{giveaway['plan_name']}*\n\n"
-                f"⚠️ *ATENÇÃO*: Você tem 10 minutos para confirmar sua participação clicando no botão abaixo.\n"
-                f"Caso contrário, um novo ganhador será sorteado.",
-                parse_mode="Markdown",
-                reply_markup=keyboard
-            )
-        except Exception as e:
-            logger.error(f"Erro ao notificar ganhador {winner_id}: {e}")
+        NOTIFY_POOL.submit(_notify_winner, winner_id, giveaway_id, plan_name)
 
+@admin_only
 def giveaway_cancel_command(message, giveaway_id):
     """Comando para cancelar um sorteio"""
-    # Verificar se o usuário é admin
     user_id = str(message.from_user.id)
-    if not is_admin_telegram_id(user_id):
-        bot.reply_to(message, "⛔ Acesso negado. Este comando é exclusivo para administradores.")
-        return
     
     # Cancelar o sorteio
     success = cancel_giveaway(giveaway_id, user_id)
@@ -5721,6 +5857,46 @@ def giveaway_cancel_command(message, giveaway_id):
         )
 
 # Comandos para usuários visualizarem sorteios ativos
+# Teclados da lista de sorteios já montados: (minuto, ids dos sorteios abertos) -> teclado
+_KB_CACHE = {}
+KB_CACHE_MAX_ENTRIES = 64
+
+def _get_or_build_giveaway_list_kb(eligible):
+    """
+    Retorna o teclado com os sorteios abertos (lista de (id, sorteio) já filtrada),
+    montando-o apenas quando necessário. O texto dos botões muda a cada minuto (tempo
+    restante), então o minuto atual faz parte da chave do cache junto com os sorteios.
+    """
+    now = datetime.now()
+    minute_bucket = int(now.timestamp() // 60)
+    key = (minute_bucket, tuple(giveaway_id for giveaway_id, _ in eligible))
+    
+    keyboard = _KB_CACHE.get(key)
+    if keyboard is not None:
+        return keyboard
+    
+    keyboard = types.InlineKeyboardMarkup(row_width=1)
+    
+    for giveaway_id, giveaway in eligible:
+        # Adicionar botão para o sorteio com o tempo restante
+        plan_name = giveaway.get('plan_name', 'Desconhecido')
+        keyboard.add(
+            types.InlineKeyboardButton(
+                f"{plan_name} - {fmt_remaining_hours(_ends_at_dt(giveaway) - now)}", 
+                callback_data=f"giveaway_details_{giveaway_id}"
+            )
+        )
+    
+    # Adicionar botão para voltar
+    keyboard.add(
+        types.InlineKeyboardButton("🔙 Voltar", callback_data="start")
+    )
+    
+    if len(_KB_CACHE) >= KB_CACHE_MAX_ENTRIES:
+        _KB_CACHE.clear()
+    _KB_CACHE[key] = keyboard
+    return keyboard
+
 @bot.callback_query_handler(func=lambda call: call.data == "view_active_giveaways")
 def view_active_giveaways(call):
     """Permite que um usuário veja os sorteios ativos e participe"""
@@ -5737,50 +5913,16 @@ def view_active_giveaways(call):
         back_to_start(call)
         return
     
-    # Criar mensagem com a lista de sorteios
-    response = "🎁 *Sorteios Ativos* 🎁\n\n" 
-    response += "Escolha um sorteio para participar:\n\n"
-    
-    # Criar teclado com botões para cada sorteio
-    keyboard = types.InlineKeyboardMarkup(row_width=1)
-    
-    for giveaway_id, giveaway in active_giveaways.items():
-        if giveaway.get('status') == 'active':
-            # Calcular tempo restante
-            end_date = datetime.fromisoformat(giveaway["ends_at"])
-            remaining_time = end_date - datetime.now()
-            remaining_hours = remaining_time.total_seconds() / 3600
-            remaining_minutes = (remaining_time.total_seconds() % 3600) / 60
-            
-            # Verificar se o sorteio tem limite de participantes
-            participants_count = len(giveaway.get('participants', []))
-            max_participants = giveaway.get('max_participants')
-            participants_text = f"{participants_count}" 
-            if max_participants:
-                participants_text += f"/{max_participants}"
-                
-                # Verificar se já atingiu o limite
-                if participants_count >= max_participants:
-                    continue  # Pular este sorteio pois já está cheio
-            else:
-                participants_text += "/∞"
-            
-            # Adicionar botão para o sorteio
-            plan_name = giveaway.get('plan_name', 'Desconhecido')
-            keyboard.add(
-                types.InlineKeyboardButton(
-                    f"{plan_name} - {int(remaining_hours)}h {int(remaining_minutes)}min", 
-                    callback_data=f"giveaway_details_{giveaway_id}"
-                )
-            )
-    
-    # Adicionar botão para voltar
-    keyboard.add(
-        types.InlineKeyboardButton("🔙 Voltar", callback_data="start")
-    )
+    # Sorteios que ainda aceitam participantes
+    eligible = [
+        (giveaway_id, giveaway) for giveaway_id, giveaway in active_giveaways.items()
+        if giveaway.get('status') == 'active'
+        and (not giveaway.get('max_participants')
+             or len(giveaway.get('participants', [])) < giveaway['max_participants'])
+    ]
     
     # Verificar se há sorteios disponíveis
-    if len(keyboard.keyboard) <= 1:  # Se só tiver o botão de voltar
+    if not eligible:
         bot.answer_callback_query(
             call.id, 
             "Não há sorteios disponíveis ou todos já estão com limite de participantes atingido.", 
@@ -5790,6 +5932,13 @@ def view_active_giveaways(call):
         back_to_start(call)
         return
     
+    # Criar mensagem com a lista de sorteios
+    response = "🎁 *Sorteios Ativos* 🎁\n\n" 
+    response += "Escolha um sorteio para participar:\n\n"
+    
+    # Teclado com um botão por sorteio (reaproveitado enquanto nada muda no minuto atual)
+    keyboard = _get_or_build_giveaway_list_kb(eligible)
+    
     # Editar a mensagem com a lista de sorteios
     bot.edit_message_text(
         response,
@@ -5817,10 +5966,8 @@ def view_giveaway_details(call):
         return
     
     # Calcular tempo restante
-    end_date = datetime.fromisoformat(giveaway["ends_at"])
+    end_date = _ends_at_dt(giveaway)
     remaining_time = end_date - datetime.now()
-    remaining_hours = remaining_time.total_seconds() / 3600
-    remaining_minutes = (remaining_time.total_seconds() % 3600) / 60
     
     # Verificar se o usuário já está participando
     user_is_participant = str(user_id) in giveaway.get('participants', [])
@@ -5841,7 +5988,7 @@ def view_giveaway_details(call):
         f"Prêmio: *{plan_name}*\n"
         f"Número de ganhadores: *{winners_count}*\n"
         f"Participantes atuais: *{participants_text}*\n"
-        f"Tempo restante: *{int(remaining_hours)}h {int(remaining_minutes)}min*\n\n"
+        f"Tempo restante: *{fmt_remaining_hours(remaining_time)}*\n\n"
     )
     
     if user_is_participant:
@@ -5872,6 +6019,53 @@ def view_giveaway_details(call):
         parse_mode="Markdown"
     )
 
+# Atualizações pendentes do botão "Participar": (chat_id, message_id) -> giveaway_id.
+# Várias entradas dentro da janela geram uma única edição, já com a contagem final.
+JOIN_EDIT_DEBOUNCE_SECONDS = 1
+_pending_join_edits = {}
+_pending_join_edits_lock = threading.Lock()
+
+def _schedule_join_button_edit(chat_id, message_id, giveaway_id):
+    """Agenda a atualização do botão de participação, se ainda não houver uma pendente"""
+    key = (chat_id, message_id)
+    with _pending_join_edits_lock:
+        if key in _pending_join_edits:
+            return
+        _pending_join_edits[key] = giveaway_id
+    
+    timer = threading.Timer(JOIN_EDIT_DEBOUNCE_SECONDS, _flush_join_button_edit, args=key)
+    timer.daemon = True
+    timer.start()
+
+def _flush_join_button_edit(chat_id, message_id):
+    """Edita o botão de participação com a contagem atual de participantes"""
+    with _pending_join_edits_lock:
+        giveaway_id = _pending_join_edits.pop((chat_id, message_id), None)
+    if giveaway_id is None:
+        return
+    
+    giveaway = get_giveaway(giveaway_id)
+    if not giveaway:
+        return
+    
+    current = len(giveaway.get('participants', {}))
+    maximum = giveaway.get('max_participants')
+    keyboard = types.InlineKeyboardMarkup()
+    button_text = f"🎲 Participar do Sorteio ({current}/{maximum if maximum else '∞'})"
+    keyboard.add(
+        types.InlineKeyboardButton(button_text, callback_data=f"join_giveaway_{giveaway_id}")
+    )
+    
+    try:
+        bot.edit_message_reply_markup(
+            chat_id=chat_id,
+            message_id=message_id,
+            reply_markup=keyboard
+        )
+    except Exception as e:
+        if "message is not modified" not in str(e):
+            logger.error(f"Erro ao atualizar botão de sorteio: {e}")
+
 # Comandos para usuários participarem dos sorteios
 @bot.callback_query_handler(func=lambda call: call.data.startswith("join_giveaway_"))
 def join_giveaway_callback(call):
@@ -5906,29 +6100,34 @@ def join_giveaway_callback(call):
         )
         return
     
-    # Atualizar o botão com o número atual de participantes
-    keyboard = types.InlineKeyboardMarkup()
-    button_text = f"🎲 Participar do Sorteio ({current}/{maximum if maximum else '∞'})"
-    keyboard.add(
-        types.InlineKeyboardButton(button_text, callback_data=f"join_giveaway_{giveaway_id}")
-    )
-    
-    try:
-        # Tentar atualizar a mensagem original
-        bot.edit_message_reply_markup(
-            chat_id=call.message.chat.id,
-            message_id=call.message.message_id,
-            reply_markup=keyboard
-        )
-    except Exception as e:
-        logger.error(f"Erro ao atualizar botão de sorteio: {e}")
-    
     # Notificar o usuário
     bot.answer_callback_query(
         call.id, 
         "✅ Você está participando do sorteio! Os vencedores serão anunciados quando o sorteio terminar.", 
         show_alert=True
     )
+    
+    # Atualizar o botão com o número de participantes (agrupando entradas próximas)
+    _schedule_join_button_edit(call.message.chat.id, call.message.message_id, giveaway_id)
+
+def _notify_admin_win_confirmed(giveaway_id, user_id, first_name):
+    """Avisa o admin que criou o sorteio que o ganhador confirmou (executado no NOTIFY_POOL)"""
+    try:
+        giveaway = get_giveaway(giveaway_id)
+        if giveaway:
+            admin_id = giveaway.get('admin_id')
+            if admin_id:
+                bot.send_message(
+                    admin_id,
+                    f"✅ *Confirmação de Vitória* ✅\n\n"
+                    f"Sorteio: #{giveaway_id}\n"
+                    f"Usuário: {first_name} (ID: {user_id})\n"
+                    f"Plano: {giveaway['plan_name']}\n\n"
+                    f"O ganhador confirmou a vitória e está aguardando o envio do login.",
+                    parse_mode="Markdown"
+                )
+    except Exception as e:
+        logger.error(f"Erro ao notificar administrador sobre confirmação: {e}")
 
 @bot.callback_query_handler(func=lambda call: call.data.startswith("confirm_giveaway_"))
 def confirm_giveaway_win_callback(call):
@@ -5957,23 +6156,8 @@ def confirm_giveaway_win_callback(call):
         parse_mode="Markdown"
     )
     
-    # Notificar o administrador
-    try:
-        giveaway = get_giveaway(giveaway_id)
-        if giveaway:
-            admin_id = giveaway.get('admin_id')
-            if admin_id:
-                bot.send_message(
-                    admin_id,
-                    f"✅ *Confirmação de Vitória* ✅\n\n"
-                    f"Sorteio: #{giveaway_id}\n"
-                    f"Usuário: {call.from_user.first_name} (ID: {user_id})\n"
-                    f"Plano: {giveaway['plan_name']}\n\n"
-                    f"O ganhador confirmou a vitória e está aguardando o envio do login.",
-                    parse_mode="Markdown"
-                )
-    except Exception as e:
-        logger.error(f"Erro ao notificar administrador sobre confirmação: {e}")
+    # Notificar o administrador em segundo plano
+    NOTIFY_POOL.submit(_notify_admin_win_confirmed, giveaway_id, user_id, call.from_user.first_name)
     
     # Responder ao callback
     bot.answer_callback_query(
@@ -5982,20 +6166,55 @@ def confirm_giveaway_win_callback(call):
         show_alert=True
     )
 
-# Track if the bot is already running, mas de uma forma menos restritiva
-_bot_running = False
+# Trava de arquivo que garante uma única instância do bot entre processos
+# (ex.: reloader do Flask em modo debug ou vários workers do gunicorn)
+BOT_LOCK_FILE = os.path.join(DATA_DIR, 'bot.lock')
+_bot_lock_file = None
+
+def _acquire_bot_lock():
+    """Tenta obter a trava exclusiva do bot. Retorna False se outra instância já a possui."""
+    global _bot_lock_file
+    if _bot_lock_file is not None:
+        return False
+    if fcntl is None:
+        # Sem fcntl (Windows) não há como travar entre processos; seguimos sem a trava
+        return True
+    
+    # 'a+' não trunca o arquivo: uma instância recusada não apaga o PID de quem tem a trava
+    lock_file = open(BOT_LOCK_FILE, 'a+')
+    try:
+        fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except BlockingIOError:
+        lock_file.close()
+        return False
+    
+    lock_file.seek(0)
+    lock_file.truncate()
+    lock_file.write(str(os.getpid()))
+    lock_file.flush()
+    _bot_lock_file = lock_file
+    return True
+
+def _release_bot_lock():
+    """Libera a trava do bot, se esta instância a possuir"""
+    global _bot_lock_file
+    if _bot_lock_file is None:
+        return
+    try:
+        fcntl.flock(_bot_lock_file.fileno(), fcntl.LOCK_UN)
+        _bot_lock_file.close()
+    except Exception as e:
+        logger.error(f"Erro ao liberar a trava do bot: {e}")
+    _bot_lock_file = None
 
 # Main function to start bot
 def run_bot():
-    global _bot_running
-    
-    # Se o bot já estiver executando, registramos o evento mas seguimos com
-    # a inicialização. Isso permite que múltiplas chamadas da função não interrompam
-    # o funcionamento do bot caso uma instância falhe.
-    if _bot_running:
-        logger.info("Bot may already be running in another thread/process")
+    # Se outra instância (thread ou processo) já estiver executando o bot, não iniciamos
+    # outra: dois loops de polling disputariam as mesmas atualizações do Telegram
+    if not _acquire_bot_lock():
+        logger.warning("Bot is already running in another thread/process, not starting a second instance")
+        return
     
-    _bot_running = True
     logger.info("Starting Telegram bot...")
     
     # Corrigir pagamentos inconsistentes antes de iniciar o bot
@@ -6011,10 +6230,25 @@ def run_bot():
     # Iniciar tarefas em segundo plano
     start_background_tasks()
     
-    # Primeiro, tentar limpar quaisquer atualizações pendentes
+    # Modo webhook: o Telegram envia as atualizações para a rota /telegram/webhook do Flask,
+    # então não mantemos uma thread fazendo long polling
+    if USE_WEBHOOK and not WEBHOOK_SECRET:
+        # Sem segredo, a rota do webhook não tem como distinguir o Telegram de uma requisição forjada
+        logger.error("USE_WEBHOOK está ativo, mas WEBHOOK_SECRET não foi definido; usando polling")
+    elif USE_WEBHOOK:
+        try:
+            bot.remove_webhook()
+            bot.set_webhook(url=WEBHOOK_URL, secret_token=WEBHOOK_SECRET)
+            logger.info(f"Webhook configurado em {WEBHOOK_URL}")
+        except Exception as e:
+            logger.error(f"Erro ao configurar webhook: {e}")
+            _release_bot_lock()
+        return
+    
+    # Primeiro, limpar quaisquer atualizações pendentes (e um webhook antigo, se houver)
     # para evitar conflitos com outras instâncias
     try:
-        bot.get_updates(offset=-1, timeout=1)
+        bot.delete_webhook(drop_pending_updates=True)
     except Exception as e:
         logger.warning(f"Error clearing pending updates: {e}")
     
@@ -6024,7 +6258,7 @@ def run_bot():
     except Exception as e:
         logger.error(f"Bot polling error: {e}")
     finally:
-        _bot_running = False
+        _release_bot_lock()
         logger.info("Bot stopped running")
 
 if __name__ == "__main__":
@@ -2,6 +2,8 @@ import os
 import json
 import secrets
 from datetime import datetime
+from types import MappingProxyType
+from typing import NamedTuple
 
 # Bot configuration
 BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN')
@@ -12,6 +14,11 @@ try:
 except ValueError:
     ADMIN_ID = 0
 
+# Webhook mode (optional): Telegram posts updates to the Flask app instead of the bot long-polling
+USE_WEBHOOK = os.getenv('USE_WEBHOOK', 'false').lower() in ('1', 'true', 'yes')
+WEBHOOK_URL = os.getenv('WEBHOOK_URL', '')
+WEBHOOK_SECRET = os.getenv('WEBHOOK_SECRET', '')
+
 # File paths
 DATA_DIR = 'data'
 USERS_FILE = f'{DATA_DIR}/users.json'
@@ -30,111 +37,91 @@ SESSION_EXPIRY_HOURS = 24
 os.makedirs(DATA_DIR, exist_ok=True)
 
 # Plans and pricing
-PLANS = {
-    '30_days': {
-        'name': 'Plano 30 Dias',
-        'duration_days': 30,
-        'first_buy_price': 9.00,
-        'regular_price': 20.00,
-        'first_buy_discount': True
-    },
-    '6_months': {
-        'name': 'Plano 6 Meses',
-        'duration_days': 180,
-        'first_buy_price': 40.00,  # 50 with 20% discount
-        'regular_price': 50.00,
-        'first_buy_discount': True
+class Plan(NamedTuple):
+    name: str
+    duration_days: int
+    first_buy_price: float
+    regular_price: float
+    first_buy_discount: bool
+
+# Imutável: evita que algum handler altere preços/nomes em memória por engano
+PLANS = MappingProxyType({
+    '30_days': Plan(
+        name='Plano 30 Dias',
+        duration_days=30,
+        first_buy_price=9.00,
+        regular_price=20.00,
+        first_buy_discount=True
+    ),
+    '6_months': Plan(
+        name='Plano 6 Meses',
+        duration_days=180,
+        first_buy_price=40.00,  # 50 with 20% discount
+        regular_price=50.00,
+        first_buy_discount=True
+    ),
+    '1_year': Plan(
+        name='Plano 1 Ano',
+        duration_days=365,
+        first_buy_price=110.00,
+        regular_price=110.00,
+        first_buy_discount=False
+    )
+})
+
+# Conteúdo inicial de cada arquivo de dados, já serializado uma única vez
+_DEFAULT_BOT_CONFIG = {
+    'sales_enabled': True,
+    'warning_sent': False,
+    'sales_suspended_time': None,
+    'coupons': {},
+    'referral_rewards': {
+        'referrer_discount': 10,  # 10% discount
+        'referred_discount': 5,   # 5% discount for referred user
+        'free_month_after_referrals': 3  # Number of successful referrals for free month
     },
-    '1_year': {
-        'name': 'Plano 1 Ano',
-        'duration_days': 365,
-        'first_buy_price': 110.00,
-        'regular_price': 110.00,
-        'first_buy_discount': False
+    'payment_settings': {
+        'pix': {
+            'enabled': True,
+            'key': 'nossaempresa@email.com',
+            'name': 'Empresa UniTV LTDA',
+            'bank': 'Banco UniTV'
+        },
+        'mercado_pago': {
+            'enabled': False,
+            'access_token': '',
+            'public_key': ''
+        }
     }
 }
 
+_DEFAULT_AUTH = {
+    'admin_telegram_ids': [ADMIN_ID] if ADMIN_ID else [],
+    'allowed_telegram_ids': [],  # Telegram IDs allowed to access the admin panel
+    'access_codes': {}
+}
+
+_DEFAULT_FILE_CONTENTS = {
+    USERS_FILE: json.dumps({}),
+    PAYMENTS_FILE: json.dumps({}),
+    LOGINS_FILE: json.dumps({'30_days': [], '6_months': [], '1_year': []}),
+    BOT_CONFIG_FILE: json.dumps(_DEFAULT_BOT_CONFIG, indent=4),
+    AUTH_FILE: json.dumps(_DEFAULT_AUTH, indent=4),  # stores admin Telegram IDs
+    SESSION_FILE: json.dumps({}),  # stores active login sessions
+    GIVEAWAYS_FILE: json.dumps({'active': {}, 'completed': {}, 'current_id': 0}, indent=4),
+    TICKETS_FILE: json.dumps({'active': {}, 'closed': {}, 'current_id': 0}, indent=4),  # tickets de suporte
+}
+
 # Initialize JSON files if they don't exist
 def init_json_files():
-    # Create users.json if it doesn't exist
-    if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, 'w') as f:
-            json.dump({}, f)
-    
-    # Create payments.json if it doesn't exist
-    if not os.path.exists(PAYMENTS_FILE):
-        with open(PAYMENTS_FILE, 'w') as f:
-            json.dump({}, f)
-    
-    # Create logins.json if it doesn't exist
-    if not os.path.exists(LOGINS_FILE):
-        with open(LOGINS_FILE, 'w') as f:
-            json.dump({
-                '30_days': [],
-                '6_months': [],
-                '1_year': []
-            }, f)
-    
-    # Create bot_config.json if it doesn't exist
-    if not os.path.exists(BOT_CONFIG_FILE):
-        default_config = {
-            'sales_enabled': True,
-            'warning_sent': False,
-            'sales_suspended_time': None,
-            'coupons': {},
-            'referral_rewards': {
-                'referrer_discount': 10,  # 10% discount
-                'referred_discount': 5,   # 5% discount for referred user
-                'free_month_after_referrals': 3  # Number of successful referrals for free month
-            },
-            'payment_settings': {
-                'pix': {
-                    'enabled': True,
-                    'key': 'nossaempresa@email.com',
-                    'name': 'Empresa UniTV LTDA',
-                    'bank': 'Banco UniTV'
-                },
-                'mercado_pago': {
-                    'enabled': False,
-                    'access_token': '',
-                    'public_key': ''
-                }
-            }
-        }
-        with open(BOT_CONFIG_FILE, 'w') as f:
-            json.dump(default_config, f, indent=4)
-    
-    # Create auth.json if it doesn't exist (stores admin Telegram IDs)
-    if not os.path.exists(AUTH_FILE):
-        auth_config = {
-            'admin_telegram_ids': [ADMIN_ID] if ADMIN_ID else [],
-            'allowed_telegram_ids': []  # Telegram IDs allowed to access the admin panel
-        }
-        with open(AUTH_FILE, 'w') as f:
-            json.dump(auth_config, f, indent=4)
-    
-    # Create sessions.json if it doesn't exist (stores active login sessions)
-    if not os.path.exists(SESSION_FILE):
-        with open(SESSION_FILE, 'w') as f:
-            json.dump({}, f)
-    
-    # Create giveaways.json if it doesn't exist
-    if not os.path.exists(GIVEAWAYS_FILE):
-        with open(GIVEAWAYS_FILE, 'w') as f:
-            json.dump({
-                'active': {},
-                'completed': {},
-                'current_id': 0
-            }, f, indent=4)
+    # Uma única listagem do diretório em vez de um os.path.exists por arquivo
+    existing = {entry.name for entry in os.scandir(DATA_DIR)}
     
-    # Create tickets.json if it doesn't exist (para armazenar tickets de suporte)
-    if not os.path.exists(TICKETS_FILE):
-        with open(TICKETS_FILE, 'w') as f:
-            json.dump({
-                'active': {},
-                'closed': {},
-                'current_id': 0
-            }, f, indent=4)
+    for file_path, content in _DEFAULT_FILE_CONTENTS.items():
+        if os.path.basename(file_path) not in existing:
+            with open(file_path, 'w') as f:
+                f.write(content)
 
-# Initialize the files
-init_json_files()
+# Initialize the files (SKIP_DATA_INIT=1 pula a verificação em ambientes onde os arquivos já existem)
+if os.getenv('SKIP_DATA_INIT', 'false').lower() not in ('1', 'true', 'yes'):
+    init_json_files()
@@ -1,8 +1,13 @@
 #!/usr/bin/env python3
 import json
+import os
 import logging
 from datetime import datetime
 import uuid
+try:
+    import orjson  # opcional: serialização bem mais rápida para arquivos grandes
+except ImportError:
+    orjson = None
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
@@ -16,16 +21,33 @@ LOGINS_FILE = 'data/logins.json'
 # Functions
 def read_json_file(file_path):
     try:
+        if orjson is not None:
+            with open(file_path, 'rb') as f:
+                return orjson.loads(f.read())
         with open(file_path, 'r', encoding='utf-8') as f:
             return json.load(f)
+    # orjson.JSONDecodeError é subclasse de json.JSONDecodeError
     except (FileNotFoundError, json.JSONDecodeError) as e:
         logger.error(f"Error loading {file_path}: {e}")
         return {}
 
 def write_json_file(file_path, data):
     try:
-        with open(file_path, 'w', encoding='utf-8') as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        if orjson is not None:
+            buf = orjson.dumps(data, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+        else:
+            buf = json.dumps(data, ensure_ascii=False, indent=2).encode('utf-8')
+        
+        # Grava em um arquivo temporário e troca de uma vez, para não truncar o original
+        tmp_path = f"{file_path}.{os.getpid()}.tmp"
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+        try:
+            view = memoryview(buf)
+            while view:
+                view = view[os.write(fd, view):]
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, file_path)
         return True
     except Exception as e:
         logger.error(f"Error writing to {file_path}: {e}")
@@ -42,6 +64,16 @@ def fix_inconsistent_payments():
     
     # Contador de correções
     fixed_count = 0
+    users_changed = False
+    
+    # Índice (usuário, tipo de plano) dos planos ativos, montado uma única vez
+    active_index = set()
+    for uid, u in users.items():
+        for plan in u.get('plans', ()):
+            if plan.get('active', False):
+                active_index.add((uid, plan.get('plan_type')))
+    
+    now_iso = datetime.now().isoformat()
     
     # 1. Identificar pagamentos aprovados mas não entregues
     for payment_id, payment in payments.items():
@@ -62,13 +94,10 @@ def fix_inconsistent_payments():
             if 'plans' not in user:
                 logger.info(f"Inicializando estrutura de planos para usuário ID {user_id}")
                 user['plans'] = []
+                users_changed = True
             
             # 3. Verificar se o usuário já tem plano do mesmo tipo (possivelmente já entregue)
-            already_has_plan = False
-            for plan in user.get('plans', []):
-                if plan.get('plan_type') == plan_type and plan.get('active', False):
-                    already_has_plan = True
-                    break
+            already_has_plan = (str(user_id), plan_type) in active_index
             
             # 4. Para pagamentos aprovados sem login entregue, verificar outras pistas
             if already_has_plan:
@@ -88,7 +117,7 @@ def fix_inconsistent_payments():
                     new_plan = {
                         'id': plan_id,
                         'plan_type': user.get('plan_type'),
-                        'created_at': datetime.now().isoformat(),
+                        'created_at': now_iso,
                         'expiration_date': user.get('plan_expiration'),
                         'login_info': user.get('login_info'),
                         'payment_id': payment_id,
@@ -97,6 +126,7 @@ def fix_inconsistent_payments():
                     }
                     
                     user['plans'].append(new_plan)
+                    active_index.add((str(user_id), plan_type))
                     payment['login_delivered'] = True
                     payment['plan_id'] = plan_id
                     fixed_count += 1
@@ -108,10 +138,11 @@ def fix_inconsistent_payments():
                 payment['is_ghost_payment'] = True
                 fixed_count += 1
             
-    # 5. Salvar as alterações
+    # 5. Salvar as alterações (apenas se algo mudou)
     logger.info(f"Corrigido(s) {fixed_count} pagamento(s) inconsistente(s)")
-    write_json_file(PAYMENTS_FILE, payments)
-    write_json_file(USERS_FILE, users)
+    if fixed_count > 0 or users_changed:
+        write_json_file(PAYMENTS_FILE, payments)
+        write_json_file(USERS_FILE, users)
     
     return fixed_count
 
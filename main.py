@@ -26,7 +26,7 @@ def start_bot():
         try:
             # Import inside function to avoid immediate loading if token is not set
             from bot import run_bot
-            logger.info("Starting Telegram bot in background thread...")
+            logger.info("Starting Telegram bot in background...")
             run_bot()
         except Exception as e:
             logger.error(f"Error running bot: {e}")
@@ -36,22 +36,63 @@ def start_bot():
 # Import the Flask app
 from app import app
 
-# Executar a correção de pagamentos inconsistentes na inicialização
-check_and_fix_inconsistent_payments()
+def start_background_services():
+    """
+    Inicia o bot em uma thread do mesmo processo que serve o Flask. O bot e o painel gravam
+    os mesmos arquivos JSON e compartilham o cache e as gravações agrupadas de utils, que
+    são por processo; por isso os dois precisam ficar no mesmo processo.
+    """
+    if BOT_TOKEN:
+        logger.info("Initializing Telegram bot thread...")
+        bot_thread = threading.Thread(target=start_bot)
+        bot_thread.daemon = True
+        bot_thread.start()
+        logger.info("Telegram bot thread started")
+    else:
+        logger.warning("Telegram bot not started. Set TELEGRAM_BOT_TOKEN environment variable to enable it.")
+        # Correção de pagamentos inconsistentes sem atrasar o início do servidor. Com o bot
+        # ativo, o próprio run_bot faz a correção antes de receber atualizações.
+        threading.Thread(target=check_and_fix_inconsistent_payments, daemon=True).start()
+
+# Importado pelo servidor (gunicorn main:app): este já é o processo que atende as requisições.
+# Executado diretamente, quem inicia os serviços é run_web_server, no processo do worker.
+if __name__ != "__main__":
+    start_background_services()
 
-# Start bot in a background thread
-if BOT_TOKEN:
-    logger.info("Initializing Telegram bot thread...")
-    bot_thread = threading.Thread(target=start_bot)
-    bot_thread.daemon = True
-    bot_thread.start()
-    logger.info("Telegram bot thread started")
-else:
-    logger.warning("Telegram bot not started. Set TELEGRAM_BOT_TOKEN environment variable to enable it.")
+def run_web_server(port):
+    """
+    Serve o Flask com o gunicorn (o mesmo servidor do deploy). O servidor de desenvolvimento
+    do Werkzeug (com debugger e reloader) só é usado com FLASK_DEBUG ou sem o gunicorn.
+    """
+    debug = os.environ.get('FLASK_DEBUG', 'false').lower() in ('1', 'true', 'yes')
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        BaseApplication = None
+    
+    if debug or BaseApplication is None:
+        # Com o reloader do modo debug, só o processo filho (que atende as requisições) inicia o bot
+        if not debug or os.environ.get('WERKZEUG_RUN_MAIN') == 'true':
+            start_background_services()
+        app.run(host="0.0.0.0", port=port, debug=debug)
+        return
+    
+    class StandaloneApplication(BaseApplication):
+        def load_config(self):
+            # Um único worker com várias threads: os arquivos JSON, o cache e as gravações
+            # agrupadas são por processo, e vários workers gravariam os mesmos arquivos
+            self.cfg.set('bind', f"0.0.0.0:{port}")
+            self.cfg.set('workers', 1)
+            self.cfg.set('worker_class', 'gthread')
+            self.cfg.set('threads', int(os.environ.get('WEB_THREADS', 8)))
+            # O worker é criado com fork deste processo; o bot precisa rodar dentro dele
+            self.cfg.set('post_worker_init', lambda worker: start_background_services())
+        
+        def load(self):
+            return app
+    
+    StandaloneApplication().run()
 
 if __name__ == "__main__":
-    # O bot já foi inicializado acima, não precisamos iniciar novamente
-    # Start flask app
     port = int(os.environ.get("PORT", 5000))
-    from app import app as flask_app
-    flask_app.run(host="0.0.0.0", port=port, debug=True)
+    run_web_server(port)
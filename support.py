@@ -1,7 +1,7 @@
 import logging
 import uuid
 from datetime import datetime
-from config import TICKETS_FILE
+from config import TICKETS_FILE, AUTH_FILE, ADMIN_ID
 from utils import read_json_file, write_json_file, get_user
 
 # Configure logging
@@ -423,9 +423,6 @@ def get_all_admin_ids():
     Returns:
         list: Lista com IDs dos administradores
     """
-    from config import AUTH_FILE
-    from utils import is_admin_telegram_id
-    
     try:
         auth_data = read_json_file(AUTH_FILE)
         
@@ -436,7 +433,6 @@ def get_all_admin_ids():
             admin_ids.append(admin_id)
         
         # Adiciona o admin principal do .env
-        from config import ADMIN_ID
         if ADMIN_ID and ADMIN_ID not in admin_ids:
             admin_ids.append(ADMIN_ID)
             
@@ -444,7 +440,6 @@ def get_all_admin_ids():
     except Exception as e:
         logger.error(f"Error getting admin IDs: {e}")
         # Fallback para o admin principal
-        from config import ADMIN_ID
         return [ADMIN_ID] if ADMIN_ID else []
 
 
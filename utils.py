@@ -1,11 +1,24 @@
 import json
+import copy
 import uuid
 import time
 import logging
 import os
 import secrets
 import hashlib
+import functools
+import threading
+import atexit
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
+try:
+    import orjson  # opcional: decodificador/codificador JSON em C, bem mais rápido que o json padrão
+except ImportError:
+    orjson = None
+try:
+    import ujson  # opcional: alternativa em C quando o orjson não está disponível
+except ImportError:
+    ujson = None
 from config import (
     USERS_FILE, PAYMENTS_FILE, LOGINS_FILE, BOT_CONFIG_FILE, AUTH_FILE, SESSION_FILE,
     GIVEAWAYS_FILE, TICKETS_FILE, PLANS, ADMIN_ID, SESSION_EXPIRY_HOURS
@@ -15,8 +28,83 @@ from config import (
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Serialização JSON: orjson -> ujson -> json padrão, sempre em bytes
+def _json_loads(raw):
+    if orjson is not None:
+        return orjson.loads(raw)
+    if ujson is not None:
+        return ujson.loads(raw)
+    return json.loads(raw)
+
+def _json_dumps(data, pretty=False):
+    if orjson is not None:
+        option = orjson.OPT_NON_STR_KEYS
+        if pretty:
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(data, option=option)
+    indent = 4 if pretty else None
+    if ujson is not None:
+        return ujson.dumps(data, indent=indent or 0, ensure_ascii=False).encode('utf-8')
+    separators = None if pretty else (',', ':')
+    return json.dumps(data, indent=indent, ensure_ascii=False, separators=separators).encode('utf-8')
+
+# Cache dos arquivos lidos: caminho -> [(inode, mtime_ns, tamanho), bytes, dados decodificados].
+# Uma gravação por outro processo (sempre via os.replace, portanto com novo inode) muda a
+# chave e força uma nova leitura. Os dados compartilhados só são decodificados quando
+# alguma consulta somente-leitura precisa deles.
+_json_cache = {}
+_json_cache_lock = threading.Lock()
+
+def _get_json_cache_entry(file_path):
+    st = os.stat(file_path)
+    key = (st.st_ino, st.st_mtime_ns, st.st_size)
+    with _json_cache_lock:
+        entry = _json_cache.get(file_path)
+    if entry and entry[0] == key:
+        return entry
+    
+    with open(file_path, 'rb') as file:
+        entry = [key, file.read(), None]
+    with _json_cache_lock:
+        _json_cache[file_path] = entry
+    return entry
+
+def _read_json_cached(file_path):
+    entry = _get_json_cache_entry(file_path)
+    if entry[2] is None:
+        data = _json_loads(entry[1])
+        with _json_cache_lock:
+            if entry[2] is None:
+                entry[2] = data
+    return entry[2]
+
 # Utility functions for file operations
 def read_json_file(file_path):
+    """
+    Lê o arquivo JSON e retorna uma cópia que o chamador pode alterar livremente.
+    A cópia é decodificada de novo a partir dos bytes em cache, o que sai mais barato
+    que um deepcopy do objeto compartilhado.
+    """
+    with _pending_json_lock:
+        pending = _pending_json_writes.get(file_path)
+    if pending is None and os.path.exists(file_path):
+        try:
+            return _json_loads(_get_json_cache_entry(file_path)[1])
+        except Exception:
+            # Arquivo inválido/ilegível: read_json_readonly registra o erro e devolve o padrão
+            pass
+    return copy.deepcopy(read_json_readonly(file_path))
+
+def read_json_readonly(file_path):
+    """
+    Lê o arquivo JSON e retorna o objeto compartilhado do cache, sem cópia.
+    Use apenas em consultas que não alteram o resultado.
+    """
+    with _pending_json_lock:
+        pending = _pending_json_writes.get(file_path)
+    if pending is not None:
+        return pending
+    
     try:
         if not os.path.exists(file_path):
             if file_path == USERS_FILE:
@@ -33,8 +121,7 @@ def read_json_file(file_path):
             elif file_path == AUTH_FILE:
                 return {'admin_telegram_ids': [], 'allowed_telegram_ids': [], 'access_codes': {}}
             
-        with open(file_path, 'r', encoding='utf-8') as file:
-            return json.load(file)
+        return _read_json_cached(file_path)
     except Exception as e:
         logger.error(f"Error reading file {file_path}: {e}")
         # Return empty default based on file type
@@ -51,20 +138,152 @@ def read_json_file(file_path):
             return {'admin_telegram_ids': [], 'allowed_telegram_ids': [], 'access_codes': {}}
         return {}
 
-def write_json_file(file_path, data):
+# Diretórios já criados nesta execução (evita um os.makedirs por gravação)
+_ensured_dirs = set()
+
+def write_json_file(file_path, data, pretty=False, defer=False):
+    """
+    Grava os dados em JSON compacto. Use pretty=True apenas em gravações pontuais
+    de arquivos que costumam ser lidos/editados manualmente.
+    Com defer=True a gravação é agrupada com as próximas (ver _defer_json_write).
+    """
+    if defer:
+        _defer_json_write(file_path, data)
+        return True
+    
     try:
-        os.makedirs(os.path.dirname(file_path), exist_ok=True)
-        with open(file_path, 'w', encoding='utf-8') as file:
-            json.dump(data, file, indent=4, ensure_ascii=False)
+        directory = os.path.dirname(file_path)
+        if directory not in _ensured_dirs:
+            os.makedirs(directory, exist_ok=True)
+            _ensured_dirs.add(directory)
+        with _pending_json_lock:
+            # Grava em um arquivo temporário e troca de uma vez: uma falha no meio da
+            # gravação não deixa o arquivo original truncado
+            tmp_path = f"{file_path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as file:
+                file.write(_json_dumps(data, pretty))
+            os.replace(tmp_path, file_path)
+            # Esta gravação já contém (ou substitui) qualquer alteração pendente do arquivo
+            _pending_json_writes.pop(file_path, None)
+        with _json_cache_lock:
+            _json_cache.pop(file_path, None)
         return True
     except Exception as e:
         logger.error(f"Error writing to file {file_path}: {e}")
         return False
 
+# Gravações agrupadas: alterações frequentes (ex.: uso de cupons) ficam em memória e são
+# gravadas juntas a cada JSON_FLUSH_INTERVAL segundos. Enquanto pendentes, as leituras do
+# mesmo arquivo usam os dados em memória.
+JSON_FLUSH_INTERVAL = 0.25
+_pending_json_writes = {}
+_pending_json_lock = threading.RLock()
+_json_flush_timer = None
+
+def _defer_json_write(file_path, data):
+    """Marca o arquivo como alterado e agenda uma gravação em lote"""
+    global _json_flush_timer
+    with _pending_json_lock:
+        _pending_json_writes[file_path] = data
+        if _json_flush_timer is None:
+            _json_flush_timer = threading.Timer(JSON_FLUSH_INTERVAL, flush_pending_json_writes)
+            _json_flush_timer.daemon = True
+            _json_flush_timer.start()
+
+def flush_pending_json_writes():
+    """Grava todas as alterações pendentes, se houver"""
+    global _json_flush_timer
+    with _pending_json_lock:
+        _json_flush_timer = None
+        for file_path, data in list(_pending_json_writes.items()):
+            write_json_file(file_path, data)
+
+atexit.register(flush_pending_json_writes)
+
+def read_json_section(file_path, key, default=None):
+    """
+    Retorna uma cópia de uma única seção (chave de primeiro nível) do arquivo JSON,
+    sem copiar o restante do arquivo. A leitura passa pelo cache por mtime.
+    """
+    return copy.deepcopy(read_json_readonly(file_path).get(key, default))
+
+def patch_json_file(file_path, keys, value, defer=False):
+    """
+    Altera um único valor (possivelmente aninhado) do arquivo JSON. Apenas os dicionários
+    no caminho das chaves são copiados; o restante do documento é reaproveitado do cache.
+    Ao contrário de ler/alterar/gravar o arquivo inteiro, não sobrescreve alterações
+    feitas em outras seções entre a leitura e a gravação.
+    """
+    if isinstance(keys, str):
+        keys = (keys,)
+    
+    with _pending_json_lock:
+        updated = dict(read_json_readonly(file_path))
+        node = updated
+        for key in keys[:-1]:
+            child = node.get(key)
+            child = dict(child) if isinstance(child, dict) else {}
+            node[key] = child
+            node = child
+        node[keys[-1]] = value
+        return write_json_file(file_path, updated, defer=defer)
+
+def patch_bot_config(keys, value, defer=False):
+    """Altera um único valor do bot_config.json (ver patch_json_file)"""
+    return patch_json_file(BOT_CONFIG_FILE, keys, value, defer=defer)
+
+def get_payment_settings():
+    """Configurações de pagamento (PIX e Mercado Pago) do bot_config.json"""
+    return read_json_section(BOT_CONFIG_FILE, 'payment_settings', {})
+
+def get_mercado_pago_settings():
+    """
+    Configurações do Mercado Pago (token, habilitado...). Lê do cache por mtime do
+    bot_config.json e copia só esta seção, sem copiar as demais configurações.
+    """
+    payment_settings = read_json_readonly(BOT_CONFIG_FILE).get('payment_settings') or {}
+    return copy.deepcopy(payment_settings.get('mercado_pago') or {})
+
+# Status do Mercado Pago de um pagamento ainda em aberto (pode ser pago ou cancelado)
+MP_OPEN_STATUSES = frozenset({'pending', 'in_process', 'authorized'})
+
+# Sessão HTTP compartilhada para a API do Mercado Pago: reaproveita as conexões TLS
+# entre as chamadas em vez de abrir uma conexão nova a cada consulta/cancelamento
+_mp_session = None
+_mp_session_lock = threading.Lock()
+# (conexão, leitura) em segundos: sem timeout, uma conexão travada prende a thread para sempre
+MP_REQUEST_TIMEOUT = (3.05, 10)
+
+def get_mercado_pago_session():
+    """Retorna a sessão HTTP (com pool de conexões) usada nas chamadas ao Mercado Pago"""
+    global _mp_session
+    if _mp_session is None:
+        with _mp_session_lock:
+            if _mp_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+                
+                class TimeoutHTTPAdapter(HTTPAdapter):
+                    """Aplica MP_REQUEST_TIMEOUT às chamadas que não informam um timeout próprio"""
+                    def send(self, request, **kwargs):
+                        if kwargs.get('timeout') is None:
+                            kwargs['timeout'] = MP_REQUEST_TIMEOUT
+                        return super().send(request, **kwargs)
+                
+                session = requests.Session()
+                # Retry só para métodos idempotentes (o padrão do Retry não inclui POST,
+                # então a criação de pagamentos nunca é repetida automaticamente)
+                retry = Retry(total=3, backoff_factor=0.2, status_forcelist=[502, 503, 504])
+                session.mount("https://", TimeoutHTTPAdapter(pool_connections=10, pool_maxsize=20, max_retries=retry))
+                _mp_session = session
+    return _mp_session
+
 # User management functions
 def get_user(user_id):
-    users = read_json_file(USERS_FILE)
-    return users.get(str(user_id))
+    # Copia só o usuário pedido em vez do arquivo inteiro
+    users = read_json_readonly(USERS_FILE)
+    return copy.deepcopy(users.get(str(user_id)))
     
 def get_user_plans(user_id, include_inactive=False):
     """
@@ -170,7 +389,7 @@ def assign_plan_to_user(user_id, plan_type, duration_days=None, login_info=None)
         
         # Determinar a duração do plano
         if duration_days is None:
-            duration_days = PLANS[plan_type]['duration_days']
+            duration_days = PLANS[plan_type].duration_days
         
         # Inicializar a lista de planos se não existir
         if 'plans' not in user:
@@ -346,6 +565,21 @@ def unban_user(user_id):
         logger.error(f"Error unbanning user {user_id}: {e}")
         return False
         
+@functools.lru_cache(maxsize=1024)
+def _iso_to_ts(iso_date):
+    """Converte uma data ISO em timestamp, memorizando pela string"""
+    return datetime.fromisoformat(iso_date).timestamp()
+
+def _expiration_ts(entry):
+    """
+    Timestamp de expiração de um cupom/desconto. Usa o 'expires_ts' gravado na criação
+    e, para registros antigos, converte o 'expiration_date' ISO.
+    """
+    expires_ts = entry.get('expires_ts')
+    if expires_ts is None:
+        expires_ts = _iso_to_ts(entry['expiration_date'])
+    return expires_ts
+
 def add_seasonal_discount(discount_percent, expiration_days, applicable_plans=None):
     """
     Adiciona um desconto sazonal para todos os usuários.
@@ -361,29 +595,34 @@ def add_seasonal_discount(discount_percent, expiration_days, applicable_plans=No
     """
     try:
         discount_id = str(uuid.uuid4())
-        bot_config = read_json_file(BOT_CONFIG_FILE)
         
-        # Inicializar a seção de descontos se não existir
-        if 'seasonal_discounts' not in bot_config:
-            bot_config['seasonal_discounts'] = {}
-            
         # Calcular a data de expiração
         expiration_date = datetime.now() + timedelta(days=expiration_days)
         
         # Definir os planos aplicáveis
         if applicable_plans is None:
             applicable_plans = list(PLANS.keys())
-            
-        # Criar o desconto
-        bot_config['seasonal_discounts'][discount_id] = {
-            'discount_percent': discount_percent,
-            'expiration_date': expiration_date.isoformat(),
-            'applicable_plans': applicable_plans,
-            'created_at': datetime.now().isoformat()
-        }
         
-        # Salvar as alterações
-        write_json_file(BOT_CONFIG_FILE, bot_config)
+        # Leitura, alteração e gravação sob o lock: outra alteração do bot_config.json
+        # feita ao mesmo tempo não é perdida
+        with _pending_json_lock:
+            bot_config = read_json_file(BOT_CONFIG_FILE)
+            
+            # Inicializar a seção de descontos se não existir
+            if 'seasonal_discounts' not in bot_config:
+                bot_config['seasonal_discounts'] = {}
+            
+            # Criar o desconto
+            bot_config['seasonal_discounts'][discount_id] = {
+                'discount_percent': discount_percent,
+                'expiration_date': expiration_date.isoformat(),
+                'expires_ts': int(expiration_date.timestamp()),
+                'applicable_plans': applicable_plans,
+                'created_at': datetime.now().isoformat()
+            }
+            
+            # Salvar as alterações
+            write_json_file(BOT_CONFIG_FILE, bot_config, defer=True)
         
         return discount_id
     except Exception as e:
@@ -401,21 +640,22 @@ def remove_seasonal_discount(discount_id):
         bool: True se o desconto foi removido com sucesso, False caso contrário
     """
     try:
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        
-        # Verificar se a seção de descontos existe
-        if 'seasonal_discounts' not in bot_config:
-            return False
+        with _pending_json_lock:
+            bot_config = read_json_file(BOT_CONFIG_FILE)
             
-        # Verificar se o desconto existe
-        if discount_id not in bot_config['seasonal_discounts']:
-            return False
+            # Verificar se a seção de descontos existe
+            if 'seasonal_discounts' not in bot_config:
+                return False
             
-        # Remover o desconto
-        del bot_config['seasonal_discounts'][discount_id]
-        
-        # Salvar as alterações
-        write_json_file(BOT_CONFIG_FILE, bot_config)
+            # Verificar se o desconto existe
+            if discount_id not in bot_config['seasonal_discounts']:
+                return False
+            
+            # Remover o desconto
+            del bot_config['seasonal_discounts'][discount_id]
+            
+            # Salvar as alterações
+            write_json_file(BOT_CONFIG_FILE, bot_config, defer=True)
         
         return True
     except Exception as e:
@@ -430,20 +670,20 @@ def get_active_seasonal_discounts():
         dict: Dicionário com os descontos ativos
     """
     try:
-        bot_config = read_json_file(BOT_CONFIG_FILE)
+        bot_config = read_json_readonly(BOT_CONFIG_FILE)
         
         # Verificar se a seção de descontos existe
         if 'seasonal_discounts' not in bot_config:
             return {}
             
-        active_discounts = {}
-        current_time = datetime.now()
+        current_ts = time.time()
         
-        # Filtrar descontos ativos
-        for discount_id, discount_data in bot_config['seasonal_discounts'].items():
-            expiration_date = datetime.fromisoformat(discount_data['expiration_date'])
-            if current_time < expiration_date:
-                active_discounts[discount_id] = discount_data
+        # Filtrar descontos ativos (cópias rasas: quem chama pode acrescentar campos de exibição)
+        active_discounts = {
+            discount_id: dict(discount_data)
+            for discount_id, discount_data in bot_config['seasonal_discounts'].items()
+            if current_ts < _expiration_ts(discount_data)
+        }
                 
         return active_discounts
     except Exception as e:
@@ -535,39 +775,35 @@ def migrate_user_to_multi_plan(user_id):
 # Payment management functions
 def create_payment(user_id, plan_type, amount, coupon_code=None):
     payment_id = str(uuid.uuid4())
-    payments = read_json_file(PAYMENTS_FILE)
+    user_id = str(user_id)
     
-    # Obter o timestamp atual para o momento de criação
-    current_time = datetime.now()
+    # Obter o timestamp atual para o momento de criação (usado também nos cancelamentos)
+    now_iso = datetime.now().isoformat()
     
     # Verificar se o usuário já tem pagamentos pendentes e cancelá-los
-    for existing_payment_id, payment in list(payments.items()):
-        if payment['user_id'] == str(user_id) and payment['status'] == 'pending':
-            logger.info(f"Cancelando pagamento pendente existente {existing_payment_id} para o usuário {user_id}")
-            
-            # Se for um pagamento do Mercado Pago, cancelar na API
-            if payment.get('mp_payment_id'):
-                try:
-                    _cancel_mercado_pago_payment(payment.get('mp_payment_id'))
-                    logger.info(f"Pagamento Mercado Pago {payment.get('mp_payment_id')} cancelado ao criar novo pagamento")
-                except Exception as e:
-                    logger.error(f"Erro ao cancelar pagamento Mercado Pago existente: {e}")
-            
-            # Atualizar o status para cancelado
-            payment['status'] = 'cancelled'
-            payment['cancelled_at'] = current_time.isoformat()
-            payment['cancelled_reason'] = 'Substituído por novo pagamento'
-            payments[existing_payment_id] = payment
+    payments = read_json_readonly(PAYMENTS_FILE)
+    pending_ids = list(_get_payment_indexes(payments)['pending_by_user'].get(user_id, ()))
+    for existing_payment_id in pending_ids:
+        payment = payments[existing_payment_id]
+        logger.info(f"Cancelando pagamento pendente existente {existing_payment_id} para o usuário {user_id}")
+        
+        # Se for um pagamento do Mercado Pago, cancelar na API
+        if payment.get('mp_payment_id'):
+            try:
+                _cancel_mercado_pago_payment(payment.get('mp_payment_id'))
+                logger.info(f"Pagamento Mercado Pago {payment.get('mp_payment_id')} cancelado ao criar novo pagamento")
+            except Exception as e:
+                logger.error(f"Erro ao cancelar pagamento Mercado Pago existente: {e}")
     
     payment_data = {
         'payment_id': payment_id,
-        'user_id': str(user_id),
+        'user_id': user_id,
         'plan_type': plan_type,
         'amount': amount,
         'original_amount': amount,
         'coupon_code': coupon_code,
         'status': 'pending',
-        'created_at': current_time.isoformat(),
+        'created_at': now_iso,
         'approved_at': None,
         'payer_name': '',
         'login_delivered': False,
@@ -575,22 +811,151 @@ def create_payment(user_id, plan_type, amount, coupon_code=None):
         'related_messages': [] # Lista de mensagens relacionadas (chat_id, message_id)
     }
     
-    payments[payment_id] = payment_data
-    write_json_file(PAYMENTS_FILE, payments)
+    # Grava com os dados atuais do arquivo (as chamadas à API acima podem demorar) e copia
+    # só os pagamentos alterados; os demais são reaproveitados do cache
+    with _pending_json_lock:
+        updated = dict(read_json_readonly(PAYMENTS_FILE))
+        for existing_payment_id in pending_ids:
+            payment = updated.get(existing_payment_id)
+            if payment and payment['status'] == 'pending':
+                # Atualizar o status para cancelado
+                updated[existing_payment_id] = {
+                    **payment,
+                    'status': 'cancelled',
+                    'cancelled_at': now_iso,
+                    'cancelled_reason': 'Substituído por novo pagamento'
+                }
+        updated[payment_id] = payment_data
+        write_json_file(PAYMENTS_FILE, updated)
     return payment_id
 
 def get_payment(payment_id):
-    payments = read_json_file(PAYMENTS_FILE)
-    return payments.get(payment_id)
+    # Copia só o pagamento pedido em vez do arquivo inteiro
+    payments = read_json_readonly(PAYMENTS_FILE)
+    return copy.deepcopy(payments.get(payment_id))
+
+# Índices secundários dos pagamentos, derivados do documento em cache. São reconstruídos em
+# uma única passada só quando o arquivo muda (novo objeto no cache); entre gravações as
+# consultas frequentes (webhooks, pagamento pendente do usuário, loop de logins) não
+# precisam percorrer todos os pagamentos já registrados.
+_payment_indexes = (None, None)
+_payment_indexes_lock = threading.Lock()
+
+def _get_payment_indexes(payments):
+    """
+    Retorna os índices do documento de pagamentos informado:
+    - 'mp_payment_id': ID do Mercado Pago -> payment_id
+    - 'pending_by_user': user_id -> payment_ids pendentes
+    - 'pending_approval': payment_ids pendentes com comprovante (payer_name) informado
+    - 'waiting': payment_ids aprovados cujo login ainda não foi entregue
+    """
+    global _payment_indexes
+    with _payment_indexes_lock:
+        indexed_payments, indexes = _payment_indexes
+        if indexed_payments is not payments:
+            indexes = {'mp_payment_id': {}, 'pending_by_user': {}, 'pending_approval': [], 'waiting': []}
+            for payment_id, payment in payments.items():
+                if payment.get('mp_payment_id'):
+                    indexes['mp_payment_id'][str(payment['mp_payment_id'])] = payment_id
+                status = payment.get('status')
+                if status == 'pending':
+                    # Chave sempre em str: registros antigos podem ter o user_id numérico
+                    indexes['pending_by_user'].setdefault(str(payment.get('user_id')), []).append(payment_id)
+                    if payment.get('payer_name'):
+                        indexes['pending_approval'].append(payment_id)
+                elif status == 'approved' and not payment.get('login_delivered', False):
+                    indexes['waiting'].append(payment_id)
+            _payment_indexes = (payments, indexes)
+    return indexes
+
+def find_payment_by_mp_id(mp_payment_id):
+    """
+    Localiza o pagamento interno associado a um ID de pagamento do Mercado Pago.
+    Retorna (payment_id, pagamento) ou (None, None) se não houver correspondência.
+    """
+    payments = read_json_readonly(PAYMENTS_FILE)
+    payment_id = _get_payment_indexes(payments)['mp_payment_id'].get(str(mp_payment_id))
+    if payment_id is None or payment_id not in payments:
+        return None, None
+    return payment_id, copy.deepcopy(payments[payment_id])
 
 def update_payment(payment_id, data):
-    payments = read_json_file(PAYMENTS_FILE)
-    if payment_id in payments:
-        payments[payment_id].update(data)
-        write_json_file(PAYMENTS_FILE, payments)
-        return True
+    # Copia só o pagamento alterado; os demais são reaproveitados do cache
+    with _pending_json_lock:
+        payments = read_json_readonly(PAYMENTS_FILE)
+        if payment_id in payments:
+            current = payments[payment_id]
+            # Notificações repetidas (ex.: reenvios do webhook) costumam não mudar nada:
+            # nesse caso não regravamos o arquivo
+            changes = {key: value for key, value in data.items() if key not in current or current[key] != value}
+            if changes:
+                updated = dict(payments)
+                updated[payment_id] = {**current, **changes}
+                write_json_file(PAYMENTS_FILE, updated)
+            return True
     return False
 
+# Tempo para o pagamento de um PIX gerado pelo Mercado Pago
+PENDING_PAYMENT_TIMEOUT_SECONDS = 600
+# Cancelamentos simultâneos na API ao expirar vários pagamentos de uma vez
+MP_CANCEL_MAX_WORKERS = 8
+
+def get_pending_mp_payment_deadlines():
+    """
+    Retorna (timestamp de vencimento, payment_id) de cada pagamento pendente do Mercado Pago,
+    a partir do índice de pendentes (sem percorrer o histórico de pagamentos)
+    """
+    payments = read_json_readonly(PAYMENTS_FILE)
+    deadlines = []
+    for payment_ids in _get_payment_indexes(payments)['pending_by_user'].values():
+        for payment_id in payment_ids:
+            payment = payments[payment_id]
+            if payment.get('mp_payment_id') and payment.get('created_at'):
+                deadlines.append((_iso_to_ts(payment['created_at']) + PENDING_PAYMENT_TIMEOUT_SECONDS, payment_id))
+    return deadlines
+
+def expire_pending_mp_payments(payment_ids):
+    """
+    Expira de uma vez os pagamentos do Mercado Pago vencidos: cancela os PIX na API (em
+    paralelo) e marca todos como 'expired' em uma única gravação. Retorna os pagamentos
+    expirados; os que não estiverem mais pendentes são ignorados.
+    """
+    payments = read_json_readonly(PAYMENTS_FILE)
+    expiring = {
+        payment_id: copy.deepcopy(payments[payment_id])
+        for payment_id in payment_ids
+        if payment_id in payments
+        and payments[payment_id].get('status') == 'pending'
+        and payments[payment_id].get('mp_payment_id')
+    }
+    if not expiring:
+        return []
+    
+    for payment_id, payment in expiring.items():
+        logger.info(f"Pagamento expirado encontrado: {payment_id}, Mercado Pago ID: {payment.get('mp_payment_id')}")
+    
+    # Cancelar os pagamentos no Mercado Pago (chamadas de rede, feitas em paralelo)
+    mp_ids = [payment['mp_payment_id'] for payment in expiring.values()]
+    with ThreadPoolExecutor(max_workers=min(len(mp_ids), MP_CANCEL_MAX_WORKERS)) as executor:
+        for mp_payment_id, cancelled in zip(mp_ids, executor.map(_cancel_mercado_pago_payment, mp_ids)):
+            if cancelled:
+                logger.info(f"Pagamento Mercado Pago {mp_payment_id} cancelado por tempo expirado")
+    
+    # Só expira os que continuam pendentes: podem ter sido aprovados durante as chamadas à API
+    expired = []
+    with _pending_json_lock:
+        updated = dict(read_json_readonly(PAYMENTS_FILE))
+        for payment_id, payment in expiring.items():
+            current = updated.get(payment_id)
+            if current and current.get('status') == 'pending':
+                updated[payment_id] = {**current, 'status': 'expired'}
+                payment['status'] = 'expired'
+                expired.append(payment)
+        if expired:
+            write_json_file(PAYMENTS_FILE, updated)
+    
+    return expired
+
 def get_user_pending_payment(user_id):
     """
     Retorna o pagamento pendente de um usuário, se existir.
@@ -602,37 +967,38 @@ def get_user_pending_payment(user_id):
     Returns:
         dict: Dados do pagamento pendente ou None
     """
-    payments = read_json_file(PAYMENTS_FILE)
-    current_time = datetime.now()
+    payments = read_json_readonly(PAYMENTS_FILE)
+    user_id = str(user_id)
     
-    for payment_id, payment in payments.items():
-        if payment['user_id'] == str(user_id) and payment['status'] == 'pending':
-            # Verificar se o pagamento expirou (10 minutos)
-            if 'created_at' in payment:
-                created_at = datetime.fromisoformat(payment['created_at'])
-                expiration_time = created_at + timedelta(minutes=10)
-                
-                if current_time > expiration_time:
-                    # Pagamento expirou
-                    payment['status'] = 'expired'
-                    
-                    # Se for um pagamento do Mercado Pago, cancelar na API
-                    if payment.get('mp_payment_id'):
-                        try:
-                            _cancel_mercado_pago_payment(payment.get('mp_payment_id'))
-                        except Exception as e:
-                            logger.error(f"Erro ao cancelar pagamento expirado no Mercado Pago: {e}")
-                    
-                    # Salvar alteração
-                    payments[payment_id] = payment
-                    write_json_file(PAYMENTS_FILE, payments)
-                    return None
+    # Primeiro pagamento pendente do usuário, direto do índice
+    payment_id = next(iter(_get_payment_indexes(payments)['pending_by_user'].get(user_id, ())), None)
+    if payment_id is None:
+        return None
+    payment = copy.deepcopy(payments[payment_id])
+    
+    # Verificar se o pagamento expirou (10 minutos)
+    if 'created_at' in payment:
+        created_at = datetime.fromisoformat(payment['created_at'])
+        expiration_time = created_at + timedelta(minutes=10)
+        
+        if datetime.now() > expiration_time:
+            # Pagamento expirou
+            payment['status'] = 'expired'
             
-            # Pagamento pendente válido
-            payment['payment_id'] = payment_id
-            return payment
+            # Se for um pagamento do Mercado Pago, cancelar na API
+            if payment.get('mp_payment_id'):
+                try:
+                    _cancel_mercado_pago_payment(payment.get('mp_payment_id'))
+                except Exception as e:
+                    logger.error(f"Erro ao cancelar pagamento expirado no Mercado Pago: {e}")
+            
+            # Salvar alteração
+            update_payment(payment_id, {'status': 'expired'})
+            return None
     
-    return None
+    # Pagamento pendente válido
+    payment['payment_id'] = payment_id
+    return payment
 
 def _cancel_mercado_pago_payment(mp_payment_id):
     """
@@ -645,14 +1011,8 @@ def _cancel_mercado_pago_payment(mp_payment_id):
         bool: True se o cancelamento foi bem-sucedido, False caso contrário
     """
     try:
-        import requests
-        import uuid
-        import logging
-        import json
-        
         # Obter configurações do Mercado Pago
-        bot_config = read_json_file(BOT_CONFIG_FILE)
-        mp_settings = bot_config.get('payment_settings', {}).get('mercado_pago', {})
+        mp_settings = get_mercado_pago_settings()
         access_token = mp_settings.get('access_token')
         
         if not access_token:
@@ -667,7 +1027,7 @@ def _cancel_mercado_pago_payment(mp_payment_id):
         }
         
         # Primeiro verificar status atual
-        status_response = requests.get(
+        status_response = get_mercado_pago_session().get(
             f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
             headers=headers
         )
@@ -677,9 +1037,9 @@ def _cancel_mercado_pago_payment(mp_payment_id):
             current_status = payment_data.get('status')
             
             # Só cancelar se estiver em um estado que permite cancelamento
-            if current_status in ['pending', 'in_process', 'authorized']:
+            if current_status in MP_OPEN_STATUSES:
                 cancel_data = {"status": "cancelled"}
-                cancel_response = requests.put(
+                cancel_response = get_mercado_pago_session().put(
                     f"https://api.mercadopago.com/v1/payments/{mp_payment_id}",
                     headers=headers,
                     json=cancel_data
@@ -712,43 +1072,83 @@ def cancel_payment(payment_id):
                O primeiro elemento é True se o cancelamento foi bem-sucedido, False caso contrário.
                O segundo elemento são os dados do pagamento ou None se não encontrado.
     """
-    payments = read_json_file(PAYMENTS_FILE)
-    if payment_id in payments:
-        payment = payments[payment_id]
-        
+    payment = get_payment(payment_id)
+    if payment:
         # Se for um pagamento do Mercado Pago, tenta cancelar na API
         if payment.get('mp_payment_id'):
             _cancel_mercado_pago_payment(payment['mp_payment_id'])
         
         # Marca como cancelado no nosso sistema independente do resultado
         payment['status'] = 'cancelled'
-        payments[payment_id] = payment
-        write_json_file(PAYMENTS_FILE, payments)
+        update_payment(payment_id, {'status': 'cancelled'})
         return True, payment
     
     return False, None
 
 # Login management functions
 def add_login(plan_type, login_data):
-    logins = read_json_file(LOGINS_FILE)
-    if plan_type in logins:
-        logins[plan_type].append(login_data)
-        write_json_file(LOGINS_FILE, logins)
-        return True
-    return False
+    # Inclusões seguidas (ex.: vários /addlogin) são gravadas juntas pelo write-back agrupado
+    return add_logins(plan_type, [login_data], defer=True) > 0
+
+def add_logins(plan_type, logins_list, defer=False):
+    """
+    Adiciona vários logins ao plano com uma única leitura e uma única gravação do arquivo.
+    Retorna a quantidade de logins adicionados.
+    """
+    logins_list = [login for login in logins_list if login]
+    if not logins_list:
+        return 0
+    
+    with _pending_json_lock:
+        logins = read_json_readonly(LOGINS_FILE)
+        if plan_type not in logins:
+            return 0
+        # Copia só a lista do plano alterado; os demais planos são reaproveitados do cache
+        updated = dict(logins)
+        updated[plan_type] = logins[plan_type] + logins_list
+        if not write_json_file(LOGINS_FILE, updated, defer=defer):
+            return 0
+    return len(logins_list)
 
 def get_available_login(plan_type):
-    logins = read_json_file(LOGINS_FILE)
+    # Consulta somente leitura: usa o cache do arquivo sem copiar todos os logins
+    logins = read_json_readonly(LOGINS_FILE)
     if plan_type in logins and logins[plan_type]:
-        return logins[plan_type][0]
+        return copy.deepcopy(logins[plan_type][0])
     return None
 
+def claim_available_login(plan_type):
+    """
+    Retira o primeiro login disponível do plano e o retorna, com uma única leitura e gravação.
+    A retirada acontece sob o lock de gravação, então duas entregas simultâneas nunca
+    recebem o mesmo login. Retorna None se não houver login disponível.
+    """
+    with _pending_json_lock:
+        logins = read_json_readonly(LOGINS_FILE)
+        plan_logins = logins.get(plan_type)
+        if not plan_logins:
+            return None
+        login = plan_logins[0]
+        updated = dict(logins)
+        updated[plan_type] = plan_logins[1:]
+        if not write_json_file(LOGINS_FILE, updated):
+            return None
+    return copy.deepcopy(login)
+
+def count_available_logins():
+    """Retorna a quantidade de logins disponíveis por tipo de plano"""
+    logins = read_json_readonly(LOGINS_FILE)
+    return {plan_type: len(plan_logins) for plan_type, plan_logins in logins.items()}
+
 def remove_login(plan_type, login_data):
-    logins = read_json_file(LOGINS_FILE)
-    if plan_type in logins and login_data in logins[plan_type]:
-        logins[plan_type].remove(login_data)
-        write_json_file(LOGINS_FILE, logins)
-        return True
+    # Gravação imediata: também grava as inclusões ainda pendentes do arquivo
+    with _pending_json_lock:
+        logins = read_json_readonly(LOGINS_FILE)
+        if plan_type in logins and login_data in logins[plan_type]:
+            updated = dict(logins)
+            updated[plan_type] = list(logins[plan_type])
+            updated[plan_type].remove(login_data)
+            return write_json_file(LOGINS_FILE, updated)
     return False
 
 def assign_login_to_user(user_id, plan_type, payment_id):
@@ -765,19 +1165,21 @@ def assign_login_to_user(user_id, plan_type, payment_id):
         dict: Informações de login ou False se falhar
     """
     user = get_user(user_id)
-    login = get_available_login(plan_type)
-    
     if not user:
         logger.error(f"User {user_id} not found")
         return False
     
+    # Retira o login da lista de disponíveis já na escolha (uma leitura e uma gravação)
+    login = claim_available_login(plan_type)
     if not login:
         logger.error(f"No available login for plan type {plan_type}")
         return False
     
     # Obter informações do plano
     plan_info = PLANS[plan_type]
-    expiration_date = datetime.now() + timedelta(days=plan_info['duration_days'])
+    now = datetime.now()
+    now_iso = now.isoformat()
+    expiration_date = now + timedelta(days=plan_info.duration_days)
     
     # Se o usuário ainda não possui a estrutura 'plans', inicializá-la
     if 'plans' not in user:
@@ -790,7 +1192,7 @@ def assign_login_to_user(user_id, plan_type, payment_id):
     new_plan = {
         'id': plan_id,
         'plan_type': plan_type,
-        'created_at': datetime.now().isoformat(),
+        'created_at': now_iso,
         'expiration_date': expiration_date.isoformat(),
         'login_info': login,
         'payment_id': payment_id,
@@ -816,14 +1218,11 @@ def assign_login_to_user(user_id, plan_type, payment_id):
     # Atualizar o status do pagamento
     update_payment(payment_id, {
         'status': 'completed',
-        'approved_at': datetime.now().isoformat(),
+        'approved_at': now_iso,
         'login_delivered': True,
         'plan_id': plan_id  # Armazenar o ID do plano no pagamento para referência
     })
     
-    # Remover o login da lista de logins disponíveis
-    remove_login(plan_type, login)
-    
     # Processar referência, se aplicável
     if user.get('referred_by'):
         process_successful_referral(user['referred_by'])
@@ -837,7 +1236,7 @@ def process_successful_referral(referrer_id):
         save_user(referrer_id, referrer)
         
         # Check if referrer qualifies for free month
-        bot_config = read_json_file(BOT_CONFIG_FILE)
+        bot_config = read_json_readonly(BOT_CONFIG_FILE)
         required_referrals = bot_config['referral_rewards']['free_month_after_referrals']
         
         if referrer['successful_referrals'] % required_referrals == 0:
@@ -848,14 +1247,17 @@ def process_successful_referral(referrer_id):
 
 # Check for pending logins and users waiting for logins
 def get_pending_approvals():
-    payments = read_json_file(PAYMENTS_FILE)
-    pending_approvals = []
-    
-    for payment_id, payment in payments.items():
-        if payment['status'] == 'pending' and payment.get('payer_name'):
-            pending_approvals.append(payment)
-    
-    return pending_approvals
+    payments = read_json_readonly(PAYMENTS_FILE)
+    return [copy.deepcopy(payments[payment_id])
+            for payment_id in _get_payment_indexes(payments)['pending_approval']]
+
+def count_users_waiting_for_login():
+    """
+    Conta os pagamentos aprovados cujo login ainda não foi entregue, direto do índice,
+    sem montar a lista (usado pelos contadores do painel administrativo).
+    """
+    payments = read_json_readonly(PAYMENTS_FILE) or {}
+    return len(_get_payment_indexes(payments)['waiting'])
 
 def get_users_waiting_for_login():
     """
@@ -867,130 +1269,141 @@ def get_users_waiting_for_login():
     2. Verifica se o pagamento foi feito antes da implementação do sistema multi-planos
     3. Detecta pagamentos de teste ou obsoletos com mais de 60 dias
     """
-    payments = read_json_file(PAYMENTS_FILE) or {}
-    users = read_json_file(USERS_FILE) or {}
-    logins = read_json_file(LOGINS_FILE) or {}
+    # Só os pagamentos aprovados e ainda não entregues, direto do índice
+    payments = read_json_readonly(PAYMENTS_FILE) or {}
+    waiting_ids = _get_payment_indexes(payments)['waiting']
+    if not waiting_ids:
+        return []
+    
+    users = read_json_readonly(USERS_FILE) or {}
+    logins = read_json_readonly(LOGINS_FILE) or {}
     waiting_users = []
-    fixed_payments = False
+    fixed_payments = {}
     
     # Data de corte para pagamentos muito antigos (60 dias)
     cutoff_date = datetime.now() - timedelta(days=60)
     
-    for payment_id, payment in payments.items():
-        # Verificar se o pagamento está aprovado e o login não foi entregue
-        if payment.get('status') == 'approved' and not payment.get('login_delivered', False):
-            user_id = payment.get('user_id')
-            plan_type = payment.get('plan_type')
+    for payment_id in waiting_ids:
+        payment = copy.deepcopy(payments[payment_id])
+        user_id = payment.get('user_id')
+        plan_type = payment.get('plan_type')
+        
+        # Verificações adicionais para evitar notificações fantasmas
+        if not user_id or not plan_type:
+            logger.warning(f"Pagamento ID {payment_id} com dados incompletos: user_id={user_id}, plan_type={plan_type}")
+            # Marcar como entregue para evitar notificações futuras
+            payment['login_delivered'] = True
+            payment['is_ghost_payment'] = True
+            fixed_payments[payment_id] = payment
+            continue
             
-            # Verificações adicionais para evitar notificações fantasmas
-            if not user_id or not plan_type:
-                logger.warning(f"Pagamento ID {payment_id} com dados incompletos: user_id={user_id}, plan_type={plan_type}")
-                # Marcar como entregue para evitar notificações futuras
-                payment['login_delivered'] = True
-                payment['is_ghost_payment'] = True
-                fixed_payments = True
-                continue
-                
-            # Verificar se o usuário existe 
-            user = users.get(str(user_id))
-            if not user:
-                logger.warning(f"Usuário ID {user_id} não encontrado para pagamento ID {payment_id}")
-                # Marcar como entregue para evitar notificações futuras
-                payment['login_delivered'] = True
-                payment['is_ghost_payment'] = True
-                fixed_payments = True
-                continue
+        # Verificar se o usuário existe 
+        user = users.get(str(user_id))
+        if not user:
+            logger.warning(f"Usuário ID {user_id} não encontrado para pagamento ID {payment_id}")
+            # Marcar como entregue para evitar notificações futuras
+            payment['login_delivered'] = True
+            payment['is_ghost_payment'] = True
+            fixed_payments[payment_id] = payment
+            continue
+        
+        # Verificar se o pagamento é muito antigo (mais de 60 dias)
+        if payment.get('created_at'):
+            try:
+                payment_date = datetime.fromisoformat(payment.get('created_at'))
+                if payment_date < cutoff_date:
+                    logger.info(f"Pagamento ID {payment_id} é muito antigo ({payment_date.isoformat()}). Marcando como entregue.")
+                    payment['login_delivered'] = True
+                    payment['is_ghost_payment'] = True
+                    fixed_payments[payment_id] = payment
+                    continue
+            except (ValueError, TypeError):
+                pass
+        
+        # Verificar se o plano já foi entregue pelo sistema multi-planos
+        already_delivered = False
+        
+        # Verifica o sistema de múltiplos planos
+        if 'plans' in user:
+            for plan in user['plans']:
+                # Se o plano é do mesmo tipo e está ativo - possível entrega duplicada
+                if plan.get('plan_type') == plan_type and plan.get('active', False):
+                    # Se o plano foi criado próximo à data do pagamento, provavelmente é o mesmo plano
+                    payment_date = datetime.fromisoformat(payment.get('created_at', '2020-01-01T00:00:00'))
+                    plan_date = datetime.fromisoformat(plan.get('created_at', '2020-01-01T00:00:00'))
+                    
+                    # Margem de 24 horas para possíveis atrasos no processamento
+                    if abs((payment_date - plan_date).total_seconds()) < 86400:  # 24 horas em segundos
+                        already_delivered = True
+                        logger.info(f"Plano já entregue para o pagamento ID {payment_id} (sistema multi-planos)")
+                        
+                        # Atualizar o registro de pagamento para evitar notificações futuras
+                        payment['login_delivered'] = True
+                        payment['plan_id'] = plan.get('id')
+                        fixed_payments[payment_id] = payment
+                        break
+        
+        # Verificar sistema antigo (atributos diretos no objeto user)
+        elif not already_delivered and user.get('has_active_plan') and user.get('plan_type') == plan_type:
+            # O usuário já tem um plano do mesmo tipo no sistema antigo
+            payment_date = datetime.fromisoformat(payment.get('created_at', '2020-01-01T00:00:00'))
             
-            # Verificar se o pagamento é muito antigo (mais de 60 dias)
-            if payment.get('created_at'):
+            # Se tiver data de expiração, usar para verificar se o plano foi ativado após o pagamento
+            if user.get('plan_expiration'):
                 try:
-                    payment_date = datetime.fromisoformat(payment.get('created_at'))
-                    if payment_date < cutoff_date:
-                        logger.info(f"Pagamento ID {payment_id} é muito antigo ({payment_date.isoformat()}). Marcando como entregue.")
+                    expiration_date = datetime.fromisoformat(user.get('plan_expiration'))
+                    plan_duration = PLANS[plan_type].duration_days if plan_type in PLANS else 30
+                    approx_start_date = expiration_date - timedelta(days=plan_duration)
+                    
+                    # Se a data aproximada de início é próxima à data do pagamento, provavelmente é o mesmo plano
+                    if abs((payment_date - approx_start_date).total_seconds()) < 172800:  # 48 horas em segundos
+                        already_delivered = True
+                        logger.info(f"Plano já entregue para o pagamento ID {payment_id} (sistema antigo)")
+                        
+                        # Atualizar o registro de pagamento
                         payment['login_delivered'] = True
-                        payment['is_ghost_payment'] = True
-                        fixed_payments = True
+                        fixed_payments[payment_id] = payment
+                except (ValueError, TypeError):
+                    pass
+        
+        # Verificar disponibilidade de logins
+        # Se não há logins disponíveis para o plano, não faz sentido notificar repetidamente
+        if not already_delivered and (plan_type not in logins or not logins.get(plan_type)):
+            # Verificar se já notificamos sobre este pagamento nas últimas 24 horas
+            if payment.get('last_no_login_notification'):
+                try:
+                    last_notification = datetime.fromisoformat(payment.get('last_no_login_notification'))
+                    if (datetime.now() - last_notification).total_seconds() < 86400:  # 24 horas
+                        # Não notificar novamente tão cedo
                         continue
                 except (ValueError, TypeError):
                     pass
             
-            # Verificar se o plano já foi entregue pelo sistema multi-planos
-            already_delivered = False
-            
-            # Verifica o sistema de múltiplos planos
-            if 'plans' in user:
-                for plan in user['plans']:
-                    # Se o plano é do mesmo tipo e está ativo - possível entrega duplicada
-                    if plan.get('plan_type') == plan_type and plan.get('active', False):
-                        # Se o plano foi criado próximo à data do pagamento, provavelmente é o mesmo plano
-                        payment_date = datetime.fromisoformat(payment.get('created_at', '2020-01-01T00:00:00'))
-                        plan_date = datetime.fromisoformat(plan.get('created_at', '2020-01-01T00:00:00'))
-                        
-                        # Margem de 24 horas para possíveis atrasos no processamento
-                        if abs((payment_date - plan_date).total_seconds()) < 86400:  # 24 horas em segundos
-                            already_delivered = True
-                            logger.info(f"Plano já entregue para o pagamento ID {payment_id} (sistema multi-planos)")
-                            
-                            # Atualizar o registro de pagamento para evitar notificações futuras
-                            payment['login_delivered'] = True
-                            payment['plan_id'] = plan.get('id')
-                            fixed_payments = True
-                            break
-            
-            # Verificar sistema antigo (atributos diretos no objeto user)
-            elif not already_delivered and user.get('has_active_plan') and user.get('plan_type') == plan_type:
-                # O usuário já tem um plano do mesmo tipo no sistema antigo
-                payment_date = datetime.fromisoformat(payment.get('created_at', '2020-01-01T00:00:00'))
-                
-                # Se tiver data de expiração, usar para verificar se o plano foi ativado após o pagamento
-                if user.get('plan_expiration'):
-                    try:
-                        expiration_date = datetime.fromisoformat(user.get('plan_expiration'))
-                        plan_duration = PLANS.get(plan_type, {}).get('duration_days', 30)
-                        approx_start_date = expiration_date - timedelta(days=plan_duration)
-                        
-                        # Se a data aproximada de início é próxima à data do pagamento, provavelmente é o mesmo plano
-                        if abs((payment_date - approx_start_date).total_seconds()) < 172800:  # 48 horas em segundos
-                            already_delivered = True
-                            logger.info(f"Plano já entregue para o pagamento ID {payment_id} (sistema antigo)")
-                            
-                            # Atualizar o registro de pagamento
-                            payment['login_delivered'] = True
-                            fixed_payments = True
-                    except (ValueError, TypeError):
-                        pass
-            
-            # Verificar disponibilidade de logins
-            # Se não há logins disponíveis para o plano, não faz sentido notificar repetidamente
-            if not already_delivered and (plan_type not in logins or not logins.get(plan_type)):
-                # Verificar se já notificamos sobre este pagamento nas últimas 24 horas
-                if payment.get('last_no_login_notification'):
-                    try:
-                        last_notification = datetime.fromisoformat(payment.get('last_no_login_notification'))
-                        if (datetime.now() - last_notification).total_seconds() < 86400:  # 24 horas
-                            # Não notificar novamente tão cedo
-                            continue
-                    except (ValueError, TypeError):
-                        pass
-                
-                # Registrar esta notificação
-                payment['last_no_login_notification'] = datetime.now().isoformat()
-                fixed_payments = True
-            
-            # Se não foi entregue pelo sistema multi-planos e não foi entregue pelo sistema antigo, adicionar à lista de espera
-            if not already_delivered:
-                waiting_users.append(payment)
+            # Registrar esta notificação
+            payment['last_no_login_notification'] = datetime.now().isoformat()
+            fixed_payments[payment_id] = payment
+        
+        # Se não foi entregue pelo sistema multi-planos e não foi entregue pelo sistema antigo, adicionar à lista de espera
+        if not already_delivered:
+            waiting_users.append(payment)
     
-    # Salvar alterações nos pagamentos (onde marcamos login_delivered=True para planos já entregues)
+    # Salvar alterações nos pagamentos (onde marcamos login_delivered=True para planos já entregues).
+    # Aplica só os campos alterados aqui sobre os dados atuais do arquivo.
     if fixed_payments:
-        write_json_file(PAYMENTS_FILE, payments)
+        with _pending_json_lock:
+            updated = dict(read_json_readonly(PAYMENTS_FILE))
+            for payment_id, payment in fixed_payments.items():
+                original = payments[payment_id]
+                changes = {key: value for key, value in payment.items() if original.get(key) != value}
+                if payment_id in updated:
+                    updated[payment_id] = {**updated[payment_id], **changes}
+            write_json_file(PAYMENTS_FILE, updated)
         
     return waiting_users
 
 # Functions to check and update sales status
 def check_should_suspend_sales():
-    logins = read_json_file(LOGINS_FILE)
-    total_logins = sum(len(logins[plan_type]) for plan_type in logins)
+    total_logins = sum(count_available_logins().values())
     
     if total_logins == 0:
         return True
@@ -998,23 +1411,33 @@ def check_should_suspend_sales():
     return False
 
 def suspend_sales():
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    bot_config['sales_enabled'] = False
-    bot_config['sales_suspended_time'] = datetime.now().isoformat()
-    write_json_file(BOT_CONFIG_FILE, bot_config)
+    # Só as chaves de primeiro nível mudam: cópia rasa do config em cache
+    with _pending_json_lock:
+        bot_config = dict(read_json_readonly(BOT_CONFIG_FILE))
+        bot_config['sales_enabled'] = False
+        bot_config['sales_suspended_time'] = datetime.now().isoformat()
+        write_json_file(BOT_CONFIG_FILE, bot_config)
 
 def resume_sales():
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    bot_config['sales_enabled'] = True
-    bot_config['sales_suspended_time'] = None
-    bot_config['warning_sent'] = False
-    write_json_file(BOT_CONFIG_FILE, bot_config)
+    with _pending_json_lock:
+        bot_config = dict(read_json_readonly(BOT_CONFIG_FILE))
+        bot_config['sales_enabled'] = True
+        bot_config['sales_suspended_time'] = None
+        bot_config['warning_sent'] = False
+        write_json_file(BOT_CONFIG_FILE, bot_config)
 
 def sales_enabled():
-    bot_config = read_json_file(BOT_CONFIG_FILE)
+    bot_config = read_json_readonly(BOT_CONFIG_FILE)
     return bot_config.get('sales_enabled', True)
 
 # Coupon management functions
+# Registrar quem usou cada cupom mesmo quando o cupom não tem limite de usos por usuário
+TRACK_COUPON_USERS = os.getenv('TRACK_COUPON_USERS', 'false').lower() in ('1', 'true', 'yes')
+
+def normalize_coupon_code(code):
+    """Forma canônica do código do cupom (como é salvo e buscado): sem espaços, em maiúsculas"""
+    return code.strip().upper()
+
 def add_coupon(code, discount_type, discount_value, expiration_date, max_uses, max_uses_per_user, min_purchase, applicable_plans):
     """
     Adiciona um novo cupom de desconto ao sistema.
@@ -1032,14 +1455,8 @@ def add_coupon(code, discount_type, discount_value, expiration_date, max_uses, m
     Returns:
         tuple: (bool, str) Sucesso e mensagem
     """
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    
     # Convert to uppercase for consistency
-    code = code.upper()
-    
-    # Check if coupon already exists
-    if code in bot_config.get('coupons', {}):
-        return False, "Cupom já existe."
+    code = normalize_coupon_code(code)
     
     # Check valid discount value
     if discount_type == 'percentage' and (discount_value <= 0 or discount_value >= 100):
@@ -1052,12 +1469,21 @@ def add_coupon(code, discount_type, discount_value, expiration_date, max_uses, m
     if discount_type == 'percentage' and discount_value == 100:
         return False, "Cupons com 100% de desconto não são permitidos."
     
+    # Guardar também a expiração como timestamp, evitando converter a data ISO a cada validação
+    expires_ts = None
+    if expiration_date:
+        try:
+            expires_ts = int(_iso_to_ts(expiration_date))
+        except ValueError:
+            pass
+    
     # Create the coupon
     coupon = {
         'code': code,
         'discount_type': discount_type,
         'discount_value': discount_value,
         'expiration_date': expiration_date,
+        'expires_ts': expires_ts,
         'max_uses': max_uses,
         'max_uses_per_user': max_uses_per_user,
         'min_purchase': min_purchase,
@@ -1066,11 +1492,20 @@ def add_coupon(code, discount_type, discount_value, expiration_date, max_uses, m
         'usage_history': {} # Formato: {"user_id": count}
     }
     
-    if 'coupons' not in bot_config:
-        bot_config['coupons'] = {}
-    
-    bot_config['coupons'][code] = coupon
-    write_json_file(BOT_CONFIG_FILE, bot_config)
+    # Leitura, verificação e gravação sob o lock: dois cadastros simultâneos do mesmo
+    # código (ou outra alteração do bot_config.json) não se sobrescrevem
+    with _pending_json_lock:
+        bot_config = read_json_file(BOT_CONFIG_FILE)
+        
+        # Check if coupon already exists
+        if code in bot_config.get('coupons', {}):
+            return False, "Cupom já existe."
+        
+        if 'coupons' not in bot_config:
+            bot_config['coupons'] = {}
+        
+        bot_config['coupons'][code] = coupon
+        write_json_file(BOT_CONFIG_FILE, bot_config, defer=True)
     
     return True, "Cupom criado com sucesso."
 
@@ -1078,8 +1513,8 @@ def validate_coupon(code, user_id, plan_type, amount):
     if not code:
         return None, "Código de cupom não fornecido."
     
-    code = code.upper()
-    bot_config = read_json_file(BOT_CONFIG_FILE)
+    code = normalize_coupon_code(code)
+    bot_config = read_json_readonly(BOT_CONFIG_FILE)
     
     if 'coupons' not in bot_config or code not in bot_config['coupons']:
         return None, "Cupom não encontrado."
@@ -1088,8 +1523,7 @@ def validate_coupon(code, user_id, plan_type, amount):
     
     # Check expiration
     if coupon['expiration_date']:
-        expiration_date = datetime.fromisoformat(coupon['expiration_date'])
-        if datetime.now() > expiration_date:
+        if time.time() > _expiration_ts(coupon):
             return None, "Este cupom expirou."
     
     # Check max uses
@@ -1150,48 +1584,54 @@ def use_coupon(code, user_id):
         bool: True se o cupom foi utilizado com sucesso, False caso contrário
     """
     user_id_str = str(user_id)
-    code = code.upper()
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    
-    if 'coupons' in bot_config and code in bot_config['coupons']:
-        coupon = bot_config['coupons'][code]
-        
-        # Incrementar contador global de usos
-        coupon['uses'] += 1
+    code = normalize_coupon_code(code)
+    # Leitura, incremento e gravação sob o lock: dois usos simultâneos do mesmo cupom
+    # (threads do bot) não partem da mesma leitura, o que perderia um dos incrementos
+    with _pending_json_lock:
+        bot_config = read_json_file(BOT_CONFIG_FILE)
         
-        # Verificar se estamos usando o novo formato de rastreamento
-        if 'usage_history' in coupon:
-            # Incrementar uso para esse usuário específico
-            if user_id_str in coupon['usage_history']:
-                coupon['usage_history'][user_id_str] += 1
+        if 'coupons' in bot_config and code in bot_config['coupons']:
+            coupon = bot_config['coupons'][code]
+            
+            # Incrementar contador global de usos
+            coupon['uses'] += 1
+            
+            # Cupons antigos: gravar o timestamp de expiração para as próximas validações
+            if coupon.get('expiration_date') and coupon.get('expires_ts') is None:
+                try:
+                    coupon['expires_ts'] = int(_iso_to_ts(coupon['expiration_date']))
+                except ValueError:
+                    pass
+            
+            # Verificar se estamos usando o novo formato de rastreamento
+            if 'usage_history' in coupon:
+                # Sem limite por usuário, o histórico só serve de registro: cresce a cada novo
+                # usuário e não é consultado na validação, então só é mantido se configurado
+                if TRACK_COUPON_USERS or coupon.get('max_uses_per_user', -1) != -1:
+                    # Incrementar uso para esse usuário específico
+                    usage_history = coupon['usage_history']
+                    usage_history[user_id_str] = usage_history.get(user_id_str, 0) + 1
             else:
-                coupon['usage_history'][user_id_str] = 1
-        else:
-            # Compatibilidade com sistema antigo
-            if 'users' not in coupon:
-                coupon['users'] = []
-            if user_id_str not in coupon['users']:
-                coupon['users'].append(user_id_str)
-                
-            # Criar o campo usage_history para migração gradual
-            coupon['usage_history'] = {}
-            for user in coupon['users']:
-                coupon['usage_history'][user] = 1
-        
-        write_json_file(BOT_CONFIG_FILE, bot_config)
-        logger.info(f"Coupon {code} used by user {user_id_str}. Total uses: {coupon['uses']}")
-        return True
+                # Compatibilidade com sistema antigo: migrar a lista 'users' para usage_history
+                # e descartá-la, para não manter os mesmos IDs duas vezes no bot_config.json
+                coupon['usage_history'] = dict.fromkeys(coupon.pop('users', []), 1)
+                coupon['usage_history'][user_id_str] = coupon['usage_history'].get(user_id_str, 0) + 1
+            
+            write_json_file(BOT_CONFIG_FILE, bot_config, defer=True)
+            logger.info(f"Coupon {code} used by user {user_id_str}. Total uses: {coupon['uses']}")
+            return True
     
     return False
 
 def delete_coupon(code):
-    code = code.upper()
-    bot_config = read_json_file(BOT_CONFIG_FILE)
-    
-    if 'coupons' in bot_config and code in bot_config['coupons']:
-        del bot_config['coupons'][code]
-        write_json_file(BOT_CONFIG_FILE, bot_config)
-        return True
+    code = normalize_coupon_code(code)
+    with _pending_json_lock:
+        bot_config = read_json_file(BOT_CONFIG_FILE)
+        
+        if 'coupons' in bot_config and code in bot_config['coupons']:
+            del bot_config['coupons'][code]
+            write_json_file(BOT_CONFIG_FILE, bot_config, defer=True)
+            return True
     
     return False
 
@@ -1297,9 +1737,41 @@ def mark_expiration_notified(user_id, plan_id=None):
         return False
 
 # Format currency values
+# Os mesmos preços são formatados a cada exibição de planos; poucos valores distintos
+@functools.lru_cache(maxsize=256)
 def format_currency(value):
     return f"R$ {value:.2f}".replace('.', ',')
 
+# Desconto sazonal aplicável a cada plano, calculado de uma vez para todos os planos.
+# Vale enquanto o bot_config.json não mudar (mesmo objeto no cache) e até o vencimento
+# mais próximo entre os descontos ativos.
+_seasonal_discount_cache = (None, 0, {})
+
+def _get_seasonal_discounts_by_plan():
+    """Retorna {plan_type: (discount_percent, expiration_date, discount_id)} dos descontos ativos"""
+    global _seasonal_discount_cache
+    bot_config = read_json_readonly(BOT_CONFIG_FILE)
+    current_ts = time.time()
+    cached_config, valid_until, by_plan = _seasonal_discount_cache
+    if cached_config is bot_config and current_ts < valid_until:
+        return by_plan
+    
+    by_plan = {}
+    valid_until = float('inf')
+    for discount_id, discount in (bot_config.get('seasonal_discounts') or {}).items():
+        expires_ts = _expiration_ts(discount)
+        if current_ts >= expires_ts:
+            continue
+        valid_until = min(valid_until, expires_ts)
+        
+        # O primeiro desconto ativo aplicável ao plano prevalece; sem lista de planos, vale para todos
+        info = (discount['discount_percent'], datetime.fromisoformat(discount['expiration_date']), discount_id)
+        for plan_type in discount.get('applicable_plans') or PLANS:
+            by_plan.setdefault(plan_type, info)
+    
+    _seasonal_discount_cache = (bot_config, valid_until, by_plan)
+    return by_plan
+
 # Calculate price based on user status and plan
 def get_seasonal_discount_info(plan_type):
     """
@@ -1312,22 +1784,7 @@ def get_seasonal_discount_info(plan_type):
         tuple: (discount_percent, expiration_date, discount_id) ou (None, None, None) se não houver desconto
     """
     try:
-        # Obter descontos sazonais ativos
-        active_discounts = get_active_seasonal_discounts()
-        
-        # Verificar se há descontos aplicáveis ao plano específico
-        for discount_id, discount in active_discounts.items():
-            applicable_plans = discount.get('applicable_plans', [])
-            
-            # Verificar se o desconto se aplica a este plano
-            if not applicable_plans or plan_type in applicable_plans:
-                return (
-                    discount['discount_percent'],
-                    datetime.fromisoformat(discount['expiration_date']),
-                    discount_id
-                )
-        
-        return None, None, None
+        return _get_seasonal_discounts_by_plan().get(plan_type, (None, None, None))
     except Exception as e:
         logger.error(f"Erro ao verificar descontos sazonais: {e}")
         return None, None, None
@@ -1350,11 +1807,11 @@ def calculate_plan_price(user_id, plan_type):
     discount_info = {}
     
     # Check if user is eligible for first-time buyer discount
-    if user and user.get('is_first_buy') and plan['first_buy_discount']:
-        base_price = plan['first_buy_price']
+    if user and user.get('is_first_buy') and plan.first_buy_discount:
+        base_price = plan.first_buy_price
         discount_info['first_buy_discount'] = True
     else:
-        base_price = plan['regular_price']
+        base_price = plan.regular_price
     
     # Check if there are any seasonal discounts applicable
     discount_percent, expiration_date, discount_id = get_seasonal_discount_info(plan_type)
@@ -1376,7 +1833,7 @@ def calculate_plan_price(user_id, plan_type):
 # Apply referral discount if applicable
 def apply_referral_discount(user_id, amount):
     user = get_user(user_id)
-    bot_config = read_json_file(BOT_CONFIG_FILE)
+    bot_config = read_json_readonly(BOT_CONFIG_FILE)
     
     if not user or user.get('is_first_buy'):
         return amount, False
@@ -1677,10 +2134,24 @@ def verify_auth_token(telegram_id, token):
     return False
 
 # Functions to check admin and allowed user status
+# Set of admin IDs from auth.json, rebuilt only when the cached auth.json object changes
+# (any write, from this or another process, yields a new object on the next read)
+_admin_ids = (None, frozenset())
+_admin_ids_lock = threading.Lock()
+
+def _get_admin_ids():
+    """Return the set of admin Telegram IDs (as strings) for the current auth.json"""
+    global _admin_ids
+    auth_data = read_json_readonly(AUTH_FILE)
+    with _admin_ids_lock:
+        indexed_auth_data, admin_ids = _admin_ids
+        if indexed_auth_data is not auth_data:
+            admin_ids = frozenset(map(str, auth_data.get('admin_telegram_ids', [])))
+            _admin_ids = (auth_data, admin_ids)
+    return admin_ids
+
 def is_admin_telegram_id(telegram_id):
     """Check if a Telegram ID is an admin"""
-    auth_data = read_json_file(AUTH_FILE)
-    
     # Convert to string for comparison since JSON keys are strings
     telegram_id = str(telegram_id)
     
@@ -1689,10 +2160,7 @@ def is_admin_telegram_id(telegram_id):
         return True
     
     # Check admin list in auth.json
-    if 'admin_telegram_ids' in auth_data:
-        return telegram_id in auth_data['admin_telegram_ids']
-        
-    return False
+    return telegram_id in _get_admin_ids()
 
 def is_root_admin(telegram_id):
     """Check if a Telegram ID is the root admin (set in .env)"""
@@ -1859,9 +2327,6 @@ def verify_access_code(telegram_id, code):
     
     Returns True if the code is valid and not expired, False otherwise
     """
-    import os
-    import threading
-    
     auth_data = read_json_file(AUTH_FILE)
     
     # Convert to string for comparison
@@ -1971,7 +2436,89 @@ def list_active_access_codes():
     
     return active_codes
 
+# Cache curto das consultas de sorteios, invalidado sempre que o arquivo é gravado
+GIVEAWAYS_CACHE_TTL = 5
+_giveaways_cache = {}
+
+def invalidate_giveaways_cache():
+    """Descarta todas as consultas de sorteios em cache"""
+    _giveaways_cache.clear()
+
+# Buffer de escrita para alterações frequentes (entradas em sorteios): em vez de regravar o
+# arquivo a cada clique, as alterações ficam em memória e são gravadas juntas a cada
+# GIVEAWAYS_FLUSH_INTERVAL segundos. Enquanto houver alterações pendentes, todas as
+# leituras usam o dicionário em memória, para nenhuma gravação sobrescrever a outra.
+GIVEAWAYS_FLUSH_INTERVAL = 0.25
+_giveaways_lock = threading.RLock()
+_pending_giveaways = None
+_giveaways_flush_timer = None
+
+def _load_giveaways():
+    """Lê os sorteios, considerando alterações ainda não gravadas"""
+    with _giveaways_lock:
+        if _pending_giveaways is not None:
+            return _pending_giveaways
+        return read_json_file(GIVEAWAYS_FILE)
+
+def _save_giveaways(giveaways):
+    """Grava o arquivo de sorteios imediatamente e invalida o cache de consultas"""
+    global _pending_giveaways
+    with _giveaways_lock:
+        result = write_json_file(GIVEAWAYS_FILE, giveaways)
+        _pending_giveaways = None
+        invalidate_giveaways_cache()
+        return result
+
+def _defer_save_giveaways(giveaways):
+    """Marca os sorteios como alterados e agenda uma gravação em lote"""
+    global _pending_giveaways, _giveaways_flush_timer
+    with _giveaways_lock:
+        _pending_giveaways = giveaways
+        invalidate_giveaways_cache()
+        if _giveaways_flush_timer is None:
+            _giveaways_flush_timer = threading.Timer(GIVEAWAYS_FLUSH_INTERVAL, flush_pending_giveaways)
+            _giveaways_flush_timer.daemon = True
+            _giveaways_flush_timer.start()
+
+def flush_pending_giveaways():
+    """Grava as alterações pendentes de sorteios, se houver"""
+    global _giveaways_flush_timer
+    with _giveaways_lock:
+        _giveaways_flush_timer = None
+        if _pending_giveaways is not None:
+            _save_giveaways(_pending_giveaways)
+
+atexit.register(flush_pending_giveaways)
+
+def _cached_giveaway_query(func):
+    """Decorator que guarda o resultado de uma consulta de sorteios por GIVEAWAYS_CACHE_TTL segundos"""
+    @functools.wraps(func)
+    def wrapper(*args):
+        key = (func.__name__, args)
+        now = time.time()
+        cached = _giveaways_cache.get(key)
+        if cached and now - cached[0] < GIVEAWAYS_CACHE_TTL:
+            return cached[1]
+        
+        result = func(*args)
+        _giveaways_cache[key] = (now, result)
+        return result
+    return wrapper
+
+def _giveaways_locked(func):
+    """
+    Decorator que executa a função inteira com o _giveaways_lock: a leitura, a alteração e a
+    gravação dos sorteios não se intercalam com as de outra thread, que usa o mesmo
+    dicionário em memória enquanto há alterações pendentes.
+    """
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _giveaways_lock:
+            return func(*args, **kwargs)
+    return wrapper
+
 # Giveaway management functions
+@_giveaways_locked
 def create_giveaway(admin_id, plan_type, winners_count, duration_hours, max_participants=None, description=None):
     """
     Cria um sorteio para um plano específico
@@ -1988,7 +2535,7 @@ def create_giveaway(admin_id, plan_type, winners_count, duration_hours, max_part
         str: ID do sorteio criado ou None em caso de erro
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Gerar ID incremental para o sorteio
         giveaway_id = str(giveaways.get('current_id', 0) + 1)
@@ -2002,7 +2549,7 @@ def create_giveaway(admin_id, plan_type, winners_count, duration_hours, max_part
             'id': giveaway_id,
             'admin_id': str(admin_id),
             'plan_type': plan_type,
-            'plan_name': PLANS[plan_type]['name'],
+            'plan_name': PLANS[plan_type].name,
             'winners_count': winners_count,
             'duration_hours': duration_hours,
             'created_at': datetime.now().isoformat(),
@@ -2021,7 +2568,7 @@ def create_giveaway(admin_id, plan_type, winners_count, duration_hours, max_part
         giveaways['active'][giveaway_id] = giveaway
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return giveaway_id
     except Exception as e:
@@ -2045,41 +2592,43 @@ def add_participant_to_giveaway(giveaway_id, user_id, username, first_name):
             max_participants (int or None): Número máximo de participantes ou None se ilimitado
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
-        
-        # Verificar se o sorteio existe e está ativo
-        if giveaway_id not in giveaways['active']:
-            return False, 0, 0
-        
-        giveaway = giveaways['active'][giveaway_id]
-        
-        # Verificar se o sorteio ainda está ativo
-        if giveaway['status'] != 'active':
-            return False, len(giveaway['participants']), giveaway['max_participants']
-        
-        # Verificar se atingiu o número máximo de participantes
-        if giveaway['max_participants'] is not None and len(giveaway['participants']) >= giveaway['max_participants']:
-            return False, len(giveaway['participants']), giveaway['max_participants']
-        
-        # Verificar se o usuário já está participando
-        if str(user_id) in giveaway['participants']:
+        with _giveaways_lock:
+            giveaways = _load_giveaways()
+            
+            # Verificar se o sorteio existe e está ativo
+            if giveaway_id not in giveaways['active']:
+                return False, 0, 0
+            
+            giveaway = giveaways['active'][giveaway_id]
+            
+            # Verificar se o sorteio ainda está ativo
+            if giveaway['status'] != 'active':
+                return False, len(giveaway['participants']), giveaway['max_participants']
+            
+            # Verificar se atingiu o número máximo de participantes
+            if giveaway['max_participants'] is not None and len(giveaway['participants']) >= giveaway['max_participants']:
+                return False, len(giveaway['participants']), giveaway['max_participants']
+            
+            # Verificar se o usuário já está participando
+            if str(user_id) in giveaway['participants']:
+                return True, len(giveaway['participants']), giveaway['max_participants']
+            
+            # Adicionar o usuário como participante
+            giveaway['participants'][str(user_id)] = {
+                'username': username,
+                'first_name': first_name,
+                'joined_at': datetime.now().isoformat()
+            }
+            
+            # Agendar gravação em lote (entradas são frequentes em sorteios populares)
+            _defer_save_giveaways(giveaways)
+            
             return True, len(giveaway['participants']), giveaway['max_participants']
-        
-        # Adicionar o usuário como participante
-        giveaway['participants'][str(user_id)] = {
-            'username': username,
-            'first_name': first_name,
-            'joined_at': datetime.now().isoformat()
-        }
-        
-        # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
-        
-        return True, len(giveaway['participants']), giveaway['max_participants']
     except Exception as e:
         logger.error(f"Error adding participant to giveaway: {e}")
         return False, 0, 0
 
+@_giveaways_locked
 def notify_users_about_giveaway(giveaway_id):
     """
     Notifica todos os usuários ativos sobre um novo sorteio
@@ -2109,9 +2658,9 @@ def notify_users_about_giveaway(giveaway_id):
         notified_users = []
         
         # Marcar como notificado para evitar duplicação
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         giveaways['active'][giveaway_id]['notified_users'] = True
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         # Dados do sorteio para retornar
         giveaway_data = {
@@ -2133,6 +2682,8 @@ def notify_users_about_giveaway(giveaway_id):
         logger.error(f"Error notifying users about giveaway: {e}")
         return False, [], None
 
+@_cached_giveaway_query
+@_giveaways_locked
 def get_active_giveaways():
     """
     Retorna todos os sorteios ativos
@@ -2141,7 +2692,7 @@ def get_active_giveaways():
         dict: Dicionário com os sorteios ativos
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         current_time = datetime.now()
         
         # Filtrar sorteios expirados que ainda estão marcados como ativos
@@ -2159,7 +2710,7 @@ def get_active_giveaways():
         
         # Salvar alterações se houver sorteios expirados
         if expired_giveaways:
-            write_json_file(GIVEAWAYS_FILE, giveaways)
+            _save_giveaways(giveaways)
         
         # Retornar apenas os sorteios que ainda estão ativos
         return {gid: gv for gid, gv in giveaways['active'].items() if gv['status'] == 'active'}
@@ -2167,6 +2718,8 @@ def get_active_giveaways():
         logger.error(f"Error getting active giveaways: {e}")
         return {}
 
+@_cached_giveaway_query
+@_giveaways_locked
 def get_giveaway(giveaway_id):
     """
     Retorna um sorteio específico
@@ -2178,7 +2731,7 @@ def get_giveaway(giveaway_id):
         dict: Dados do sorteio ou None se não encontrado
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar primeiro nos sorteios ativos
         if giveaway_id in giveaways['active']:
@@ -2193,42 +2746,66 @@ def get_giveaway(giveaway_id):
         logger.error(f"Error getting giveaway: {e}")
         return None
 
-def draw_giveaway_winners(giveaway_id, force=False):
+def _sample_winners(participant_ids, k):
+    """
+    Sorteia k participantes de forma uniforme (amostragem de reservatório, Algoritmo R).
+    Percorre os IDs uma única vez, sem montar uma lista com todos, e usa o gerador
+    criptográfico do sistema (secrets) para as escolhas.
+    """
+    reservoir = []
+    for i, participant_id in enumerate(participant_ids):
+        if i < k:
+            reservoir.append(participant_id)
+        else:
+            j = secrets.randbelow(i + 1)
+            if j < k:
+                reservoir[j] = participant_id
+    return reservoir
+
+def draw_giveaway_winners(giveaway_id, force=False, return_giveaway=False):
     """
     Realiza o sorteio de ganhadores para um sorteio
     
     Args:
         giveaway_id (str): ID do sorteio
         force (bool): Se True, realiza o sorteio mesmo se o sorteio ainda estiver ativo
+        return_giveaway (bool): Se True, retorna também os dados do sorteio já carregados,
+            evitando uma nova leitura por quem precisa exibi-los
     
     Returns:
         list: Lista de IDs dos usuários ganhadores ou None em caso de erro
+        (ou a tupla (ganhadores, sorteio) quando return_giveaway=True)
     """
+    winners, giveaway = _draw_giveaway_winners(giveaway_id, force)
+    if return_giveaway:
+        return winners, giveaway
+    return winners
+
+@_giveaways_locked
+def _draw_giveaway_winners(giveaway_id, force):
+    """Implementação de draw_giveaway_winners; retorna (ganhadores, sorteio)"""
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar se o sorteio existe e está ativo ou pendente de sorteio
         if giveaway_id not in giveaways['active']:
-            return None
+            return None, None
         
         giveaway = giveaways['active'][giveaway_id]
         
         # Verificar se o sorteio está pronto para sorteio
         if not force and giveaway['status'] != 'pending_draw' and giveaway['status'] != 'active':
-            return None
+            return None, giveaway
         
         # Verificar se há participantes suficientes
         if len(giveaway['participants']) == 0:
-            return []
+            return [], giveaway
         
         # Determinar quantos ganhadores serão sorteados (não pode ser mais que o número de participantes)
         num_winners = min(giveaway['winners_count'], len(giveaway['participants']))
         
         # Realizar o sorteio
-        import random
-        participant_ids = list(giveaway['participants'].keys())
-        random.shuffle(participant_ids)
-        winners = participant_ids[:num_winners]
+        winners = _sample_winners(giveaway['participants'], num_winners)
         
         # Atualizar o status do sorteio
         giveaway['status'] = 'winners_selected'
@@ -2244,13 +2821,14 @@ def draw_giveaway_winners(giveaway_id, force=False):
             }
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
-        return winners
+        return winners, giveaway
     except Exception as e:
         logger.error(f"Error drawing giveaway winners: {e}")
-        return None
+        return None, None
 
+@_giveaways_locked
 def confirm_giveaway_win(giveaway_id, user_id):
     """
     Confirma que um usuário ganhou o sorteio
@@ -2263,7 +2841,7 @@ def confirm_giveaway_win(giveaway_id, user_id):
         bool: True se a confirmação foi bem-sucedida, False caso contrário
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar se o sorteio existe
         if giveaway_id not in giveaways['active']:
@@ -2286,7 +2864,7 @@ def confirm_giveaway_win(giveaway_id, user_id):
         expiration = datetime.fromisoformat(confirmation['expires_at'])
         if now > expiration:
             confirmation['status'] = 'expired'
-            write_json_file(GIVEAWAYS_FILE, giveaways)
+            _save_giveaways(giveaways)
             return False
         
         # Confirmar a vitória
@@ -2310,13 +2888,14 @@ def confirm_giveaway_win(giveaway_id, user_id):
             del giveaways['active'][giveaway_id]
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return True
     except Exception as e:
         logger.error(f"Error confirming giveaway win: {e}")
         return False
 
+@_giveaways_locked
 def check_expired_confirmations():
     """
     Verifica confirmações expiradas e realiza novos sorteios quando necessário
@@ -2325,7 +2904,7 @@ def check_expired_confirmations():
         dict: Dicionário com informações sobre sorteios que precisam de novo sorteio
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         current_time = datetime.now()
         redraws_needed = {}
         
@@ -2374,13 +2953,14 @@ def check_expired_confirmations():
                 del giveaways['active'][giveaway_id]
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return redraws_needed
     except Exception as e:
         logger.error(f"Error checking expired confirmations: {e}")
         return {}
 
+@_giveaways_locked
 def redraw_giveaway(giveaway_id, num_winners):
     """
     Realiza um novo sorteio para substituir ganhadores que não confirmaram
@@ -2393,7 +2973,7 @@ def redraw_giveaway(giveaway_id, num_winners):
         list: Lista de IDs dos novos ganhadores ou None em caso de erro
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar se o sorteio existe e está pendente de novo sorteio
         if giveaway_id not in giveaways['active']:
@@ -2406,10 +2986,10 @@ def redraw_giveaway(giveaway_id, num_winners):
         
         # Obter participantes que não são ganhadores atuais
         current_winners = set(giveaway['winners'])
-        eligible_participants = [uid for uid in giveaway['participants'].keys() if uid not in current_winners]
+        eligible_count = sum(1 for uid in giveaway['participants'] if uid not in current_winners)
         
         # Verificar se há participantes elegíveis suficientes
-        if not eligible_participants:
+        if not eligible_count:
             # Não há mais participantes para sortear
             giveaway['status'] = 'completed'
             giveaway['completed_at'] = datetime.now().isoformat()
@@ -2418,16 +2998,17 @@ def redraw_giveaway(giveaway_id, num_winners):
             giveaways['completed'][giveaway_id] = giveaway
             del giveaways['active'][giveaway_id]
             
-            write_json_file(GIVEAWAYS_FILE, giveaways)
+            _save_giveaways(giveaways)
             return []
         
         # Determinar quantos ganhadores serão sorteados (não pode ser mais que o número de participantes elegíveis)
-        num_to_draw = min(num_winners, len(eligible_participants))
+        num_to_draw = min(num_winners, eligible_count)
         
         # Realizar o sorteio
-        import random
-        random.shuffle(eligible_participants)
-        new_winners = eligible_participants[:num_to_draw]
+        new_winners = _sample_winners(
+            (uid for uid in giveaway['participants'] if uid not in current_winners),
+            num_to_draw
+        )
         
         # Adicionar novos ganhadores
         giveaway['winners'].extend(new_winners)
@@ -2445,13 +3026,14 @@ def redraw_giveaway(giveaway_id, num_winners):
         giveaway['redrawn_at'] = datetime.now().isoformat()
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return new_winners
     except Exception as e:
         logger.error(f"Error redrawing giveaway: {e}")
         return None
 
+@_giveaways_locked
 def cancel_giveaway(giveaway_id, admin_id):
     """
     Cancela um sorteio
@@ -2464,7 +3046,7 @@ def cancel_giveaway(giveaway_id, admin_id):
         bool: True se o sorteio foi cancelado com sucesso, False caso contrário
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar se o sorteio existe e está ativo
         if giveaway_id not in giveaways['active']:
@@ -2486,13 +3068,15 @@ def cancel_giveaway(giveaway_id, admin_id):
         del giveaways['active'][giveaway_id]
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return True
     except Exception as e:
         logger.error(f"Error cancelling giveaway: {e}")
         return False
 
+@_cached_giveaway_query
+@_giveaways_locked
 def get_giveaways_for_admin():
     """
     Retorna todos os sorteios para exibição no painel de administração
@@ -2501,7 +3085,7 @@ def get_giveaways_for_admin():
         dict: Dicionário com sorteios ativos e concluídos
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Separar sorteios por status para facilitar a exibição
         active = {}
@@ -2537,6 +3121,26 @@ def get_giveaways_for_admin():
         logger.error(f"Error getting giveaways for admin: {e}")
         return {'active': {}, 'pending_draw': {}, 'winners_selected': {}, 'completed': {}, 'cancelled': {}}
 
+@_cached_giveaway_query
+@_giveaways_locked
+def get_open_giveaways():
+    """
+    Retorna apenas os sorteios com status 'active', sem categorizar os concluídos
+    
+    O bucket 'active' do arquivo já funciona como índice (sorteios concluídos e
+    cancelados são movidos para 'completed'), então não é preciso percorrer o histórico.
+    
+    Returns:
+        dict: Dicionário com os sorteios abertos para participação
+    """
+    try:
+        giveaways = _load_giveaways()
+        return {gid: gv for gid, gv in giveaways['active'].items() if gv['status'] == 'active'}
+    except Exception as e:
+        logger.error(f"Error getting open giveaways: {e}")
+        return {}
+
+@_giveaways_locked
 def update_giveaway_message_id(giveaway_id, message_id):
     """
     Atualiza o ID da mensagem do sorteio no Telegram
@@ -2549,7 +3153,7 @@ def update_giveaway_message_id(giveaway_id, message_id):
         bool: True se atualizado com sucesso, False caso contrário
     """
     try:
-        giveaways = read_json_file(GIVEAWAYS_FILE)
+        giveaways = _load_giveaways()
         
         # Verificar se o sorteio existe e está ativo
         if giveaway_id not in giveaways['active']:
@@ -2559,7 +3163,7 @@ def update_giveaway_message_id(giveaway_id, message_id):
         giveaways['active'][giveaway_id]['message_id'] = message_id
         
         # Salvar alterações
-        write_json_file(GIVEAWAYS_FILE, giveaways)
+        _save_giveaways(giveaways)
         
         return True
     except Exception as e: